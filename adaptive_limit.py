@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+RYSTRIX AI Adaptive Limits
+Per-endpoint upstream concurrency limits that follow measured latency and timeouts
+"""
+
+import asyncio
+import logging
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Dict
+
+import aiohttp
+import config
+
+logger = logging.getLogger(__name__)
+
+# Failures that mean the upstream is past its capacity, not that the request was bad
+_OVERLOAD = (asyncio.TimeoutError, aiohttp.ClientConnectionError)
+
+
+class Slot:
+    """One admitted request; mark it overloaded when the upstream answers 429 or 5xx"""
+
+    __slots__ = ("started", "in_flight", "dropped")
+
+    def __init__(self, in_flight: int):
+        self.started = time.monotonic()
+        self.in_flight = in_flight
+        self.dropped = False
+
+    def overloaded(self):
+        self.dropped = True
+
+
+class AdaptiveLimit:
+    """Concurrency limit for one upstream, adjusted by the latency gradient.
+
+    Each successful request compares its round trip with the long-run
+    average. While latency stays within `tolerance` of it the limit grows
+    by about sqrt(limit) per request (smoothed); past that it shrinks in
+    proportion, down to half per request. Timeouts, connection failures
+    and 429/5xx answers halve it, at most once per average round trip, so
+    one overloaded cohort counts once. Growth stops while fewer than half
+    the slots are in use, since latency then says nothing about headroom.
+    Requests over the limit wait in FIFO order.
+    """
+
+    def __init__(self, name: str, initial: int, min_limit: int, max_limit: int, tolerance: float = None,
+                 smoothing: float = None, long_window: int = None):
+        self.name = name
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.tolerance = tolerance or config.ADAPTIVE_LIMIT_TOLERANCE
+        self.smoothing = smoothing or config.ADAPTIVE_LIMIT_SMOOTHING
+        self.long_window = long_window or config.ADAPTIVE_LIMIT_LONG_WINDOW
+        self.in_flight = 0
+        self.long_rtt = None  # seconds; warm-up mean, then an EMA over long_window samples
+        self.samples = 0
+        self.cuts = 0
+        self.queue_timeouts = 0
+        self._last_cut = 0.0
+        self._waiters = deque()
+
+    def _admit(self):
+        while self._waiters and self.in_flight < int(self.limit):
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
+
+    async def _acquire(self, timeout: float) -> Slot:
+        if not self._waiters and self.in_flight < int(self.limit):
+            self.in_flight += 1
+            return Slot(self.in_flight)
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, timeout)
+        except asyncio.TimeoutError:
+            self.queue_timeouts += 1
+            raise
+        except BaseException:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was granted as the caller gave up; hand it on
+                self._release()
+            raise
+        finally:
+            if not waiter.done() or waiter.cancelled():
+                try:
+                    self._waiters.remove(waiter)
+                except ValueError:
+                    pass
+        return Slot(self.in_flight)
+
+    def _release(self):
+        self.in_flight -= 1
+        self._admit()
+
+    def _sample(self, rtt: float, in_flight: int):
+        self.samples += 1
+        if self.long_rtt is None:
+            self.long_rtt = rtt
+        elif self.samples <= self.long_window:
+            self.long_rtt += (rtt - self.long_rtt) / self.samples
+        else:
+            self.long_rtt += (rtt - self.long_rtt) * 2 / (self.long_window + 1)
+            if self.long_rtt > 2 * rtt:
+                # Latency fell a long way; forget the slow past sooner
+                self.long_rtt *= 0.95
+        gradient = max(0.5, min(1.0, self.tolerance * self.long_rtt / max(rtt, 1e-6)))
+        if gradient == 1.0 and in_flight < self.limit / 2:
+            return
+        target = self.limit * gradient + math.sqrt(self.limit)
+        self._set(self.limit * (1 - self.smoothing) + target * self.smoothing)
+
+    def _drop(self):
+        now = time.monotonic()
+        if now - self._last_cut < (self.long_rtt or 0.0):
+            return
+        self._last_cut = now
+        self.cuts += 1
+        self._set(self.limit / 2)
+        logger.info("Upstream %s overloaded, concurrency limit cut to %d", self.name, int(self.limit))
+
+    def _set(self, limit: float):
+        self.limit = min(float(self.max_limit), max(float(self.min_limit), limit))
+        self._admit()
+
+    @asynccontextmanager
+    async def slot(self, timeout: float = None):
+        """Hold one in-flight slot around an upstream request, waiting up to timeout for it"""
+        slot = await self._acquire(timeout if timeout is not None else config.API_TIMEOUT)
+        try:
+            yield slot
+        except BaseException as e:
+            # A caller that marked a 429/5xx usually raises its own error for it
+            if slot.dropped or isinstance(e, _OVERLOAD):
+                self._drop()
+            raise
+        else:
+            if slot.dropped:
+                self._drop()
+            else:
+                self._sample(time.monotonic() - slot.started, slot.in_flight)
+        finally:
+            self._release()
+
+    def snapshot(self) -> dict:
+        return {
+            "limit": int(self.limit),
+            "in_flight": self.in_flight,
+            "waiting": sum(not waiter.done() for waiter in self._waiters),
+            "rtt_ms": round(self.long_rtt * 1000, 1) if self.long_rtt is not None else None,
+            "cuts": self.cuts,
+            "queue_timeouts": self.queue_timeouts,
+        }
+
+
+_limits: Dict[str, AdaptiveLimit] = {}
+
+
+def limiter(name: str) -> AdaptiveLimit:
+    """The shared limit for an upstream endpoint configured in ADAPTIVE_LIMITS"""
+    limit = _limits.get(name)
+    if limit is None:
+        settings = config.ADAPTIVE_LIMITS[name]
+        limit = _limits[name] = AdaptiveLimit(name, settings["initial"], settings["min"], settings["max"])
+    return limit
+
+
+def snapshot() -> dict:
+    """Current limit, in-flight and waiting requests per endpoint used so far"""
+    return {name: limit.snapshot() for name, limit in _limits.items()}
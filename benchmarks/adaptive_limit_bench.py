@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+RYSTRIX AI Adaptive Limit Benchmark
+Sends a steady stream of image requests to a fake upstream whose capacity
+drops mid-run (a cold or overloaded instance) and comes back, with a fixed
+low limit, a fixed high limit and the adaptive limit, and reports goodput,
+timeouts, latency and the limit per phase; then checks that 5xx answers
+from the image and chat upstreams cut their limits
+
+Usage: python benchmarks/adaptive_limit_bench.py [--rate 20] [--phase 15] [--timeout 3]
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import adaptive_limit
+import chat_handler
+import config
+import image_handler
+from fakes import FakeServices, behaviors_from_args
+from load_test import percentiles, point_at_fakes
+
+# (name, requests the upstream serves at once)
+PHASES = (("headroom", 16), ("saturated", 4), ("recovered", 16))
+STRATEGIES = {
+    "fixed_4": {"initial": 4, "min": 4, "max": 4},
+    "fixed_32": {"initial": 32, "min": 32, "max": 32},
+    "adaptive": None,
+}
+DEFAULT_IMAGE_LIMIT = dict(config.ADAPTIVE_LIMITS["image"])
+
+
+async def drive(fakes: FakeServices, rate: float, phase_seconds: float, seed: int) -> dict:
+    rng = random.Random(seed)
+    limit = adaptive_limit.limiter("image")
+    results = {name: [] for name, _ in PHASES}
+    limits = {name: [] for name, _ in PHASES}
+    queue_timeouts = {}
+    tasks = set()
+
+    async def request(phase: str):
+        started = time.perf_counter()
+        result = await image_handler.generate_reflexai_image("a lighthouse in a storm")
+        results[phase].append((result["success"], time.perf_counter() - started))
+
+    async def sample(phase: str, until: float):
+        while time.perf_counter() < until:
+            limits[phase].append(limit.snapshot()["limit"])
+            await asyncio.sleep(0.25)
+
+    for phase, capacity in PHASES:
+        await asyncio.to_thread(fakes.set_capacity, image=capacity)
+        timeouts_before = limit.queue_timeouts
+        until = time.perf_counter() + phase_seconds
+        sampler = asyncio.create_task(sample(phase, until))
+        while time.perf_counter() < until:
+            task = asyncio.create_task(request(phase))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+            await asyncio.sleep(rng.expovariate(rate))
+        await sampler
+        queue_timeouts[phase] = limit.queue_timeouts - timeouts_before
+    await asyncio.gather(*tasks)
+
+    report = {}
+    for phase, capacity in PHASES:
+        done = results[phase]
+        ok = [elapsed for success, elapsed in done if success]
+        report[phase] = {
+            "upstream_capacity": capacity,
+            "requests": len(done),
+            "goodput_per_s": round(len(ok) / phase_seconds, 1),
+            "failed": len(done) - len(ok),
+            "shed_waiting_for_slot": queue_timeouts[phase],
+            "success_latency_ms": percentiles(ok),
+            "limit": {"min": min(limits[phase]), "mean": round(sum(limits[phase]) / len(limits[phase]), 1),
+                      "max": max(limits[phase])},
+        }
+    report["cuts"] = limit.cuts
+    return report
+
+
+def run(strategy: str, rate: float, phase_seconds: float, timeout: float) -> dict:
+    settings = behaviors_from_args(["image=lognormal:0.5:0.2"])
+    with FakeServices(settings, reflexai_options={"capacity": {"image": PHASES[0][1]}}) as fakes:
+        point_at_fakes(fakes)
+        config.API_TIMEOUT = timeout
+        config.ADAPTIVE_LIMITS["image"] = STRATEGIES[strategy] or DEFAULT_IMAGE_LIMIT
+        adaptive_limit._limits.clear()
+        return asyncio.run(drive(fakes, rate, phase_seconds, seed=7))
+
+
+async def fail_all(requests: int) -> dict:
+    """Every request answers 500; each handler raises its own error after marking the slot"""
+    async def chat():
+        try:
+            await chat_handler.generate_gpt4_text("hello")
+        except Exception:
+            pass
+
+    await asyncio.gather(*(image_handler.generate_reflexai_image("a lighthouse") for _ in range(requests)),
+                         *(chat() for _ in range(requests)))
+    return {name: adaptive_limit.limiter(name).snapshot() for name in ("image", "chat")}
+
+
+def errors_run(requests: int) -> dict:
+    settings = behaviors_from_args(["image=fixed:0.05", "chat=fixed:0.05"], ["image=1", "chat=1"])
+    with FakeServices(settings) as fakes:
+        point_at_fakes(fakes)
+        config.ADAPTIVE_LIMITS["image"] = DEFAULT_IMAGE_LIMIT
+        adaptive_limit._limits.clear()
+        return asyncio.run(fail_all(requests))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[2])
+    parser.add_argument("--rate", type=float, default=20, help="image requests per second")
+    parser.add_argument("--phase", type=float, default=15, help="seconds per capacity phase")
+    parser.add_argument("--timeout", type=float, default=3, help="API_TIMEOUT for the run")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.CRITICAL)
+    reports = {strategy: run(strategy, args.rate, args.phase, args.timeout) for strategy in STRATEGIES}
+    failing = errors_run(40)
+
+    adaptive, low, high = reports["adaptive"], reports["fixed_4"], reports["fixed_32"]
+    checks = {
+        "uses_headroom": adaptive["headroom"]["goodput_per_s"] >= 1.5 * low["headroom"]["goodput_per_s"],
+        "avoids_overload_collapse": adaptive["saturated"]["goodput_per_s"]
+                                    >= 1.5 * high["saturated"]["goodput_per_s"],
+        "cuts_when_saturated": adaptive["cuts"] > 0
+                               and adaptive["saturated"]["limit"]["min"] < adaptive["headroom"]["limit"]["mean"] / 2,
+        "regrows_after_recovery": adaptive["recovered"]["limit"]["max"] >= 2 * adaptive["saturated"]["limit"]["min"]
+                                  and adaptive["recovered"]["goodput_per_s"] >= 0.8 * args.rate,
+        "5xx_cuts_image_and_chat": all(failing[name]["cuts"] > 0
+                                       and failing[name]["limit"] == config.ADAPTIVE_LIMITS[name]["min"]
+                                       for name in failing),
+    }
+    print(json.dumps({"benchmark": "adaptive_limit", "rate_per_s": args.rate, "phase_s": args.phase,
+                      "api_timeout_s": args.timeout, "service_time": "lognormal median 0.5 s",
+                      "strategies": reports, "upstream_5xx": failing, "checks": checks}, indent=2))
+    sys.exit(0 if all(checks.values()) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+RYSTRIX AI Broadcast Benchmark
+Broadcasts to a registry of fake users against a Bot API fake that enforces
+Telegram's ~30 messages/s flood limit and answers 403 for users who blocked
+the bot: unpaced, paced, and killed mid-way then resumed in a new process;
+then a retry_after longer than the lease followed by a stop from another
+process. Reports throughput, 429s, duplicates, missed users and pruning
+
+Usage: python benchmarks/broadcast_bench.py [--users 1000] [--rate 25]
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from telebot import asyncio_helper
+from telebot.async_telebot import AsyncTeleBot
+
+import config
+from broadcast import Broadcaster
+from fakes import FakeServices, behaviors_from_args
+
+BLOCKED_EVERY = 50
+FLOOD_RATE = 30
+FIRST_USER = 100000
+STATUS_CHAT = 42
+
+PHOTO = {"message_id": 7, "date": 0, "chat": {"id": STATUS_CHAT, "type": "private"},
+         "photo": [{"file_id": "photo-small", "file_unique_id": "s", "width": 90, "height": 90},
+                   {"file_id": "photo-large", "file_unique_id": "l", "width": 1280, "height": 1280}],
+         "caption": "Big news", "caption_entities": [{"type": "bold", "offset": 0, "length": 3}]}
+TEXT = {"message_id": 8, "date": 0, "chat": {"id": STATUS_CHAT, "type": "private"}, "text": "Maintenance tonight"}
+
+# Starts a broadcast, then dies without a clean shutdown
+CRASHING_SENDER = """
+import asyncio, os, signal, sys
+sys.path.insert(0, {root!r})
+import config
+config.TELEGRAM_API_URL = {api!r}
+config.BROADCAST_LEASE_SECONDS = {lease!r}
+from broadcast import Broadcaster
+
+async def run():
+    broadcaster = Broadcaster(None, {path!r}, rate={rate!r})
+    await broadcaster.start()
+    await broadcaster.start_broadcast({message!r}, None, None)
+    await asyncio.sleep({crash_after!r})
+    os.kill(os.getpid(), signal.SIGKILL)
+
+asyncio.run(run())
+"""
+
+
+def make_registry(path: str, users: int):
+    db = sqlite3.connect(path)
+    db.close()
+    broadcaster = Broadcaster(None, path)
+    asyncio.run(broadcaster._run(broadcaster._open))
+    broadcaster._db.executemany("INSERT INTO users (user_id, first_seen) VALUES (?, 0)",
+                                [(FIRST_USER + i,) for i in range(users)])
+    broadcaster._db.close()
+    broadcaster._executor.shutdown()
+
+
+def deliveries(fakes: FakeServices, users: int, before: dict) -> dict:
+    """Per-user delivery counts since the before snapshot of the reply log"""
+    replies = fakes.replies()
+    counts = [len(replies.get(str(FIRST_USER + i), [])) - len(before.get(str(FIRST_USER + i), []))
+              for i in range(users)]
+    reachable = [count for i, count in enumerate(counts) if (FIRST_USER + i) % BLOCKED_EVERY]
+    return {
+        "delivered": sum(1 for count in reachable if count),
+        "missing": sum(1 for count in reachable if not count),
+        "duplicates": sum(count - 1 for count in reachable if count > 1),
+    }
+
+
+def pruned(path: str) -> dict:
+    db = sqlite3.connect(path)
+    result = {"registry_users": db.execute("SELECT COUNT(*) FROM users").fetchone()[0],
+              "blocked_recorded": db.execute("SELECT COUNT(*) FROM blocked_users").fetchone()[0]}
+    db.close()
+    return result
+
+
+async def broadcast_once(fakes: FakeServices, path: str, message: dict, rate: float, concurrency: int) -> dict:
+    bot = AsyncTeleBot(config.BOT_TOKEN)
+    broadcaster = Broadcaster(bot, path, rate=rate, concurrency=concurrency)
+    await broadcaster.start()
+    started = time.perf_counter()
+    broadcast = await broadcaster.start_broadcast(message, STATUS_CHAT, 1)
+    await broadcaster._task
+    elapsed = time.perf_counter() - started
+    await broadcaster.close()
+    await bot.close_session()
+    return {"elapsed_s": round(elapsed, 1), "sent": broadcast["sent"], "blocked": broadcast["blocked"],
+            "failed": broadcast["failed"], "msg_per_s": round(broadcast["sent"] / elapsed, 1),
+            "state": broadcast["state"]}
+
+
+def run(fakes: FakeServices, directory: str, template: str, name: str, users: int, message: dict,
+        rate: float, concurrency: int) -> dict:
+    path = os.path.join(directory, f"{name}.sqlite3")
+    shutil.copy(template, path)
+    fakes.reset()
+    before = fakes.replies()
+    result = asyncio.run(broadcast_once(fakes, path, message, rate, concurrency))
+    telegram = fakes.stats()["telegram"]
+    return {
+        "rate_limit": rate, "concurrency": concurrency, **result,
+        "429s": telegram.get("429", 0),
+        "progress_edits": telegram.get("editMessageText", 0),
+        **deliveries(fakes, users, before),
+        **pruned(path),
+    }
+
+
+def crash_and_resume(fakes: FakeServices, directory: str, template: str, users: int, rate: float,
+                     crash_after: float) -> dict:
+    path = os.path.join(directory, "crash.sqlite3")
+    shutil.copy(template, path)
+    fakes.reset()
+    before = fakes.replies()
+    lease = 3
+    subprocess.run([sys.executable, "-c", CRASHING_SENDER.format(
+        root=str(ROOT), api=fakes.telegram_url, lease=lease, path=path, rate=rate,
+        message=TEXT, crash_after=crash_after)], timeout=120)
+    db = sqlite3.connect(path)
+    cursor, sent_before = db.execute("SELECT cursor, sent FROM broadcasts").fetchone()
+    db.close()
+
+    async def resume():
+        config.BROADCAST_LEASE_SECONDS = lease
+        broadcaster = Broadcaster(None, path, rate=rate)
+        started = time.perf_counter()
+        await broadcaster.start()
+        while broadcaster._task is None:
+            await asyncio.sleep(0.05)
+        resumed_after = time.perf_counter() - started
+        await broadcaster._task
+        await broadcaster.close()
+        return resumed_after
+
+    resumed_after = asyncio.run(resume())
+    return {
+        "crashed_after_s": crash_after,
+        "checkpoint_at_crash": {"cursor": cursor, "sent": sent_before},
+        "resumed_after_s": round(resumed_after, 1),
+        **deliveries(fakes, users, before),
+        **pruned(path),
+    }
+
+
+def pause_then_remote_stop(directory: str, template: str, retry_after: float, lease: float) -> dict:
+    """A 429 longer than the lease, then /broadcast stop from a second process"""
+    path = os.path.join(directory, "pause.sqlite3")
+    shutil.copy(template, path)
+    saved, config.BROADCAST_LEASE_SECONDS = config.BROADCAST_LEASE_SECONDS, lease
+    sends = []
+
+    async def send(method, payload):
+        sends.append(payload["chat_id"])
+        if len(sends) == 1:
+            return False, "Too Many Requests: retry after", retry_after
+        return True, None, None
+
+    async def scenario():
+        owner = Broadcaster(None, path, rate=1000)
+        other = Broadcaster(None, path, rate=1000)
+        owner._send = send
+        await owner.start()
+        await other.start()
+        await owner.start_broadcast(TEXT, None, None)
+        # The owner is stuck behind retry_after; nobody may take the broadcast over
+        claimed = 0
+        deadline = time.monotonic() + retry_after * 0.9
+        while time.monotonic() < deadline:
+            if await other._run(other._claim) is not None:
+                claimed += 1
+            await asyncio.sleep(0.1)
+        # Including the resume loop other.start() began
+        claimed += other._task is not None
+        stopped_id = await other.stop_broadcast()
+        started = time.perf_counter()
+        await owner._task
+        stop_latency = time.perf_counter() - started
+        state = (await other._run(other._load, stopped_id))["state"]
+        await owner.close()
+        await other.close()
+        return {"claimed_during_pause": claimed, "stopped_id": stopped_id, "db_state": state,
+                "stop_latency_s": round(stop_latency, 2), "sends": len(sends)}
+
+    try:
+        return {"retry_after_s": retry_after, "lease_s": lease, **asyncio.run(scenario())}
+    finally:
+        config.BROADCAST_LEASE_SECONDS = saved
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[2])
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--rate", type=float, default=config.BROADCAST_RATE)
+    parser.add_argument("--crash-after", type=float, default=8)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.CRITICAL)
+    settings = behaviors_from_args(["telegram=fixed:0.02"])
+    options = {"flood_rate": FLOOD_RATE, "blocked_every": BLOCKED_EVERY}
+    blocked = sum(1 for i in range(args.users) if (FIRST_USER + i) % BLOCKED_EVERY == 0)
+    with FakeServices(settings, telegram_options=options) as fakes, tempfile.TemporaryDirectory() as directory:
+        config.TELEGRAM_API_URL = fakes.telegram_url
+        asyncio_helper.API_URL = fakes.telegram_url + "/bot{0}/{1}"
+        template = os.path.join(directory, "registry.sqlite3")
+        make_registry(template, args.users)
+        unpaced = run(fakes, directory, template, "unpaced", args.users, TEXT, 1000, 100)
+        paced = run(fakes, directory, template, "paced", args.users, PHOTO, args.rate, config.BROADCAST_CONCURRENCY)
+        paced["sendPhoto_by_file_id"] = fakes.stats()["telegram"].get("sendPhoto", 0) - paced["429s"] - blocked
+        resumed = crash_and_resume(fakes, directory, template, args.users, args.rate, args.crash_after)
+        stopped = pause_then_remote_stop(directory, template, 4, 1.5)
+
+    checks = {
+        # Late timer wakeups can bunch a few sends into one second; they are retried
+        "paced_rarely_429s": paced["429s"] <= 0.02 * args.users,
+        "paced_nobody_missed": paced["missing"] == 0 and paced["duplicates"] == 0,
+        "paced_near_limit": paced["msg_per_s"] >= 0.9 * min(args.rate, FLOOD_RATE) * (1 - 1 / BLOCKED_EVERY),
+        "unpaced_still_complete": unpaced["missing"] == 0,
+        "blocked_pruned": paced["blocked_recorded"] == blocked and paced["registry_users"] == args.users - blocked,
+        "resume_misses_nobody": resumed["missing"] == 0,
+        "resume_duplicates_within_checkpoint": resumed["duplicates"]
+                                               <= args.rate * config.BROADCAST_CHECKPOINT_INTERVAL * 2,
+        "lease_held_through_long_429": stopped["claimed_during_pause"] == 0,
+        "remote_stop_ends_broadcast": stopped["stopped_id"] is not None and stopped["db_state"] == "stopped"
+                                      and stopped["stop_latency_s"] <= stopped["lease_s"],
+        "progress_edits_throttled": paced["progress_edits"]
+                                    <= paced["elapsed_s"] / config.BROADCAST_PROGRESS_INTERVAL + 2,
+    }
+    print(json.dumps({"benchmark": "broadcast", "users": args.users, "blocked_users": blocked,
+                      "fake_flood_limit_per_s": FLOOD_RATE, "unpaced": unpaced, "paced_photo": paced,
+                      "crash_and_resume": resumed, "pause_then_remote_stop": stopped, "checks": checks}, indent=2))
+    sys.exit(0 if all(checks.values()) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+RYSTRIX AI Chat Cache Benchmark
+Replays Zipf-distributed first questions with realistic rewording through
+the chat cache, exact-only and with near-duplicate matching, and reports
+hit rate, wrong answers served, lookup cost and upstream time saved
+
+Usage: python benchmarks/chat_cache_bench.py [--questions 20000] [--similarity 0.8]
+"""
+
+import argparse
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from chat_cache import ChatCache
+from load_test import percentiles
+
+# Popular first questions; neighbouring pairs differ in one word or number
+# and must never be served each other's answer
+POPULAR = [
+    "hi", "hello", "what is ai", "what is artificial intelligence", "who are you",
+    "what can you do", "tell me a joke", "how are you", "what is machine learning",
+    "what is the capital of france", "what is the capital of spain",
+    "what is 2+2", "what is 2+3", "what is 2-2", "what is 2*2", "is 5 > 3", "is 5 < 3",
+    "what is c++", "what is c#", "write a poem about the sea", "write a poem about the moon",
+    "explain quantum computing in simple terms", "explain blockchain in simple terms",
+    "how do i learn python", "how do i learn javascript", "what is the meaning of life",
+    "translate hello to french", "translate hello to german", "give me a motivational quote",
+    "what is the weather like today", "recommend a good book", "recommend a good movie",
+    "how to lose weight fast", "how to make money online", "what is chatgpt", "what is telegram",
+    # One added word, a negation, flips the answer
+    "is it safe to mix bleach and ammonia at home", "is it not safe to mix bleach and ammonia at home",
+    "should i take ibuprofen with coffee", "should i not take ibuprofen with coffee",
+    "why do cats purr when happy", "why dont cats purr when happy",
+]
+FILLERS = ["please", "can you tell me", "hey", "quick question:"]
+
+
+def reword(question: str, rng: random.Random) -> str:
+    """The ways people type the same question"""
+    style = rng.random()
+    if style < 0.35:
+        return question
+    if style < 0.55:
+        return question.capitalize() + rng.choice(["?", "??", "!", " ?"])
+    if style < 0.70:
+        return question.upper() if rng.random() < 0.3 else f"{question.title()}?"
+    if style < 0.85:
+        filler = rng.choice(FILLERS)
+        return f"{filler} {question}" if rng.random() < 0.5 else f"{question} {filler}"
+    # One typo: a dropped or doubled letter away from the first word
+    words = question.split()
+    if len(words) < 3:
+        return question + "?"
+    index = rng.randrange(1, len(words))
+    word = words[index]
+    if len(word) > 3:
+        at = rng.randrange(1, len(word) - 1)
+        words[index] = word[:at] + word[at + 1:] if rng.random() < 0.5 else word[:at] + word[at] + word[at:]
+    return " ".join(words)
+
+
+def workload(count: int, unique_share: float, seed: int = 7) -> list:
+    """(canonical question, typed text) pairs"""
+    rng = random.Random(seed)
+    weights = [1 / (rank + 1) for rank in range(len(POPULAR))]
+    traffic = []
+    for i in range(count):
+        if rng.random() < unique_share:
+            canonical = f"unique question {i} about topic {rng.randrange(10 ** 6)}"
+            traffic.append((canonical, canonical))
+        else:
+            canonical = rng.choices(POPULAR, weights)[0]
+            traffic.append((canonical, reword(canonical, rng)))
+    return traffic
+
+
+def run(traffic: list, similarity: float, upstream_seconds: float) -> dict:
+    cache = ChatCache(max_entries=5000, ttl=3600, similarity=similarity, min_near_length=12)
+    wrong = []
+    lookups = []
+    for canonical, text in traffic:
+        started = time.perf_counter()
+        reply = cache.get(text)
+        lookups.append(time.perf_counter() - started)
+        if reply is None:
+            cache.put(text, f"answer to {canonical}", upstream_seconds)
+        elif reply != f"answer to {canonical}":
+            wrong.append((text, reply))
+    stats = cache.snapshot()
+    return {
+        "similarity": similarity,
+        "hit_rate": round(stats["hit_rate"], 3),
+        "exact_hits": stats["exact_hits"],
+        "near_hits": stats["near_hits"],
+        "wrong_answers": len(wrong),
+        "wrong_examples": wrong[:5],
+        "entries": stats["entries"],
+        "upstream_seconds_saved": round(stats["saved_seconds"]),
+        # percentiles() reports milliseconds; feed it milliseconds to read microseconds
+        "lookup_us": percentiles([seconds * 1000 for seconds in lookups]),
+    }
+
+
+def changed_words_miss(similarity: float) -> dict:
+    """Prompts one word away from a cached one, each of which must miss"""
+    cache = ChatCache(max_entries=100, ttl=3600, similarity=similarity, min_near_length=12)
+    cache.put("is it safe to mix bleach and ammonia at home", "NO, never", 1.0)
+    variants = ["is it not safe to mix bleach and ammonia at home", "is it safe to mix bleach and ammonia",
+                "is it safe to mix bleach and ammonia at a home", "it is safe to mix bleach and ammonia at home",
+                "is it safe to mix bleach and amonia at home"]
+    return {variant: cache.get(variant) is not None for variant in variants}
+
+
+# Questions that differ only in an operator or symbol
+SYMBOL_PAIRS = [
+    ("what is 2+2", "what is 2-2"), ("what is 2+2", "what is 2*2"), ("is 5 > 3", "is 5 < 3"),
+    ("c++", "c#"), ("is x >= 10 when x is 12", "is x <= 10 when x is 12"),
+    ("how do i use c++ templates", "how do i use c# templates"),
+]
+
+
+def symbol_changes_miss(similarity: float) -> dict:
+    """Each second prompt looked up after caching only the first; all must miss"""
+    hits = {}
+    for cached, asked in SYMBOL_PAIRS:
+        cache = ChatCache(max_entries=100, ttl=3600, similarity=similarity, min_near_length=12)
+        cache.put(cached, f"answer to {cached}", 1.0)
+        hits[f"{cached} -> {asked}"] = cache.get(asked) is not None
+    return hits
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[2])
+    parser.add_argument("--questions", type=int, default=20000)
+    parser.add_argument("--unique-share", type=float, default=0.3, help="share of one-off questions")
+    parser.add_argument("--similarity", type=float, default=0.8)
+    parser.add_argument("--upstream-seconds", type=float, default=1.5, help="assumed chat completion latency")
+    args = parser.parse_args()
+
+    traffic = workload(args.questions, args.unique_share)
+    # A threshold above 1 turns near-duplicate matching off
+    exact = run(traffic, 1.01, args.upstream_seconds)
+    near = run(traffic, args.similarity, args.upstream_seconds)
+    one_word = changed_words_miss(args.similarity)
+    symbols = symbol_changes_miss(args.similarity)
+    typo = "is it safe to mix bleach and amonia at home"
+    checks = {
+        "no_wrong_answers": near["wrong_answers"] == 0,
+        "changed_words_miss": not any(hit for variant, hit in one_word.items() if variant != typo),
+        "typo_still_hits": one_word[typo],
+        "symbol_changes_miss": not any(symbols.values()),
+        "near_matching_helps": near["hit_rate"] > exact["hit_rate"],
+    }
+    print(json.dumps({"benchmark": "chat_cache", "questions": len(traffic), "exact_only": exact,
+                      "near_duplicates": near, "one_word_changes_hit": one_word,
+                      "symbol_changes_hit": symbols, "checks": checks}, indent=2))
+    sys.exit(0 if all(checks.values()) else 1)
+
+
+if __name__ == "__main__":
+    main()
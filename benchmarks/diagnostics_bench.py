@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+RYSTRIX AI Diagnostics Benchmark
+Measures what loop monitoring costs per callback and while idle, then
+blocks the loop from a routed handler and checks the slow-callback log
+names the route and the blocking function, and that the CPU and memory
+profiles find a known hot spot
+
+Usage: python benchmarks/diagnostics_bench.py [--callbacks 300000] [--rounds 5] [--idle 5]
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from telebot import types
+
+from diagnostics import Diagnostics
+from router import Router
+
+
+class Captured(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+async def callback_cost(count: int) -> float:
+    """Seconds per loop callback for a chain of call_soon callbacks"""
+    loop = asyncio.get_running_loop()
+    done = loop.create_future()
+    remaining = [count]
+
+    def step():
+        remaining[0] -= 1
+        if remaining[0]:
+            loop.call_soon(step)
+        else:
+            done.set_result(None)
+
+    started = time.perf_counter()
+    loop.call_soon(step)
+    await done
+    return (time.perf_counter() - started) / count
+
+
+def per_callback_ns(count: int, rounds: int) -> tuple:
+    """Best per-callback time without and with monitoring, alternating to share noise"""
+    async def run(monitored: bool):
+        diagnostics = Diagnostics()
+        if monitored:
+            diagnostics.start()
+        try:
+            return await callback_cost(count)
+        finally:
+            diagnostics.stop()
+    stock, monitored = [], []
+    for _ in range(rounds):
+        stock.append(asyncio.run(run(False)))
+        monitored.append(asyncio.run(run(True)))
+    return min(stock) * 1e9, min(monitored) * 1e9
+
+
+def idle_cpu_ms(seconds: float) -> float:
+    """CPU time the process spends over an idle stretch with monitoring on"""
+    async def run():
+        diagnostics = Diagnostics()
+        diagnostics.start()
+        started = time.process_time()
+        await asyncio.sleep(seconds)
+        used = time.process_time() - started
+        diagnostics.stop()
+        return used
+    return asyncio.run(run()) * 1000
+
+
+def render_markdown_slowly(text: str) -> str:
+    """Stands in for a handler doing synchronous CPU work on the loop"""
+    deadline = time.perf_counter() + 0.25
+    while time.perf_counter() < deadline:
+        text = text[::-1]
+    return text
+
+
+def hot_spot(iterations: int) -> int:
+    return sum(i * i for i in range(iterations))
+
+
+def hoard(store: list):
+    store.append([bytearray(1024) for _ in range(2000)])
+
+
+async def slow_handler_detection() -> dict:
+    captured = Captured()
+    logging.getLogger("diagnostics").addHandler(captured)
+    router = Router()
+    router.bot = None
+
+    @router.command("render")
+    async def render(message):
+        await asyncio.sleep(0)
+        render_markdown_slowly(message.text)
+
+    diagnostics = Diagnostics(slow_threshold=0.1)
+    diagnostics.start()
+    message = types.Message.de_json(json.dumps({
+        "message_id": 1, "date": 0, "text": "/render **bold**",
+        "chat": {"id": 1, "type": "private"}, "from": {"id": 1, "is_bot": False, "first_name": "A"},
+    }))
+    await asyncio.create_task(router.dispatch_message(message))
+    await asyncio.sleep(diagnostics.lag_interval * 2)
+    snapshot = diagnostics.snapshot()
+    diagnostics.stop()
+    logging.getLogger("diagnostics").removeHandler(captured)
+    log = next((line for line in captured.messages if line.startswith("Slow callback")), "")
+    return {
+        "logged": log,
+        "names_route": "route render" in log,
+        "names_blocking_function": "render_markdown_slowly" in log,
+        "lag_snapshot": {key: round(value, 1) for key, value in snapshot.items()},
+    }
+
+
+async def profiles(seconds: float) -> dict:
+    diagnostics = Diagnostics()
+    diagnostics.start()
+    stop = asyncio.Event()
+
+    async def busy():
+        while not stop.is_set():
+            hot_spot(20000)
+            await asyncio.sleep(0.001)
+
+    worker = asyncio.create_task(busy())
+    cpu = await diagnostics.cpu_profile(seconds, 0.005)
+    stop.set()
+    await worker
+
+    store = []
+
+    async def allocate():
+        for _ in range(5):
+            hoard(store)
+            await asyncio.sleep(seconds / 10)
+
+    allocator = asyncio.create_task(allocate())
+    memory = await diagnostics.memory_profile(seconds)
+    await allocator
+    diagnostics.stop()
+
+    top_own = cpu.split("Top functions by own samples\n", 1)[1].splitlines()[:3]
+    total = cpu.split("Top functions including callees\n", 1)[1].split("\n\n", 1)[0].splitlines()
+    top_sites = memory.split("Top allocation sites\n", 1)[1].splitlines()[:3]
+    return {
+        "cpu_top": top_own,
+        "cpu_hot_spot": next((line.strip() for line in total if "hot_spot" in line), None),
+        "memory_top": top_sites,
+        "memory_finds_hoard": "diagnostics_bench.py" in top_sites[0] if top_sites else False,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[2])
+    parser.add_argument("--callbacks", type=int, default=300000)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--idle", type=float, default=5)
+    parser.add_argument("--profile-seconds", type=float, default=2)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.CRITICAL)
+    logging.getLogger("diagnostics").setLevel(logging.WARNING)
+    stock, monitored = per_callback_ns(args.callbacks, args.rounds)
+    idle = idle_cpu_ms(args.idle)
+    detection = asyncio.run(slow_handler_detection())
+    found = asyncio.run(profiles(args.profile_seconds))
+
+    checks = {
+        "callback_overhead_under_1us": monitored - stock < 1000,
+        "idle_cpu_under_0.5pct": idle < args.idle * 1000 * 0.005,
+        "slow_callback_names_route": detection["names_route"],
+        "slow_callback_names_blocker": detection["names_blocking_function"],
+        "cpu_profile_finds_hot_spot": found["cpu_hot_spot"] is not None,
+        "memory_profile_finds_allocator": found["memory_finds_hoard"],
+    }
+    print(json.dumps({
+        "benchmark": "diagnostics",
+        "callback_ns": {"stock": round(stock), "monitored": round(monitored),
+                        "overhead": round(monitored - stock)},
+        "idle_cpu_ms": {"seconds": args.idle, "cpu_ms": round(idle, 1)},
+        "slow_callback": detection,
+        "profiles": found,
+        "checks": checks,
+    }, indent=2))
+    sys.exit(0 if all(checks.values()) else 1)
+
+
+if __name__ == "__main__":
+    main()
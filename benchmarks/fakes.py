@@ -0,0 +1,488 @@
+#!/usr/bin/env python3
+"""
+RYSTRIX AI Fake Services
+Local aiohttp stand-ins for the Telegram Bot API and the ReflexAI endpoints,
+with configurable latency, error rate and 429 behaviour
+
+Run standalone: python benchmarks/fakes.py [--telegram-port 8081] [--reflexai-port 8082]
+"""
+
+import argparse
+import asyncio
+import collections
+import itertools
+import json
+import math
+import multiprocessing
+import random
+import time
+import urllib.parse
+import urllib.request
+
+from aiohttp import web
+
+HOST = "127.0.0.1"
+
+# Endpoint groups that share one behaviour setting
+ENDPOINTS = ("telegram", "chat", "image", "tts", "models")
+
+DEFAULT_LATENCY = {
+    "telegram": "lognormal:0.02:0.5",
+    "chat": "lognormal:0.3:0.5",
+    "image": "lognormal:1.0:0.4",
+    "tts": "lognormal:0.4:0.4",
+    "models": "fixed:0.01",
+}
+
+# Smallest valid PNG, served as every generated image
+PNG_1X1 = bytes.fromhex(
+    "89504e470d0a1a0a0000000d4948445200000001000000010806000000"
+    "1f15c4890000000d49444154789c6360000002000154a24f5d0000000049454e44ae426082"
+)
+
+
+def parse_latency(spec: str):
+    """Build a sampler from "fixed:S", "uniform:LO:HI" or "lognormal:MEDIAN:SIGMA" (seconds)"""
+    kind, *args = spec.split(":")
+    values = [float(a) for a in args]
+    if kind == "fixed":
+        return lambda rng: values[0]
+    if kind == "uniform":
+        return lambda rng: rng.uniform(values[0], values[1])
+    if kind == "lognormal":
+        mu = math.log(values[0])
+        return lambda rng: rng.lognormvariate(mu, values[1])
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+
+class Behavior:
+    """Latency, error rate and 429 rate of one endpoint group"""
+
+    def __init__(self, latency: str, error_rate: float = 0.0, rate_429: float = 0.0, retry_after: int = 1):
+        self.latency_spec = latency
+        self.sample = parse_latency(latency)
+        self.error_rate = error_rate
+        self.rate_429 = rate_429
+        self.retry_after = retry_after
+
+    async def outcome(self, rng: random.Random) -> str:
+        """Sleep for a sampled latency, then pick "ok", "error" or "429" """
+        await asyncio.sleep(self.sample(rng))
+        roll = rng.random()
+        if roll < self.rate_429:
+            return "429"
+        if roll < self.rate_429 + self.error_rate:
+            return "error"
+        return "ok"
+
+
+def behaviors_from_args(latency=(), error_rate=(), rate_429=()) -> dict:
+    """Merge "endpoint=value" overrides into the defaults"""
+    settings = {name: {"latency": DEFAULT_LATENCY[name]} for name in ENDPOINTS}
+    for key, values, cast in (("latency", latency, str), ("error_rate", error_rate, float),
+                              ("rate_429", rate_429, float)):
+        for item in values:
+            name, value = item.split("=", 1)
+            if name not in settings:
+                raise ValueError(f"Unknown endpoint group: {name}")
+            settings[name][key] = cast(value)
+    return settings
+
+
+class CapacityGate:
+    """Serves at most `capacity` requests at once and queues the rest, like a saturated server"""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.active = 0
+        self._changed = asyncio.Condition()
+
+    async def __aenter__(self):
+        async with self._changed:
+            await self._changed.wait_for(lambda: self.active < self.capacity)
+            self.active += 1
+
+    async def __aexit__(self, *exc):
+        async with self._changed:
+            self.active -= 1
+            self._changed.notify_all()
+
+    async def resize(self, capacity: int):
+        async with self._changed:
+            self.capacity = capacity
+            self._changed.notify_all()
+
+
+class CallCounter:
+    """Per-method call counts, served on /_stats"""
+
+    def __init__(self):
+        self.calls = {}
+
+    def add(self, name: str, amount: int = 1):
+        self.calls[name] = self.calls.get(name, 0) + amount
+
+    async def stats(self, request):
+        return web.json_response(self.calls)
+
+    async def reset(self, request):
+        self.calls = {}
+        return web.json_response({"ok": True})
+
+
+def build_telegram_app(behavior: Behavior, seed: int = 1, flood_rate: float = None,
+                       blocked_every: int = None) -> web.Application:
+    """Fake Bot API: answers every method with a plausible result.
+
+    Updates posted to /_enqueue are served by getUpdates with Telegram's
+    offset semantics; a second concurrent getUpdates ends the first with
+    409 Conflict. Every call carrying a chat_id is logged on /_replies, and
+    answerInlineQuery under "inline:<query id>" with its result types.
+    Uploaded file sizes add up on /_uploads, apart from the call counts.
+
+    With flood_rate, send calls beyond that many in any second get a 429
+    with retry_after 1, like Telegram's broadcast limit. With blocked_every,
+    chats whose ID is a multiple of it answer 403 as if the user blocked
+    the bot.
+    """
+    rng = random.Random(seed)
+    counter = CallCounter()
+    uploads = CallCounter()
+    message_ids = itertools.count(1000)
+    file_ids = itertools.count(1)
+    pending_updates = []
+    arrived = asyncio.Event()
+    poller = {"future": None}
+    replies = {}
+    recent_sends = collections.deque()
+
+    async def read_fields(request) -> dict:
+        if request.content_type == "application/json":
+            return await request.json()
+        if request.content_type.startswith("multipart/"):
+            fields = {}
+            reader = await request.multipart()
+            async for part in reader:
+                if part.filename:
+                    uploaded = 0
+                    while chunk := await part.read_chunk():
+                        uploaded += len(chunk)
+                    uploads.add("bytes", uploaded)
+                    fields[part.name] = "<file>"
+                else:
+                    fields[part.name] = await part.text()
+            return fields
+        if request.method not in request.POST_METHODS:
+            # telebot sends getUpdates as a GET with a form body
+            return {**request.query, **dict(urllib.parse.parse_qsl(await request.text()))}
+        return dict(await request.post())
+
+    def message(fields: dict, **extra) -> dict:
+        chat_id = int(fields.get("chat_id") or 0)
+        return {"message_id": next(message_ids), "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"}, "text": fields.get("text", ""), **extra}
+
+    async def method(request):
+        name = request.match_info["method"]
+        counter.add(name)
+        fields = await read_fields(request)
+        if name == "getUpdates":
+            return await get_updates(fields)
+        if name.startswith("send") and (flood_rate or blocked_every):
+            if blocked_every and int(fields.get("chat_id") or 0) % blocked_every == 0:
+                return web.json_response({"ok": False, "error_code": 403,
+                                          "description": "Forbidden: bot was blocked by the user"}, status=403)
+            if flood_rate:
+                now = time.monotonic()
+                while recent_sends and recent_sends[0] <= now - 1:
+                    recent_sends.popleft()
+                if len(recent_sends) >= flood_rate:
+                    counter.add("429")
+                    return web.json_response({
+                        "ok": False, "error_code": 429, "description": "Too Many Requests: retry after 1",
+                        "parameters": {"retry_after": 1}
+                    }, status=429)
+                recent_sends.append(now)
+        if name == "answerInlineQuery":
+            results = json.loads(fields.get("results") or "[]")
+            replies.setdefault(f"inline:{fields['inline_query_id']}", []).append(
+                [time.time(), name, " ".join(result["type"] for result in results)[:80]])
+        elif fields.get("chat_id"):
+            replies.setdefault(str(fields["chat_id"]), []).append(
+                [time.time(), name, str(fields.get("text") or fields.get("caption") or "")[:80]])
+
+        outcome = await behavior.outcome(rng)
+        if outcome == "429":
+            return web.json_response({
+                "ok": False, "error_code": 429,
+                "description": f"Too Many Requests: retry after {behavior.retry_after}",
+                "parameters": {"retry_after": behavior.retry_after}
+            }, status=429)
+        if outcome == "error":
+            return web.json_response({"ok": False, "error_code": 500, "description": "Internal Server Error"},
+                                     status=500)
+
+        if name in ("sendMessage", "editMessageText"):
+            result = message(fields)
+        elif name == "sendPhoto":
+            result = message(fields, photo=[{"file_id": f"photo-{next(file_ids)}", "file_unique_id": "p",
+                                             "width": 1, "height": 1}])
+        elif name == "sendVoice":
+            result = message(fields, voice={"file_id": f"voice-{next(file_ids)}", "file_unique_id": "v",
+                                            "duration": 1})
+        elif name == "sendMediaGroup":
+            media = json.loads(fields.get("media", "[]"))
+            result = [message(fields, photo=[{"file_id": f"photo-{next(file_ids)}", "file_unique_id": "p",
+                                              "width": 1, "height": 1}]) for _ in media]
+        elif name == "getMe":
+            result = {"id": 1, "is_bot": True, "first_name": "Fake", "username": "fake_bot"}
+        else:
+            result = True
+        return web.json_response({"ok": True, "result": result})
+
+    async def get_updates(fields: dict):
+        offset = int(fields.get("offset") or 0)
+        # Updates below the offset are confirmed and forgotten
+        pending_updates[:] = [update for update in pending_updates if update["update_id"] >= offset]
+        if poller["future"] is not None and not poller["future"].done():
+            poller["future"].set_result("conflict")
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + float(fields.get("timeout") or 0)
+        while not pending_updates:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            future = poller["future"] = loop.create_future()
+            waiter = asyncio.ensure_future(arrived.wait())
+            await asyncio.wait([future, waiter], timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+            waiter.cancel()
+            arrived.clear()
+            if future.done() and future.result() == "conflict":
+                return web.json_response({
+                    "ok": False, "error_code": 409,
+                    "description": "Conflict: terminated by other getUpdates request"
+                }, status=409)
+        poller["future"] = None
+        return web.json_response({"ok": True, "result": pending_updates[:int(fields.get("limit") or 100)]})
+
+    async def enqueue(request):
+        body = await request.json()
+        pending_updates.extend(body if isinstance(body, list) else [body])
+        arrived.set()
+        return web.json_response({"ok": True})
+
+    async def reply_log(request):
+        return web.json_response(replies)
+
+    app = web.Application(client_max_size=64 * 2 ** 20)
+    async def reset(request):
+        await uploads.reset(request)
+        return await counter.reset(request)
+
+    app.router.add_get("/_stats", counter.stats)
+    app.router.add_get("/_uploads", uploads.stats)
+    app.router.add_post("/_reset", reset)
+    app.router.add_post("/_enqueue", enqueue)
+    app.router.add_get("/_replies", reply_log)
+    app.router.add_route("*", "/bot{token}/{method}", method)
+    return app
+
+
+def build_reflexai_app(behaviors: dict, seed: int = 2, opus_speech: bool = True,
+                       speech_files: dict = None, capacity: dict = None,
+                       opus_rejected: tuple = ()) -> web.Application:
+    """Fake ReflexAI: chat completions, image generation, speech and models.
+
+    Speech is as long as the input at 15 characters a second, as MP3 at
+    128 kbps or, when opus_speech is set and the request asks for it, as
+    Ogg/Opus at 32 kbps. The bytes only carry the right header unless
+    speech_files maps "mp3" and "opus" to real recordings to serve instead.
+    Inputs listed in opus_rejected answer 400 when asked for Opus.
+
+    capacity maps endpoint groups to how many requests they serve at once;
+    the rest queue behind them. POST {group: n} to /_capacity to change it
+    while running, e.g. to simulate a cold or overloaded instance.
+    """
+    rng = random.Random(seed)
+    counter = CallCounter()
+    recordings = {fmt: open(path, "rb").read() for fmt, path in (speech_files or {}).items()}
+
+    def speech_audio(fmt: str, text: str) -> bytes:
+        if fmt in recordings:
+            return recordings[fmt]
+        seconds = max(1.0, len(text) / 15)
+        if fmt == "opus":
+            header = b"OggS" + bytes(24) + b"OpusHead"
+            return header + bytes(int(seconds * 4000) - len(header))
+        return b"ID3\x04" + b"\xff\xf3" * int(seconds * 8000)
+
+    gates = {group: CapacityGate(value) for group, value in (capacity or {}).items()}
+
+    async def guarded(group: str, request):
+        counter.add(group)
+        gate = gates.get(group)
+        if gate is None:
+            outcome = await behaviors[group].outcome(rng)
+        else:
+            async with gate:
+                outcome = await behaviors[group].outcome(rng)
+        if outcome == "429":
+            return web.json_response({"error": {"message": "Rate limit exceeded"}}, status=429,
+                                     headers={"Retry-After": str(behaviors[group].retry_after)})
+        if outcome == "error":
+            return web.json_response({"error": {"message": "Upstream failure"}}, status=500)
+        return None
+
+    async def chat(request):
+        body = await request.json()
+        failure = await guarded("chat", request)
+        if failure:
+            return failure
+        prompt = body["messages"][-1]["content"]
+        reply = f"**Echo:** {prompt}\n\n- point one\n- point `two`\n\nThat's all."
+        return web.json_response({"choices": [{"message": {"role": "assistant", "content": reply}}]})
+
+    async def images(request):
+        body = await request.json()
+        failure = await guarded("image", request)
+        if failure:
+            return failure
+        base = f"http://{request.host}"
+        return web.json_response({"data": [{"url": f"{base}/files/{rng.getrandbits(32)}.png"}
+                                           for _ in range(int(body.get("n", 1)))]})
+
+    async def speech(request):
+        body = await request.json()
+        failure = await guarded("tts", request)
+        if failure:
+            return failure
+        if body.get("response_format") == "opus" and body["input"] in opus_rejected:
+            return web.json_response({"error": {"message": "Unsupported input for opus"}}, status=400)
+        if opus_speech and body.get("response_format") == "opus":
+            return web.Response(body=speech_audio("opus", body["input"]), content_type="audio/ogg")
+        return web.Response(body=speech_audio("mp3", body["input"]), content_type="audio/mpeg")
+
+    async def models(request):
+        failure = await guarded("models", request)
+        if failure:
+            return failure
+        return web.json_response({"data": [{"id": "gpt-4"}]})
+
+    async def file(request):
+        return web.Response(body=PNG_1X1, content_type="image/png")
+
+    async def resize(request):
+        for group, value in (await request.json()).items():
+            if group not in gates:
+                gates[group] = CapacityGate(value)
+            await gates[group].resize(value)
+        return web.json_response({"ok": True})
+
+    app = web.Application()
+    app.router.add_get("/_stats", counter.stats)
+    app.router.add_post("/_reset", counter.reset)
+    app.router.add_post("/_capacity", resize)
+    app.router.add_post("/v1/chat/completions", chat)
+    app.router.add_post("/v1/images/generate", images)
+    app.router.add_post("/v1/audio/speech", speech)
+    app.router.add_get("/v1/models", models)
+    app.router.add_get("/files/{name}", file)
+    return app
+
+
+def serve(telegram_port: int, reflexai_port: int, settings: dict, telegram_options: dict = None,
+          reflexai_options: dict = None):
+    """Run both fakes until the process is killed"""
+    behaviors = {name: Behavior(**values) for name, values in settings.items()}
+
+    async def run():
+        runners = []
+        for app, port in ((build_telegram_app(behaviors["telegram"], **(telegram_options or {})), telegram_port),
+                          (build_reflexai_app(behaviors, **(reflexai_options or {})), reflexai_port)):
+            runner = web.AppRunner(app, access_log=None)
+            await runner.setup()
+            await web.TCPSite(runner, HOST, port).start()
+            runners.append(runner)
+        await asyncio.Event().wait()
+
+    asyncio.run(run())
+
+
+class FakeServices:
+    """Runs the fakes in a child process so they don't share the bot's CPU accounting"""
+
+    def __init__(self, settings: dict, telegram_port: int = 18081, reflexai_port: int = 18082,
+                 telegram_options: dict = None, reflexai_options: dict = None):
+        self.settings = settings
+        self.telegram_url = f"http://{HOST}:{telegram_port}"
+        self.reflexai_url = f"http://{HOST}:{reflexai_port}"
+        self._process = multiprocessing.Process(
+            target=serve, args=(telegram_port, reflexai_port, settings, telegram_options, reflexai_options),
+            daemon=True
+        )
+
+    def __enter__(self):
+        self._process.start()
+        deadline = time.monotonic() + 10
+        while True:
+            try:
+                self.stats()
+                return self
+            except OSError:
+                if time.monotonic() > deadline or not self._process.is_alive():
+                    raise RuntimeError("Fake services did not start")
+                time.sleep(0.05)
+
+    def __exit__(self, *exc):
+        self._process.terminate()
+        self._process.join(5)
+
+    def _get(self, url: str, method: str = "GET", body=None) -> dict:
+        data = json.dumps(body).encode() if body is not None else (b"" if method == "POST" else None)
+        request = urllib.request.Request(url, method=method, data=data,
+                                         headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(request, timeout=5) as response:
+            return json.loads(response.read())
+
+    def stats(self) -> dict:
+        """Call counts: {"telegram": {method: n}, "reflexai": {group: n}}"""
+        return {"telegram": self._get(f"{self.telegram_url}/_stats"),
+                "reflexai": self._get(f"{self.reflexai_url}/_stats")}
+
+    def uploaded_bytes(self) -> int:
+        """Bytes of files uploaded to the Bot API since the last reset"""
+        return self._get(f"{self.telegram_url}/_uploads").get("bytes", 0)
+
+    def enqueue(self, updates):
+        """Queue raw updates for the bot's getUpdates"""
+        self._get(f"{self.telegram_url}/_enqueue", "POST", updates)
+
+    def replies(self) -> dict:
+        """{chat_id: [[time, method, text], ...]} for every call sent to a chat"""
+        return self._get(f"{self.telegram_url}/_replies")
+
+    def set_capacity(self, **capacity):
+        """Change how many requests each ReflexAI endpoint group serves at once"""
+        self._get(f"{self.reflexai_url}/_capacity", "POST", capacity)
+
+    def reset(self):
+        self._get(f"{self.telegram_url}/_reset", "POST")
+        self._get(f"{self.reflexai_url}/_reset", "POST")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[2])
+    parser.add_argument("--telegram-port", type=int, default=8081)
+    parser.add_argument("--reflexai-port", type=int, default=8082)
+    parser.add_argument("--latency", action="append", default=[], metavar="GROUP=SPEC")
+    parser.add_argument("--error-rate", action="append", default=[], metavar="GROUP=RATE")
+    parser.add_argument("--rate-429", action="append", default=[], metavar="GROUP=RATE")
+    args = parser.parse_args()
+    settings = behaviors_from_args(args.latency, args.error_rate, args.rate_429)
+    print(json.dumps({"telegram": f"http://{HOST}:{args.telegram_port}",
+                      "reflexai": f"http://{HOST}:{args.reflexai_port}/v1", "settings": settings}, indent=2))
+    serve(args.telegram_port, args.reflexai_port, settings)
+
+
+if __name__ == "__main__":
+    main()
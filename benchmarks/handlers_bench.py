@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+RYSTRIX AI Handler CPU Benchmark
+Measures CPU time per update for the fast-path handlers with markups built
+per call (before) and frozen at startup (after)
+
+Usage: python benchmarks/handlers_bench.py [--updates 5000]
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from telebot import asyncio_helper, types
+
+import config
+import main
+import responses
+
+
+def legacy_main_keyboard():
+    keyboard = types.InlineKeyboardMarkup(row_width=2)
+    keyboard.add(
+        types.InlineKeyboardButton("💬 Chat Mode", callback_data="chat_mode"),
+        types.InlineKeyboardButton("🖼️ Generate Image", callback_data="image_gen")
+    )
+    keyboard.add(
+        types.InlineKeyboardButton("🔊 Text-to-Speech", callback_data="tts"),
+        types.InlineKeyboardButton("❓ Help", callback_data="help")
+    )
+    return keyboard
+
+
+def legacy_back_keyboard():
+    keyboard = types.InlineKeyboardMarkup()
+    keyboard.add(types.InlineKeyboardButton("🔙 Back to Main Menu", callback_data="back_main"))
+    return keyboard
+
+
+def legacy_chat_mode_keyboard():
+    keyboard = types.InlineKeyboardMarkup()
+    keyboard.add(types.InlineKeyboardButton("🚪 Exit Chat Mode", callback_data="exit_chat"))
+    return keyboard
+
+
+def legacy_welcome_text(first_name):
+    return (
+        f"🤖 **Welcome to {config.BOT_NAME}**, {first_name}!\n\n"
+        f"{responses._WELCOME_TAIL[3:]}"
+    )
+
+
+class FakeBot:
+    """Stands in for the Bot API, doing the same payload work telebot does before HTTP"""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def _payload(self, text, reply_markup):
+        self.calls += 1
+        payload = {"text": text}
+        if reply_markup:
+            payload["reply_markup"] = await asyncio_helper._convert_markup(reply_markup)
+        return json.dumps(payload)
+
+    async def send_message(self, chat_id, text, parse_mode=None, reply_markup=None, **kwargs):
+        await self._payload(text, reply_markup)
+
+    async def edit_message_text(self, text, chat_id=None, message_id=None, parse_mode=None, reply_markup=None, **kwargs):
+        await self._payload(text, reply_markup)
+
+    async def answer_callback_query(self, callback_query_id, **kwargs):
+        self.calls += 1
+
+
+def make_updates():
+    base_user = {"id": 5, "is_bot": False, "first_name": "Ann"}
+    chat = {"id": 5, "type": "private"}
+
+    def message(text):
+        return types.Message.de_json(json.dumps({
+            "message_id": 1, "date": 0, "chat": chat, "from": base_user, "text": text
+        }))
+
+    def callback(data):
+        return types.CallbackQuery.de_json(json.dumps({
+            "id": "1", "from": base_user, "chat_instance": "1", "data": data,
+            "message": {"message_id": 2, "date": 0, "chat": chat, "text": "menu"}
+        }))
+
+    return [
+        ("start", main.router.dispatch_message, message("/start")),
+        ("help", main.router.dispatch_message, message("/help")),
+        ("callback_help", main.router.dispatch_callback, callback("help")),
+        ("callback_back_main", main.router.dispatch_callback, callback("back_main")),
+    ]
+
+
+async def measure(updates: int) -> dict:
+    results = {}
+    for name, handler, update in make_updates():
+        started = time.process_time()
+        for _ in range(updates):
+            await handler(update)
+        results[name] = round((time.process_time() - started) / updates * 1e6, 2)
+    return results
+
+
+WELCOME_TEXT = responses.welcome_text
+
+
+def use_legacy(enabled: bool):
+    """Swap the frozen markups and templates for per-call construction"""
+    if enabled:
+        main.main_keyboard = legacy_main_keyboard
+        main.back_keyboard = legacy_back_keyboard
+        main.chat_mode_keyboard = legacy_chat_mode_keyboard
+        main.responses.welcome_text = legacy_welcome_text
+    else:
+        main.main_keyboard = lambda: responses.MAIN_KEYBOARD
+        main.back_keyboard = lambda: responses.BACK_KEYBOARD
+        main.chat_mode_keyboard = lambda: responses.CHAT_MODE_KEYBOARD
+        main.responses.welcome_text = WELCOME_TEXT
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[2])
+    parser.add_argument("--updates", type=int, default=5000)
+    args = parser.parse_args()
+
+    main.bot = main.router.bot = FakeBot()
+    # Every update comes from the same user; don't let the throttle drop them
+    for middleware in main.router.middlewares:
+        if isinstance(middleware, main.ThrottleMiddleware):
+            middleware.min_interval = 0
+    use_legacy(True)
+    before = asyncio.run(measure(args.updates))
+    use_legacy(False)
+    after = asyncio.run(measure(args.updates))
+    print(json.dumps({
+        "benchmark": "handlers_cpu",
+        "updates_per_handler": args.updates,
+        "cpu_us_per_update": {name: {"before": before[name], "after": after[name]} for name in before},
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+RYSTRIX AI Inline Mode Benchmark
+Simulates users typing inline image prompts keystroke by keystroke against
+the fake services, without debouncing and with it (through the router's
+throttle), then retypes them, and
+reports upstream calls per prompt, answer latency and gallery warm-up
+
+Usage: python benchmarks/inline_bench.py [--users 20] [--keystroke 0.15] [--debounce 0.8]
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from telebot import types
+from telebot.async_telebot import AsyncTeleBot
+
+import config
+from fakes import FakeServices, behaviors_from_args
+from inline_mode import KIND_IMAGE, InlineIndex, InlineMode
+from load_test import percentiles, point_at_fakes
+from media_relay import MediaRelay
+from router import Router, ThrottleMiddleware, error_middleware
+
+# A private channel the bot uploads inline media to
+STORAGE_CHAT_ID = -1001234567890
+
+SUBJECTS = ["a red fox", "an old lighthouse", "a paper boat", "a glass castle", "a tiny robot",
+            "a koi pond", "a desert train", "a snowy owl", "a jazz club", "a moon base"]
+PLACES = ["at dawn", "in the rain", "under neon lights", "in watercolor", "on mars"]
+
+query_ids = itertools.count(1)
+
+
+def prompts(count: int) -> list:
+    return [f"{subject} {place}" for subject, place in itertools.islice(itertools.product(SUBJECTS, PLACES), count)]
+
+
+def inline_update(user_id: int, text: str) -> types.Update:
+    query_id = str(next(query_ids))
+    return types.Update.de_json(json.dumps({"update_id": int(query_id), "inline_query": {
+        "id": query_id, "query": text, "offset": "",
+        "from": {"id": user_id, "is_bot": False, "first_name": f"User{user_id}"},
+    }}))
+
+
+async def type_prompts(bot, texts: list, keystroke: float, seed: int) -> dict:
+    """Every user types one prompt a character at a time; returns user -> (final query id, typed at)"""
+    rng = random.Random(seed)
+    finals = {}
+    handling = []
+
+    async def typist(user_id: int, text: str):
+        await asyncio.sleep(rng.uniform(0, 1))
+        for end in range(1, len(text) + 1):
+            update = inline_update(user_id, text[:end])
+            finals[user_id] = (update.inline_query.id, time.perf_counter())
+            # Polling hands each batch to its own task
+            handling.append(asyncio.create_task(bot.process_new_updates([update])))
+            await asyncio.sleep(rng.lognormvariate(0, 0.4) * keystroke)
+
+    await asyncio.gather(*(typist(5000 + i, text) for i, text in enumerate(texts)))
+    await asyncio.gather(*handling)
+    return finals
+
+
+def route(bot, inline: InlineMode, throttle: bool):
+    """Inline queries go through the router like every other update"""
+    router = Router()
+    router.use(error_middleware)
+    if throttle:
+        router.use(ThrottleMiddleware(config.THROTTLE_INTERVAL))
+    inline.install(router)
+    router.install(bot)
+
+
+async def settle(inline: InlineMode):
+    while inline._tasks:
+        await asyncio.gather(*list(inline._tasks), return_exceptions=True)
+
+
+async def typing_run(fakes: FakeServices, directory: str, texts: list, keystroke: float, debounce: float,
+                     throttle: bool) -> dict:
+    bot = AsyncTeleBot(config.BOT_TOKEN)
+    relay = MediaRelay()
+    inline = InlineMode(bot, relay, index=InlineIndex(os.path.join(directory, f"inline-{debounce}.json")),
+                        debounce=debounce, storage_chat_id=STORAGE_CHAT_ID)
+    route(bot, inline, throttle)
+    rounds = {}
+    try:
+        for name in ("first", "retyped"):
+            fakes.reset()
+            wall = time.time() - time.perf_counter()
+            finals = await type_prompts(bot, texts, keystroke, seed=len(rounds))
+            await settle(inline)
+            upstream = fakes.stats()["reflexai"].get("image", 0)
+            replies = fakes.replies()
+            final_types = [" ".join(call[2] for call in replies.get(f"inline:{query_id}", []))
+                           for query_id, _ in finals.values()]
+            latencies = [
+                at - (typed_at + wall)
+                for query_id, typed_at in finals.values()
+                for at, _, result_types in replies.get(f"inline:{query_id}", [])
+                if "photo" in result_types.split()
+            ]
+            rounds[name] = {
+                "keystrokes": sum(len(text) for text in texts),
+                "upstream_image_calls": upstream,
+                "upstream_calls_per_prompt": round(upstream / len(texts), 2),
+                "inline_answers": fakes.stats()["telegram"].get("answerInlineQuery", 0),
+                "final_query_got_image": sum("photo" in types_.split() for types_ in final_types),
+                "final_answer_ms": percentiles(latencies),
+            }
+        rounds["inline_stats"] = inline.snapshot()
+    finally:
+        await inline.close()
+        await relay.close()
+        await bot.close_session()
+    return rounds
+
+
+async def gallery_run(fakes: FakeServices, directory: str, queries: int) -> dict:
+    bot = AsyncTeleBot(config.BOT_TOKEN)
+    relay = MediaRelay()
+    path = os.path.join(directory, "gallery.json")
+    inline = InlineMode(bot, relay, index=InlineIndex(path), storage_chat_id=STORAGE_CHAT_ID)
+    route(bot, inline, throttle=True)
+    try:
+        started = time.perf_counter()
+        inline.start()
+        await settle(inline)
+        warm_seconds = time.perf_counter() - started
+        fakes.reset()
+        latencies = []
+        ids = []
+        for i in range(queries):
+            update = inline_update(9000 + i, "")
+            started = time.perf_counter()
+            await bot.process_new_updates([update])
+            latencies.append(time.perf_counter() - started)
+            ids.append(update.inline_query.id)
+        replies = fakes.replies()
+        photos = [replies.get(f"inline:{query_id}", [[0, "", ""]])[0][2].split().count("photo") for query_id in ids]
+        upstream = fakes.stats()["reflexai"].get("image", 0)
+    finally:
+        await inline.close()
+        await relay.close()
+        await bot.close_session()
+
+    # A restart reloads the gallery from disk instead of regenerating it
+    reloaded = InlineIndex(path)
+    reloaded.load()
+    return {
+        "gallery_size": len(inline.gallery),
+        "warm_seconds": round(warm_seconds, 2),
+        "empty_query_answer_ms": percentiles(latencies),
+        "empty_query_upstream_calls": upstream,
+        "min_photos_per_answer": min(photos),
+        "reloaded_entries": len(reloaded),
+    }
+
+
+async def storage_off_run(fakes: FakeServices, directory: str) -> dict:
+    """Without a storage chat nothing is generated or posted anywhere"""
+    config.INLINE_STORAGE_CHAT_ID = None
+    bot = AsyncTeleBot(config.BOT_TOKEN)
+    relay = MediaRelay()
+    inline = InlineMode(bot, relay, index=InlineIndex(os.path.join(directory, "off.json")), debounce=0.1)
+    route(bot, inline, throttle=True)
+    fakes.reset()
+    try:
+        inline.start()
+        update = inline_update(7000, "a red fox at dawn")
+        await bot.process_new_updates([update])
+        await settle(inline)
+        replies = fakes.replies().get(f"inline:{update.inline_query.id}", [])
+    finally:
+        await inline.close()
+        await relay.close()
+        await bot.close_session()
+    calls = fakes.stats()
+    return {"upstream_image_calls": calls["reflexai"].get("image", 0),
+            "uploads": calls["telegram"].get("sendPhoto", 0),
+            "answer_types": [result_types for _, _, result_types in replies]}
+
+
+def suggestions_are_private() -> dict:
+    """One user's cached prompts are never suggested to another"""
+    index = InlineIndex(os.devnull)
+    index.put(KIND_IMAGE, "my secret diary drawing", "my secret diary drawing", "file-1", user_id=1)
+    return {"owner": len(index.prefix(1, KIND_IMAGE, "my secret", 10)),
+            "other_user": len(index.prefix(2, KIND_IMAGE, "my secret", 10)),
+            "other_user_exact": index.get(KIND_IMAGE, "my secret diary drawing") is not None}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[2])
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--keystroke", type=float, default=0.15, help="median seconds between keystrokes")
+    parser.add_argument("--debounce", type=float, default=config.INLINE_DEBOUNCE_SECONDS)
+    parser.add_argument("--latency", action="append", default=[], metavar="GROUP=SPEC")
+    args = parser.parse_args()
+
+    fake_settings = behaviors_from_args(args.latency)
+    texts = prompts(args.users)
+    with FakeServices(fake_settings) as fakes, tempfile.TemporaryDirectory() as directory:
+        point_at_fakes(fakes)
+        logging.getLogger().setLevel(logging.CRITICAL)
+        naive = asyncio.run(typing_run(fakes, directory, texts, args.keystroke, 0, throttle=False))
+        debounced = asyncio.run(typing_run(fakes, directory, texts, args.keystroke, args.debounce, throttle=True))
+        gallery = asyncio.run(gallery_run(fakes, directory, 200))
+        storage_off = asyncio.run(storage_off_run(fakes, directory))
+    private = suggestions_are_private()
+
+    checks = {
+        "one_generation_per_prompt": debounced["first"]["upstream_image_calls"] == args.users,
+        "every_final_query_gets_image": debounced["first"]["final_query_got_image"] == args.users,
+        "retyping_hits_cache": debounced["retyped"]["upstream_image_calls"] == 0,
+        "debounce_saves_upstream": naive["first"]["upstream_image_calls"] > 3 * args.users,
+        "gallery_instant": gallery["empty_query_answer_ms"]["p95"] < 150
+                           and gallery["empty_query_upstream_calls"] == 0
+                           and gallery["min_photos_per_answer"] == gallery["gallery_size"],
+        "gallery_persisted": gallery["reloaded_entries"] == gallery["gallery_size"],
+        "no_storage_chat_no_uploads": storage_off["upstream_image_calls"] == 0 and storage_off["uploads"] == 0
+                                      and storage_off["answer_types"] == ["article"],
+        "suggestions_per_user": private == {"owner": 1, "other_user": 0, "other_user_exact": True},
+    }
+    print(json.dumps({"benchmark": "inline", "users": args.users, "keystroke_s": args.keystroke,
+                      "fakes": fake_settings, "no_debounce": naive,
+                      "debounced": {"debounce_s": args.debounce, **debounced},
+                      "gallery": gallery, "storage_chat_unset": storage_off, "prefix_suggestions": private,
+                      "checks": checks}, indent=2))
+    sys.exit(0 if all(checks.values()) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+RYSTRIX AI Job Queue Benchmark
+Measures durable enqueue throughput with and without group commit, then
+kills a worker process mid-job and checks that every job finishes exactly
+once, retries succeed and stale jobs are failed; a job whose last attempt
+dies with another process is failed by a running one within a lease
+
+Usage: python benchmarks/job_queue_bench.py [--jobs 2000] [--producers 50]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from job_queue import JobQueue, RetryJob
+from load_test import percentiles
+
+PAYLOAD = {"prompt": "a lighthouse in a storm", "variants": 1, "style": None,
+           "chat_id": 123456789, "status_message_id": 1000, "reply_to": 999}
+
+CRASH_LEASE_SECONDS = 2
+
+# Leases a few jobs, then dies without releasing them
+CRASHING_WORKER = """
+import asyncio, os, signal, sys
+sys.path.insert(0, {root!r})
+from job_queue import JobQueue
+
+async def run():
+    queue = JobQueue({path!r}, lease_seconds={lease}, max_age=7200)
+
+    @queue.handler("image", workers=4)
+    async def hang(job):
+        await asyncio.Event().wait()
+
+    await queue.start()
+    while queue.running() < 4:
+        await asyncio.sleep(0.01)
+    os.kill(os.getpid(), signal.SIGKILL)
+
+asyncio.run(run())
+"""
+
+
+async def enqueue_throughput(path: str, jobs: int, producers: int) -> dict:
+    """Enqueue from concurrent producers; each enqueue returns once committed"""
+    queue = JobQueue(path)
+    await queue.start()
+    latencies = []
+
+    async def produce(count: int):
+        for _ in range(count):
+            started = time.perf_counter()
+            await queue.enqueue("image", PAYLOAD)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    per_producer = jobs // producers
+    await asyncio.gather(*(produce(per_producer) for _ in range(producers)))
+    elapsed = time.perf_counter() - started
+    await queue.close()
+    done = per_producer * producers
+    return {
+        "producers": producers,
+        "jobs": done,
+        "jobs_per_s": round(done / elapsed),
+        "commits": queue.commits,
+        "jobs_per_commit": round(done / queue.commits, 1),
+        "enqueue_ms": percentiles(latencies),
+    }
+
+
+async def crash_recovery(path: str, jobs: int) -> dict:
+    queue = JobQueue(path, retry_delay=0.05, max_age=60)
+    ran = {}  # job id -> successful runs
+    failed = []
+    retries = []
+
+    async def record_failure(job, error):
+        failed.append(job.id)
+
+    @queue.handler("image", on_failure=record_failure, workers=4)
+    async def run_job(job):
+        if job.payload.get("flaky") and job.attempts == 1:
+            retries.append(job.id)
+            raise RetryJob("upstream busy")
+        ran[job.id] = ran.get(job.id, 0) + 1
+
+    # Enqueue through a queue with no workers, then let another process crash mid-job
+    await queue._run(queue._open)
+    ids = [await queue.enqueue("image", {**PAYLOAD, "flaky": i % 5 == 0}) for i in range(jobs)]
+    stale = await queue.enqueue("image", PAYLOAD)
+    db = sqlite3.connect(path)
+    db.execute("UPDATE jobs SET created = ? WHERE id = ?", (time.time() - 3600, stale))
+    db.commit()
+    db.close()
+    subprocess.run([sys.executable, "-c", CRASHING_WORKER.format(root=str(ROOT), path=path, lease=CRASH_LEASE_SECONDS)], timeout=60)
+    db = sqlite3.connect(path)
+    orphaned = db.execute("SELECT COUNT(*) FROM jobs WHERE state = 'leased'").fetchone()[0]
+    db.close()
+
+    started = time.perf_counter()
+    await queue.start()
+    while await queue.depth():
+        await asyncio.sleep(0.01)
+    elapsed = time.perf_counter() - started
+    await queue.close()
+    return {
+        "jobs": jobs,
+        "orphaned_by_crash": orphaned,
+        "completed": len(ran),
+        "ran_twice": sum(count > 1 for count in ran.values()),
+        "lost": len([job_id for job_id in ids if job_id not in ran]),
+        "retried": len(retries),
+        "stale_failed": failed == [stale],
+        "recovery_s": round(elapsed, 2),
+    }
+
+
+async def exhausted_lease(path: str) -> dict:
+    """Another process takes a job's last attempt and dies; this one keeps running"""
+    queue = JobQueue(path, lease_seconds=CRASH_LEASE_SECONDS)
+    failed = asyncio.Event()
+
+    async def record_failure(job, error):
+        failed.set()
+
+    @queue.handler("image", on_failure=record_failure)
+    async def run_job(job):
+        pass
+
+    await queue._run(queue._open)
+    job_id = await queue.enqueue("image", PAYLOAD)
+    db = sqlite3.connect(path)
+    # On its last attempt under a lease that has not run out yet, so startup recovery leaves it alone
+    db.execute("UPDATE jobs SET state = 'leased', attempts = ?, owner = 'dead-0', lease_until = ? WHERE id = ?",
+               (queue.max_attempts, time.time() + CRASH_LEASE_SECONDS, job_id))
+    db.commit()
+    db.close()
+    await queue.start()
+    started = time.perf_counter()
+    try:
+        await asyncio.wait_for(failed.wait(), CRASH_LEASE_SECONDS * 5)
+    except asyncio.TimeoutError:
+        pass
+    elapsed = time.perf_counter() - started
+    await queue.close()
+    return {"failure_callback_ran": failed.is_set(), "failed_after_s": round(elapsed, 2)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[2])
+    parser.add_argument("--jobs", type=int, default=2000)
+    parser.add_argument("--producers", type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        single = asyncio.run(enqueue_throughput(os.path.join(directory, "single.sqlite3"), args.jobs // 10, 1))
+        grouped = asyncio.run(enqueue_throughput(os.path.join(directory, "grouped.sqlite3"),
+                                                 args.jobs, args.producers))
+        recovery = asyncio.run(crash_recovery(os.path.join(directory, "crash.sqlite3"), 40))
+        exhausted = asyncio.run(exhausted_lease(os.path.join(directory, "exhausted.sqlite3")))
+
+    checks = {
+        "group_commit_faster": grouped["jobs_per_s"] > 2 * single["jobs_per_s"],
+        "no_lost_jobs": recovery["lost"] == 0,
+        "no_duplicate_runs": recovery["ran_twice"] == 0,
+        "orphans_resumed": recovery["orphaned_by_crash"] == 4 and recovery["completed"] == recovery["jobs"],
+        "stale_job_failed": recovery["stale_failed"],
+        # Orphans wait out one lease, whatever PID the new process got
+        "orphans_resumed_within_lease": recovery["recovery_s"] < CRASH_LEASE_SECONDS + 1.5,
+        "last_attempt_failed_while_running": exhausted["failure_callback_ran"]
+                                             and exhausted["failed_after_s"] < CRASH_LEASE_SECONDS + 1.5,
+    }
+    print(json.dumps({
+        "benchmark": "job_queue",
+        "enqueue_one_commit_per_job": single,
+        "enqueue_group_commit": grouped,
+        "crash_recovery": recovery,
+        "last_attempt_lease_expired": exhausted,
+        "checks": checks,
+    }, indent=2))
+    sys.exit(0 if all(checks.values()) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+RYSTRIX AI Load Test
+Drives main.py's handlers at a target update rate against the fake Bot API
+and ReflexAI services, and reports throughput, latency percentiles,
+Telegram calls per update and peak RSS as JSON
+
+Usage: python benchmarks/load_test.py [--rate 20] [--duration 15] [--users 1000]
+           [--latency image=fixed:2] [--error-rate chat=0.05] [--rate-429 telegram=0.01]
+           [--output result.json]
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from telebot import asyncio_helper, types
+
+import config
+from fakes import FakeServices, behaviors_from_args
+
+# Relative weight of each kind of update in the generated traffic
+MIX = {
+    "start": 2, "help": 1, "ping": 1, "callback": 4,
+    "chat": 5, "image": 1, "say": 1,
+}
+CALLBACKS = ["help", "back_main", "image_gen", "tts"]
+PROMPTS = ["a red fox in the snow", "portrait of an old sailor", "anime city at night", "mountain lake at sunset"]
+
+
+def point_at_fakes(fakes: FakeServices):
+    """Send every Bot API and ReflexAI request to the local fakes"""
+    base = f"{fakes.reflexai_url}/v1"
+    config.API_BASE_URL = base
+    config.CHAT_API_URL = f"{base}/chat/completions"
+    config.IMAGE_API_URL = f"{base}/images/generate"
+    config.TTS_API_URL = f"{base}/audio/speech"
+    config.TELEGRAM_API_URL = fakes.telegram_url
+    asyncio_helper.API_URL = fakes.telegram_url + "/bot{0}/{1}"
+
+
+def make_updates(count: int, users: int, seed: int = 3) -> list:
+    """Generate (kind, Update) pairs following MIX"""
+    rng = random.Random(seed)
+    kinds = rng.choices(list(MIX), weights=list(MIX.values()), k=count)
+    updates = []
+    for update_id, kind in enumerate(kinds, 1):
+        user_id = rng.randint(1, users)
+        user = {"id": user_id, "is_bot": False, "first_name": f"User{user_id}"}
+        chat = {"id": user_id, "type": "private"}
+        if kind == "callback":
+            payload = {"callback_query": {
+                "id": str(update_id), "from": user, "chat_instance": "1", "data": rng.choice(CALLBACKS),
+                "message": {"message_id": 1, "date": 0, "chat": chat, "text": "menu"}
+            }}
+        else:
+            text = {
+                "start": "/start", "help": "/help", "ping": "/ping",
+                "chat": f"Explain topic number {update_id} briefly",
+                "image": f"/image {rng.choice(PROMPTS)}",
+                "say": f"/say Hello number {update_id}",
+            }[kind]
+            payload = {"message": {"message_id": update_id, "date": 0, "chat": chat, "from": user, "text": text}}
+        updates.append((kind, types.Update.de_json(json.dumps({"update_id": update_id, **payload}))))
+    return updates
+
+
+def percentiles(values: list) -> dict:
+    if len(values) < 2:
+        value = round(values[0] * 1000, 1) if values else None
+        return {"p50": value, "p95": value, "p99": value, "max": value}
+    cuts = statistics.quantiles(values, n=100, method="inclusive")
+    return {"p50": round(cuts[49] * 1000, 1), "p95": round(cuts[94] * 1000, 1),
+            "p99": round(cuts[98] * 1000, 1), "max": round(max(values) * 1000, 1)}
+
+
+async def drive(bot, schedule: list, before=None) -> tuple:
+    """Feed (kind, update, offset) entries open-loop; latency runs from the scheduled arrival"""
+    loop = asyncio.get_running_loop()
+    latencies = {}
+
+    async def handle(kind, update, arrival):
+        await bot.process_new_updates([update])
+        latencies.setdefault(kind, []).append(loop.time() - arrival)
+
+    started = loop.time()
+    tasks = []
+    for index, (kind, update, offset) in enumerate(schedule):
+        arrival = started + offset
+        delay = arrival - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if before is not None:
+            before(index)
+        tasks.append(asyncio.create_task(handle(kind, update, arrival)))
+    await asyncio.gather(*tasks)
+    return latencies, loop.time() - started
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=Path(__file__).resolve().parent, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+async def run_schedule(fakes: FakeServices, schedule: list, quotas: bool, before=None, setup=None) -> dict:
+    """Dispatch a schedule through main.py's bot and collect the common report fields"""
+    import main
+    import shared
+    import workers
+    from quota import QuotaManager
+
+    if not quotas:
+        main.quotas = QuotaManager({}, {})
+    if setup is not None:
+        setup(shared)
+
+    fakes.reset()
+    errors_before = shared.get_stats()["errors"]
+    await main.job_queue.start()
+    try:
+        latencies, elapsed = await drive(main.bot, schedule, before)
+        # Image and TTS handlers return once their job is queued; let the jobs finish
+        while await main.job_queue.depth():
+            await asyncio.sleep(0.1)
+    finally:
+        await main.job_queue.close()
+        await main.media_relay.close()
+        await main.bot.close_session()
+        workers.shutdown_pool()
+
+    calls = fakes.stats()
+    telegram_calls = sum(count for method, count in calls["telegram"].items() if method != "getUpdates")
+    every = [value for values in latencies.values() for value in values]
+    return {
+        "revision": git_revision(),
+        "updates": len(schedule),
+        "elapsed_s": round(elapsed, 2),
+        "throughput_ups": round(len(schedule) / elapsed, 1),
+        "latency_ms": percentiles(every),
+        "latency_ms_by_kind": {kind: percentiles(values) for kind, values in sorted(latencies.items())},
+        "telegram_calls": calls["telegram"],
+        "telegram_calls_per_update": round(telegram_calls / max(len(schedule), 1), 2),
+        "reflexai_calls": calls["reflexai"],
+        "handler_errors": shared.get_stats()["errors"] - errors_before,
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def add_fake_arguments(parser: argparse.ArgumentParser):
+    """Options shared by the load test and replay"""
+    parser.add_argument("--quotas", action="store_true", help="keep the configured user quotas")
+    parser.add_argument("--latency", action="append", default=[], metavar="GROUP=SPEC")
+    parser.add_argument("--error-rate", action="append", default=[], metavar="GROUP=RATE")
+    parser.add_argument("--rate-429", action="append", default=[], metavar="GROUP=RATE")
+    parser.add_argument("--output", help="also write the JSON result to this file")
+    parser.add_argument("--verbose", action="store_true", help="keep the bot's logging")
+
+
+def run_with_fakes(args, benchmark: str, settings: dict, make_run):
+    """Start the fakes, point the bot at them, run and print the JSON report"""
+    fake_settings = behaviors_from_args(args.latency, args.error_rate, args.rate_429)
+    with FakeServices(fake_settings) as fakes, tempfile.TemporaryDirectory() as state_dir:
+        point_at_fakes(fakes)
+        # Generated update IDs restart at 1; keep the dedup state per run
+        config.UPDATE_STATE_PATH = os.path.join(state_dir, "update_state.json")
+        config.JOB_QUEUE_PATH = os.path.join(state_dir, "jobs.sqlite3")
+        if not args.verbose:
+            # main configures logging at import; silence it afterwards
+            import main  # noqa: F401
+            logging.getLogger().setLevel(logging.CRITICAL)
+        report = asyncio.run(make_run(fakes))
+
+    result = {"benchmark": benchmark, "settings": {**settings, "quotas": args.quotas, "fakes": fake_settings},
+              **report}
+    output = json.dumps(result, indent=2)
+    print(output)
+    if args.output:
+        Path(args.output).write_text(output + "\n")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[2])
+    parser.add_argument("--rate", type=float, default=20, help="updates per second")
+    parser.add_argument("--duration", type=float, default=15, help="seconds of traffic")
+    parser.add_argument("--users", type=int, default=1000)
+    add_fake_arguments(parser)
+    args = parser.parse_args()
+
+    updates = make_updates(int(args.rate * args.duration), args.users)
+    schedule = [(kind, update, i / args.rate) for i, (kind, update) in enumerate(updates)]
+
+    def chat_mode_for_all(shared):
+        for user_id in range(1, args.users + 1):
+            shared.add_chat_mode_user(user_id)
+
+    run_with_fakes(args, "load_test", {"rate": args.rate, "duration": args.duration, "users": args.users},
+                   lambda fakes: run_schedule(fakes, schedule, args.quotas, setup=chat_mode_for_all))
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+RYSTRIX AI Logging Benchmark
+Simulates an upstream outage where every request logs an error into a
+slow stderr, with the old synchronous stream handler and with the queued
+pipeline, and reports loop lag, suppressed repeats and drops; also times
+disabled debug calls built as f-strings against lazy %-style ones and
+checks JSON records carry the update context and the values arguments held
+when they were logged
+
+Usage: python benchmarks/logging_bench.py [--requests 2000] [--write-ms 2]
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import logging
+import sys
+import time
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from telebot import types
+
+import update_state
+from load_test import percentiles
+from log_pipeline import LogPipeline
+from router import Router
+
+logger = logging.getLogger("outage")
+
+
+class SlowStream(io.StringIO):
+    """A stderr whose reader keeps up at one write per write_ms, like a busy pipe or terminal"""
+
+    def __init__(self, write_ms: float):
+        super().__init__()
+        self.delay = write_ms / 1000
+        self.lines = 0
+
+    def write(self, text):
+        time.sleep(self.delay)
+        self.lines += text.count("\n")
+        return super().write(text)
+
+
+async def outage(requests: int, concurrency: int, distinct: bool) -> list:
+    """Every request fails upstream and logs it; returns loop lag samples in seconds"""
+    lags = []
+    done = asyncio.Event()
+
+    async def ticker():
+        loop = asyncio.get_running_loop()
+        while not done.is_set():
+            expected = loop.time() + 0.005
+            await asyncio.sleep(0.005)
+            lags.append(max(0.0, loop.time() - expected))
+
+    async def request(i: int):
+        await asyncio.sleep(0.001 * (i % concurrency))
+        if distinct:
+            logger.info("Request %s finished in %.0fms", i, 12.5)
+        else:
+            logger.error("ReflexAI Image API error %s: %s", 503, "upstream connect error")
+
+    tick = asyncio.create_task(ticker())
+    for start in range(0, requests, concurrency):
+        await asyncio.gather(*(request(i) for i in range(start, min(start + concurrency, requests))))
+    done.set()
+    await tick
+    return lags
+
+
+def synchronous_run(requests: int, concurrency: int, write_ms: float) -> dict:
+    stream = SlowStream(write_ms)
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+    root = logging.getLogger()
+    root.addHandler(handler)
+    try:
+        started = time.perf_counter()
+        lags = asyncio.run(outage(requests, concurrency, distinct=False))
+        elapsed = time.perf_counter() - started
+    finally:
+        root.removeHandler(handler)
+    return {"elapsed_s": round(elapsed, 2), "loop_lag_ms": percentiles(lags), "lines_written": stream.lines}
+
+
+def pipeline_run(requests: int, concurrency: int, write_ms: float, distinct: bool, capacity: int = None) -> dict:
+    stream = SlowStream(write_ms)
+    pipeline = LogPipeline(level="INFO", fmt="json", capacity=capacity, stream=stream)
+    pipeline.install()
+    try:
+        started = time.perf_counter()
+        lags = asyncio.run(outage(requests, concurrency, distinct))
+        elapsed = time.perf_counter() - started
+        snapshot = pipeline.snapshot()
+    finally:
+        pipeline.stop()
+    output = stream.getvalue().splitlines()
+    return {"elapsed_s": round(elapsed, 2), "loop_lag_ms": percentiles(lags), **snapshot,
+            "lines_written": stream.lines,
+            "drop_notices": sum('"Log queue full' in line for line in output),
+            "suppressed_reported": sum(json.loads(line).get("suppressed", 0) for line in output)}
+
+
+def disabled_call_ns(count: int) -> dict:
+    """Cost of a debug call below the logger level, eager f-string vs lazy arguments"""
+    quiet = logging.getLogger("quiet")
+    quiet.setLevel(logging.INFO)
+    payload = {"prompt": "a red fox at dawn", "model": "flux", "n": 4, "size": "1024x1024",
+               "urls": [f"https://cdn.example/{i}.png" for i in range(8)]}
+    eager = min(timeit.repeat(lambda: quiet.debug(f"Image API response: {payload}"), number=count, repeat=5))
+    lazy = min(timeit.repeat(lambda: quiet.debug("Image API response: %s", payload), number=count, repeat=5))
+    return {"f_string": round(eager / count * 1e9), "lazy": round(lazy / count * 1e9)}
+
+
+async def routed_error(stream: io.StringIO) -> dict:
+    """Log from inside a routed handler and read the context back from the JSON line"""
+    router = Router()
+    router.bot = None
+
+    @router.command("image")
+    async def image(message):
+        logging.getLogger("image_handler").error("ReflexAI Image API error %s: %s", 500, "boom")
+
+    message = types.Message.de_json(json.dumps({
+        "message_id": 1, "date": 0, "text": "/image fox",
+        "chat": {"id": 77, "type": "private"}, "from": {"id": 77, "is_bot": False, "first_name": "A"},
+    }))
+    token = update_state._current_update_id.set(4242)
+    try:
+        await router.dispatch_message(message)
+    finally:
+        update_state._current_update_id.reset(token)
+
+
+def context_run() -> dict:
+    stream = io.StringIO()
+    pipeline = LogPipeline(level="INFO", fmt="json", stream=stream)
+    pipeline.install()
+    try:
+        asyncio.run(routed_error(stream))
+    finally:
+        pipeline.stop()
+    return json.loads(stream.getvalue().splitlines()[-1])
+
+
+def snapshot_run(write_ms: float) -> dict:
+    """Log a dict and an exception into a slow writer, mutate the dict, and read both back"""
+    stream = SlowStream(write_ms)
+    pipeline = LogPipeline(level="INFO", fmt="json", stream=stream)
+    pipeline.install()
+    try:
+        for i in range(5):
+            logger.info("Warm-up %s", i)
+        job = {"state": "queued"}
+        logger.info("Job %s", job)
+        job["state"] = "done"
+        try:
+            raise RuntimeError("upstream reset")
+        except RuntimeError:
+            logger.exception("Job failed")
+        queued = list(pipeline.handler.queue.queue)
+    finally:
+        pipeline.stop()
+    lines = [json.loads(line) for line in stream.getvalue().splitlines()]
+    return {"queued_while_writing": len(queued),
+            "queued_holding_args_or_traceback": sum(1 for record in queued
+                                                    if record.args or record.exc_info),
+            "logged_job": next(line["msg"] for line in lines if line["msg"].startswith("Job {")),
+            "exception_written": any("RuntimeError: upstream reset" in line.get("exc", "") for line in lines)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[2])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--write-ms", type=float, default=2, help="how long the slow stderr takes per line")
+    args = parser.parse_args()
+
+    synchronous = synchronous_run(args.requests, args.concurrency, args.write_ms)
+    queued = pipeline_run(args.requests, args.concurrency, args.write_ms, distinct=False)
+    flooded = pipeline_run(args.requests, args.concurrency, args.write_ms, distinct=True, capacity=200)
+    disabled = disabled_call_ns(100000)
+    record = context_run()
+    snapshot = snapshot_run(50)
+
+    checks = {
+        "queued_lag_p99_under_10ms": queued["loop_lag_ms"]["p99"] < 10,
+        "queued_beats_synchronous": queued["loop_lag_ms"]["p99"] < synchronous["loop_lag_ms"]["p99"] / 5,
+        "repeats_suppressed": queued["suppressed"] == args.requests - 5 and queued["dropped"] == 0,
+        "flood_drops_not_blocks": flooded["dropped"] > 0 and flooded["drop_notices"] > 0
+                                  and flooded["loop_lag_ms"]["p99"] < 10,
+        "lazy_disabled_call_cheaper": disabled["lazy"] < disabled["f_string"] / 2,
+        "json_has_update_context": record.get("update_id") == 4242 and record.get("user_id") == 77
+                                   and record.get("route") == "image",
+        "args_rendered_at_call_time": snapshot["logged_job"] == "Job {'state': 'queued'}"
+                                      and snapshot["queued_holding_args_or_traceback"] == 0,
+        "exception_text_kept": snapshot["exception_written"],
+    }
+    print(json.dumps({
+        "benchmark": "logging", "requests": args.requests, "stderr_write_ms": args.write_ms,
+        "identical_errors": {"synchronous_handler": synchronous, "queued_pipeline": queued},
+        "distinct_info_flood_queue_200": flooded,
+        "disabled_debug_call_ns": disabled,
+        "json_record": record,
+        "mutated_after_logging": snapshot,
+        "checks": checks,
+    }, indent=2))
+    sys.exit(0 if all(checks.values()) else 1)
+
+
+if __name__ == "__main__":
+    main()
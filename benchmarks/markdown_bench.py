@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+RYSTRIX AI Markdown Renderer Benchmark
+Times the single-pass renderer against the old validate/escape helpers on
+1-20 KB model outputs, and checks the rendering of headings with emphasis
+and of links whose URL holds parentheses
+
+Usage: python benchmarks/markdown_bench.py [--repeat 50]
+"""
+
+import argparse
+import json
+import random
+import re
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import markdown_renderer
+
+SIZES_KB = [1, 2, 5, 10, 20]
+
+PARAGRAPHS = [
+    "**RYSTRIX AI** here! Let's break down *how* this works, step by step.",
+    "# Overview\nThe `asyncio` event loop runs one callback at a time, so a slow_function blocks everything.",
+    "- First, install the package\n- Then run `pip install -e .`\n* Finally, check the logs",
+    "```python\nasync def main():\n    data = await fetch(url)\n    return data['items'][0]\n```",
+    "Prices went from $5.00 to $7.50 (a 50% jump!) — see [the report](https://example.com/report_2024).",
+    "Some **unclosed bold and a stray_underscore in the_middle of text, plus 2*2=4.",
+    "> Quote-like line with #hashtags, {braces}, |pipes| and ~tildes~.",
+]
+
+
+# (model output, parse mode, expected rendering)
+EXPECTED = [
+    ("# Heading **x**", "Markdown", "*Heading x*"),
+    ("# Heading **x**", "MarkdownV2", "*Heading x*"),
+    ("## __Intro__ to my_var", "MarkdownV2", "*Intro to my\\_var*"),
+    ("[x](http://x.com/a_(b))", "MarkdownV2", "[x](http://x.com/a_(b\\))"),
+    ("[x](http://x.com/a_(b))", "Markdown", "[x](http://x.com/a_%28b%29)"),
+    ("[a](http://x.com) (note)", "MarkdownV2", "[a](http://x.com) \\(note\\)"),
+]
+
+
+def legacy_validate_markdown(text):
+    """chat_handler.validate_markdown before the renderer"""
+    text = text.replace("** ", "**").replace(" **", "**")
+    text = re.sub(r"\*\*(.+?)\*\*", r"**\1**", text)
+    return text
+
+
+def legacy_escape_markdown(text):
+    """utils.escape_markdown before the translate table"""
+    escape_chars = ['_', '*', '[', ']', '(', ')', '~', '`', '>', '#', '+', '-', '=', '|', '{', '}', '.', '!']
+    for char in escape_chars:
+        text = text.replace(char, f'\\{char}')
+    return text
+
+
+def make_output(size_kb: int, seed: int = 7) -> str:
+    rng = random.Random(seed + size_kb)
+    parts = []
+    total = 0
+    while total < size_kb * 1024:
+        paragraph = rng.choice(PARAGRAPHS)
+        parts.append(paragraph)
+        total += len(paragraph) + 2
+    return "\n\n".join(parts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[2])
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    rows = []
+    for size_kb in SIZES_KB:
+        text = make_output(size_kb)
+
+        def timed(func):
+            return min(timeit.repeat(lambda: func(text), number=args.repeat, repeat=3)) / args.repeat * 1e6
+
+        chunks = markdown_renderer.render(text)
+        chunks_v2 = markdown_renderer.render(text, markdown_renderer.MARKDOWN_V2)
+        rows.append({
+            "size_kb": size_kb,
+            "legacy_validate_us": round(timed(legacy_validate_markdown), 1),
+            "legacy_escape_us": round(timed(legacy_escape_markdown), 1),
+            "render_markdown_us": round(timed(markdown_renderer.render), 1),
+            "render_markdown_v2_us": round(timed(lambda t: markdown_renderer.render(t, markdown_renderer.MARKDOWN_V2)), 1),
+            "chunks": len(chunks),
+            "max_chunk_chars": max(len(c.text) for c in chunks + chunks_v2),
+        })
+
+    wrong = [{"input": text, "parse_mode": mode, "expected": expected, "got": got}
+             for text, mode, expected in EXPECTED
+             if (got := markdown_renderer.render(text, mode)[0].text) != expected]
+    checks = {
+        "chunks_fit_limit": all(row["max_chunk_chars"] <= markdown_renderer.MESSAGE_LIMIT for row in rows),
+        "headings_and_links_render": not wrong,
+    }
+    print(json.dumps({"benchmark": "markdown_renderer", "results": rows, "wrong_renderings": wrong,
+                      "checks": checks}, indent=2))
+    sys.exit(0 if all(checks.values()) else 1)
+
+
+if __name__ == "__main__":
+    main()
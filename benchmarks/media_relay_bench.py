@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+RYSTRIX AI Media Relay Benchmark
+Compares peak memory of buffered vs streamed media delivery under concurrency
+
+Usage: python benchmarks/media_relay_bench.py [--jobs 200] [--size-kb 2048]
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import aiohttp
+from aiohttp import web
+
+import config
+from media_relay import MediaRelay, MODE_STREAM
+
+HOST = "127.0.0.1"
+
+
+def run_fake_servers(port: int, size: int):
+    """Serve a fake TTS upstream and a fake Bot API in a separate process"""
+    chunk = b"\x00" * 16384
+
+    async def speech(request):
+        await request.read()
+        response = web.StreamResponse(headers={"Content-Type": "audio/mpeg"})
+        await response.prepare(request)
+        sent = 0
+        while sent < size:
+            await response.write(chunk[:size - sent])
+            sent += len(chunk)
+        await response.write_eof()
+        return response
+
+    async def send_voice(request):
+        received = 0
+        while True:
+            data = await request.content.read(65536)
+            if not data:
+                break
+            received += len(data)
+        return web.json_response({
+            "ok": True,
+            "result": {"message_id": 1, "voice": {"file_id": f"voice-{received}"}}
+        })
+
+    app = web.Application(client_max_size=size * 4)
+    app.router.add_post("/v1/audio/speech", speech)
+    app.router.add_post("/bot{token}/sendVoice", send_voice)
+    web.run_app(app, host=HOST, port=port, print=None)
+
+
+async def buffered_job(session: aiohttp.ClientSession, base: str):
+    """The previous behaviour: read the whole body, then upload it"""
+    async with session.post(f"{base}/v1/audio/speech", json={"input": "hi"}) as response:
+        audio = await response.read()
+    form = aiohttp.FormData()
+    form.add_field("chat_id", "1")
+    form.add_field("voice", audio, filename="voice.mp3")
+    async with session.post(f"{base}/botTOKEN/sendVoice", data=form) as response:
+        await response.json()
+
+
+async def streamed_job(relay: MediaRelay, base: str):
+    """Relay the body straight into the upload"""
+    await relay.send_voice(1, f"{base}/v1/audio/speech", upstream_json={"input": "hi"}, mode=MODE_STREAM)
+
+
+async def measure(label: str, jobs: int, factory) -> dict:
+    """Run jobs concurrently and record wall time and traced peak memory"""
+    tracemalloc.start()
+    started = time.perf_counter()
+    await asyncio.gather(*(factory() for _ in range(jobs)))
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "mode": label,
+        "jobs": jobs,
+        "seconds": round(elapsed, 3),
+        "peak_bytes": peak,
+        "peak_bytes_per_job": peak // jobs,
+    }
+
+
+async def run(jobs: int, size: int, port: int) -> list:
+    base = f"http://{HOST}:{port}"
+    config.API_TIMEOUT = 120
+    connector = aiohttp.TCPConnector(limit=jobs)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        buffered = await measure("buffered", jobs, lambda: buffered_job(session, base))
+
+    relay = MediaRelay(token="TOKEN", api_url=base)
+    relay._session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=jobs))
+    relay._upstream_session = aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(limit=jobs),
+        read_bufsize=relay.chunk_size
+    )
+    try:
+        streamed = await measure("streamed", jobs, lambda: streamed_job(relay, base))
+    finally:
+        await relay.close()
+    return [buffered, streamed]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[2])
+    parser.add_argument("--jobs", type=int, default=200)
+    parser.add_argument("--size-kb", type=int, default=2048)
+    parser.add_argument("--port", type=int, default=18081)
+    args = parser.parse_args()
+
+    size = args.size_kb * 1024
+    server = multiprocessing.Process(target=run_fake_servers, args=(args.port, size), daemon=True)
+    server.start()
+    time.sleep(1.0)
+    try:
+        results = asyncio.run(run(args.jobs, size, args.port))
+    finally:
+        server.terminate()
+    print(json.dumps({"benchmark": "media_relay", "size_bytes": size, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+RYSTRIX AI Image Post-processing Benchmark
+Reports bytes saved and event-loop lag for concurrent post-processing jobs
+
+Usage: python benchmarks/postprocess_bench.py [--jobs 50] [--format jpeg]
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import multiprocessing
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import aiohttp
+from aiohttp import web
+
+import config
+import image_postprocess
+import workers
+
+HOST = "127.0.0.1"
+
+
+def make_sample_png() -> bytes:
+    """A 1024x1024 PNG with gradients and noise, similar in weight to model output"""
+    from PIL import Image
+
+    rng = random.Random(42)
+    image = Image.new("RGB", (1024, 1024))
+    pixels = image.load()
+    for y in range(1024):
+        for x in range(1024):
+            noise = rng.randint(-24, 24)
+            pixels[x, y] = ((x // 4 + noise) % 256, (y // 4 + noise) % 256, ((x + y) // 8) % 256)
+    output = io.BytesIO()
+    image.save(output, "PNG")
+    return output.getvalue()
+
+
+def run_fake_upstream(port: int, body: bytes):
+    """Serve the sample image from a separate process"""
+    async def image(request):
+        return web.Response(body=body, content_type="image/png")
+
+    app = web.Application()
+    app.router.add_get("/image/{n}", image)
+    web.run_app(app, host=HOST, port=port, print=None)
+
+
+async def lag_monitor(samples: list, stop: asyncio.Event, interval: float = 0.01):
+    """Record how late each short sleep wakes up"""
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        started = loop.time()
+        await asyncio.sleep(interval)
+        samples.append(max(0.0, loop.time() - started - interval))
+
+
+async def inline_job(session: aiohttp.ClientSession, url: str) -> dict:
+    """Re-encode on the event loop, for comparison"""
+    original = await image_postprocess.download_image(session, url)
+    data = image_postprocess.reencode_image(
+        original, config.IMAGE_POSTPROCESS_FORMAT, config.IMAGE_POSTPROCESS_QUALITY,
+        config.IMAGE_POSTPROCESS_MAX_SIDE, image_postprocess._watermark_text()
+    )
+    return {"data": data, "original_size": len(original)}
+
+
+async def measure(label: str, jobs: int, job) -> dict:
+    samples = []
+    stop = asyncio.Event()
+    monitor = asyncio.create_task(lag_monitor(samples, stop))
+    started = time.perf_counter()
+    async with aiohttp.ClientSession() as session:
+        results = await asyncio.gather(*(job(session, i) for i in range(jobs)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await monitor
+
+    samples.sort()
+    original = sum(r["original_size"] for r in results)
+    processed = sum(len(r["data"]) for r in results)
+    return {
+        "mode": label,
+        "jobs": jobs,
+        "seconds": round(elapsed, 3),
+        "original_bytes": original,
+        "processed_bytes": processed,
+        "bytes_saved_pct": round(100 * (1 - processed / original), 1),
+        "loop_lag_p99_ms": round(samples[int(len(samples) * 0.99) - 1] * 1000, 1) if samples else 0.0,
+        "loop_lag_max_ms": round(samples[-1] * 1000, 1) if samples else 0.0,
+    }
+
+
+async def run(jobs: int, port: int) -> list:
+    base = f"http://{HOST}:{port}/image"
+    pool = await measure("process_pool", jobs, lambda session, i: image_postprocess.postprocess_url(session, f"{base}/{i}"))
+    inline = await measure("inline", jobs, lambda session, i: inline_job(session, f"{base}/{i}"))
+    return [pool, inline]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[2])
+    parser.add_argument("--jobs", type=int, default=50)
+    parser.add_argument("--format", choices=sorted(image_postprocess.CONTENT_TYPES), default="jpeg")
+    parser.add_argument("--quality", type=int, default=config.IMAGE_POSTPROCESS_QUALITY)
+    parser.add_argument("--port", type=int, default=18082)
+    args = parser.parse_args()
+
+    if not image_postprocess.PILLOW_AVAILABLE:
+        sys.exit("Pillow is required for this benchmark")
+
+    config.IMAGE_POSTPROCESS_FORMAT = args.format
+    config.IMAGE_POSTPROCESS_QUALITY = args.quality
+    config.IMAGE_POSTPROCESS_WATERMARK = True
+    body = make_sample_png()
+
+    server = multiprocessing.Process(target=run_fake_upstream, args=(args.port, body), daemon=True)
+    server.start()
+    time.sleep(1.0)
+    try:
+        results = asyncio.run(run(args.jobs, args.port))
+    finally:
+        server.terminate()
+        workers.shutdown_pool()
+    print(json.dumps({
+        "benchmark": "image_postprocess",
+        "format": args.format,
+        "quality": args.quality,
+        "results": results,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+RYSTRIX AI Prompt Classifier Benchmark
+Checks template detection against a regression table and times it against
+the old keyword scans
+
+Usage: python benchmarks/prompt_classifier_bench.py [--iterations 20000]
+"""
+
+import argparse
+import json
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import image_handler
+import prompt_classifier
+
+# (prompt, style override, expected template)
+REGRESSION_CASES = [
+    ("a beautiful sunset over mountains", None, "landscape"),
+    ("anime girl with blue hair", None, "anime"),
+    ("realistic portrait of a cat", None, "portrait"),
+    ("a majestic dragon flying over a medieval castle at sunset", None, "landscape"),
+    ("anime girl with blue hair in a cyberpunk city", None, "anime"),
+    ("realistic portrait of a wise old wizard with a long beard", None, "portrait"),
+    ("beautiful landscape with mountains reflected in a crystal lake", None, "landscape"),
+    ("futuristic robot in a neon-lit laboratory", None, "default"),
+    ("cute cat wearing a detective hat, cartoon style", None, "anime"),
+    ("epic space battle with starships and nebula background", None, "default"),
+    ("serene Japanese garden with cherry blossoms falling", None, "default"),
+    ("photorealistic close-up of a dew drop", None, "realistic"),
+    ("lifelike photo of a vintage car", None, "realistic"),
+    ("Photography of a sunset", None, "realistic"),
+    ("headshot of a CEO, studio lighting", None, "portrait"),
+    ("chibi kawaii fox", None, "anime"),
+    ("ocean waves crashing, nature documentary", None, "landscape"),
+    # Word boundaries: no matches inside unrelated words
+    ("a surface texture study", None, "default"),
+    ("really colorful abstract shapes", None, "default"),
+    ("interface design mockup", None, "default"),
+    # Plurals still match
+    ("faces in the crowd", None, "portrait"),
+    ("photos of old mountains", None, "landscape"),
+    # Weighted scoring beats first-match order
+    ("a person standing in a vast landscape of mountains", None, "landscape"),
+    ("manga panel of a face", None, "anime"),
+    # Style overrides
+    ("a red fox in the forest", "anime", "anime"),
+    ("a red fox in the forest", "REALISTIC", "realistic"),
+    ("a red fox in the forest", "unknown", "landscape"),
+    # Case and whitespace normalisation
+    ("  ANIME   Girl  ", None, "anime"),
+    ("", None, "default"),
+]
+
+OPTION_CASES = [
+    ("-n 4 a cat", ("a cat", 4, None)),
+    ("-s anime -n2 big dog", ("big dog", 2, "anime")),
+    ("-n 99 x", ("x", 4, None)),
+    ("hello -n 3", ("hello -n 3", 1, None)),
+    ("-n x y", ("-n x y", 1, None)),
+]
+
+
+def legacy_image_handler(prompt: str) -> str:
+    """image_handler.detect_image_template before the classifier"""
+    prompt_lower = prompt.lower()
+    if any(word in prompt_lower for word in ["portrait", "face", "person", "headshot"]):
+        return 'portrait'
+    elif any(word in prompt_lower for word in ["landscape", "scenery", "mountain", "ocean", "sunset", "nature"]):
+        return 'landscape'
+    elif any(word in prompt_lower for word in ["anime", "cartoon", "manga", "chibi", "kawaii"]):
+        return 'anime'
+    elif any(word in prompt_lower for word in ["realistic", "photo", "photorealistic", "real", "lifelike"]):
+        return 'realistic'
+    return 'default'
+
+
+def check_regressions() -> list:
+    failures = []
+    for prompt, style, expected in REGRESSION_CASES:
+        actual = image_handler.detect_image_template(prompt, style)
+        if actual != expected:
+            failures.append({"prompt": prompt, "style": style, "expected": expected, "actual": actual})
+    for args, expected in OPTION_CASES:
+        actual = image_handler.parse_image_options(args)
+        if actual != expected:
+            failures.append({"options": args, "expected": expected, "actual": actual})
+    return failures
+
+
+def benchmark(iterations: int) -> dict:
+    prompts = [case[0] for case in REGRESSION_CASES]
+    # Unique prompts defeat the memo cache so the regex itself is timed
+    unique = [f"{prompt} #{i}" for i in range(iterations // len(prompts) + 1) for prompt in prompts][:iterations]
+
+    def run(func, corpus):
+        return min(timeit.repeat(lambda: [func(p) for p in corpus], number=1, repeat=3))
+
+    legacy = run(legacy_image_handler, unique)
+    uncached = run(prompt_classifier.classify, unique)
+    repeated = [prompts[i % len(prompts)] for i in range(iterations)]
+    cached = run(prompt_classifier.classify, repeated)
+    return {
+        "iterations": iterations,
+        "legacy_us_per_prompt": round(legacy / iterations * 1e6, 3),
+        "classifier_us_per_prompt": round(uncached / iterations * 1e6, 3),
+        "classifier_cached_us_per_prompt": round(cached / iterations * 1e6, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[2])
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+
+    failures = check_regressions()
+    print(json.dumps({
+        "benchmark": "prompt_classifier",
+        "regression_cases": len(REGRESSION_CASES) + len(OPTION_CASES),
+        "regression_failures": failures,
+        "timings": benchmark(args.iterations),
+    }, indent=2))
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+RYSTRIX AI Traffic Replay
+Feeds a recorder.py JSONL capture back through the bot's dispatcher against
+the fake services, keeping the recorded timing at 1x, Nx or max speed
+
+Usage: python benchmarks/replay.py traffic.jsonl [--speed 1x|10x|max]
+           [--busiest 3600] [--limit 50000] [--output result.json]
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from telebot import types
+
+from load_test import add_fake_arguments, run_schedule, run_with_fakes
+
+
+def parse_speed(value: str) -> float:
+    """"max" -> 0 (no waiting), "10x" or "10" -> 10"""
+    if value == "max":
+        return 0.0
+    speed = float(value.rstrip("x"))
+    if speed <= 0:
+        raise argparse.ArgumentTypeError("speed must be positive or 'max'")
+    return speed
+
+
+def load_records(path: str, limit: int = None) -> list:
+    records = []
+    with open(path, encoding="utf-8") as handle:
+        for line in handle:
+            line = line.strip()
+            if line:
+                records.append(json.loads(line))
+                if limit and len(records) >= limit:
+                    break
+    records.sort(key=lambda record: record["t"])
+    return records
+
+
+def busiest_window(records: list, seconds: float) -> list:
+    """The records of the densest window of the given length"""
+    best_start, best_count, start = 0, 0, 0
+    for end, record in enumerate(records):
+        while record["t"] - records[start]["t"] > seconds:
+            start += 1
+        if end - start + 1 > best_count:
+            best_start, best_count = start, end - start + 1
+    return records[best_start:best_start + best_count]
+
+
+def kind_of(record: dict) -> str:
+    if record["type"] in ("callback", "inline"):
+        return record["type"]
+    text = record.get("text", "")
+    if text.startswith("/"):
+        return text.split(None, 1)[0][1:].split("@", 1)[0].lower()
+    return "chat" if record.get("chat_mode") else "text"
+
+
+def to_update(update_id: int, record: dict) -> types.Update:
+    user = {"id": record["user"], "is_bot": False, "first_name": "Replay"}
+    chat = {"id": record["chat"] or record["user"], "type": "private"}
+    if record["type"] == "callback":
+        payload = {"callback_query": {
+            "id": str(update_id), "from": user, "chat_instance": "1", "data": record.get("data"),
+            "message": {"message_id": 1, "date": 0, "chat": chat, "text": "menu"}
+        }}
+    elif record["type"] == "inline":
+        payload = {"inline_query": {"id": str(update_id), "from": user, "query": record.get("query", ""),
+                                    "offset": ""}}
+    else:
+        payload = {"message": {"message_id": update_id, "date": int(record["t"]), "chat": chat,
+                               "from": user, "text": record.get("text", "")}}
+    return types.Update.de_json(json.dumps({"update_id": update_id, **payload}))
+
+
+def build_schedule(records: list, speed: float) -> list:
+    started = records[0]["t"] if records else 0
+    return [
+        (kind_of(record), to_update(update_id, record), (record["t"] - started) / speed if speed else 0.0)
+        for update_id, record in enumerate(records, 1)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[2])
+    parser.add_argument("recording")
+    parser.add_argument("--speed", type=parse_speed, default=1.0, help="1x, Nx or max")
+    parser.add_argument("--busiest", type=float, help="replay only the densest window of this many seconds")
+    parser.add_argument("--limit", type=int, help="read at most this many records")
+    add_fake_arguments(parser)
+    args = parser.parse_args()
+
+    records = load_records(args.recording, args.limit)
+    if args.busiest:
+        records = busiest_window(records, args.busiest)
+    if not records:
+        sys.exit("No records to replay")
+    schedule = build_schedule(records, args.speed)
+
+    def set_chat_mode(index):
+        # Restore each user's recorded chat mode right before their update
+        import shared
+        record = records[index]
+        if record.get("chat_mode"):
+            shared.add_chat_mode_user(record["user"])
+        else:
+            shared.remove_chat_mode_user(record["user"])
+
+    settings = {
+        "recording": args.recording,
+        "speed": "max" if not args.speed else args.speed,
+        "recorded_span_s": round(records[-1]["t"] - records[0]["t"], 1),
+        "users": len({record["user"] for record in records}),
+    }
+    run_with_fakes(args, "replay", settings,
+                   lambda fakes: run_schedule(fakes, schedule, args.quotas, before=set_chat_mode))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+RYSTRIX AI Restart Benchmark
+Runs main.py against the fake Bot API, triggers an admin restart under steady
+/start traffic with a chat-mode user and a slow image in flight, and checks
+the reply gap, lost and duplicate replies, and the state carried over
+
+Usage: python benchmarks/restart_bench.py [--gap-budget-ms 1000] [--rate 20]
+"""
+
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import config
+import responses
+from fakes import FakeServices, behaviors_from_args
+
+BOOT = """
+import os, sys
+os.chdir({root!r})
+sys.path.insert(0, {root!r})
+import config
+config.TELEGRAM_API_URL = {telegram!r}
+config.API_BASE_URL = {reflexai!r}
+config.CHAT_API_URL = {reflexai!r} + "/chat/completions"
+config.IMAGE_API_URL = {reflexai!r} + "/images/generate"
+config.TTS_API_URL = {reflexai!r} + "/audio/speech"
+config.COMMANDS_HASH_PATH = {state_dir!r} + "/commands_hash"
+config.UPDATE_STATE_PATH = {state_dir!r} + "/update_state.json"
+config.JOB_QUEUE_PATH = {state_dir!r} + "/jobs.sqlite3"
+config.RESTART_SNAPSHOT_PATH = {state_dir!r} + "/restart_snapshot.json"
+config.RESTART_HANDOFF_PATH = {state_dir!r} + "/restart_handoff.json"
+config.RESTART_COMMAND = [sys.executable, {script!r}]
+config.RESTART_DRAIN_SECONDS = {drain}
+with open({state_dir!r} + "/pids", "a") as handle:
+    handle.write(f"{{os.getpid()}}\\n")
+sys.argv = ["main.py"]
+import runpy
+runpy.run_path("main.py", run_name="__main__")
+"""
+
+CHAT_USER = 900001
+IMAGE_USER = 900002
+
+
+class Feeder:
+    """Builds updates with increasing update_ids and remembers when each was sent"""
+
+    def __init__(self, fakes: FakeServices):
+        self.fakes = fakes
+        self.next_id = 1
+        self.sent = {}
+
+    def send(self, user_id: int, text: str = None, callback_data: str = None):
+        user = {"id": user_id, "is_bot": False, "first_name": f"User{user_id}"}
+        chat = {"id": user_id, "type": "private"}
+        if callback_data is not None:
+            payload = {"callback_query": {
+                "id": str(self.next_id), "from": user, "chat_instance": "1", "data": callback_data,
+                "message": {"message_id": 1, "date": 0, "chat": chat, "text": "menu"}
+            }}
+        else:
+            payload = {"message": {"message_id": self.next_id, "date": int(time.time()),
+                                   "chat": chat, "from": user, "text": text}}
+        self.sent.setdefault(user_id, []).append(time.time())
+        self.fakes.enqueue({"update_id": self.next_id, **payload})
+        self.next_id += 1
+
+
+def wait_for(predicate, timeout: float, interval: float = 0.05) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(interval)
+    return predicate()
+
+
+def read_pids(state_dir: str) -> list:
+    try:
+        with open(os.path.join(state_dir, "pids")) as handle:
+            return [int(line) for line in handle if line.strip()]
+    except FileNotFoundError:
+        return []
+
+
+def run(fakes: FakeServices, state_dir: str, rate: float, before: float, after: float, drain: float) -> dict:
+    script = os.path.join(state_dir, "boot.py")
+    with open(script, "w") as handle:
+        handle.write(BOOT.format(root=str(ROOT), telegram=fakes.telegram_url,
+                                 reflexai=f"{fakes.reflexai_url}/v1", state_dir=state_dir, script=script,
+                                 drain=drain))
+    log = open(os.path.join(state_dir, "bot.log"), "w")
+    old = subprocess.Popen([sys.executable, script], cwd=ROOT, stdout=log, stderr=subprocess.STDOUT)
+    try:
+        if not wait_for(lambda: fakes.stats()["telegram"].get("getUpdates"), 30):
+            raise RuntimeError("bot never polled")
+        feeder = Feeder(fakes)
+        feeder.send(CHAT_USER, "/chat")
+        feeder.send(IMAGE_USER, "/image a lighthouse in a storm")
+
+        interval = 1 / rate
+        start_users = []
+        restart_at = None
+        started = time.time()
+        next_user = 1
+        while time.time() - started < before + after:
+            if restart_at is None and time.time() - started >= before:
+                feeder.send(config.ADMIN_ID, callback_data="admin_restart")
+                restart_at = time.time()
+            if restart_at is not None and len(feeder.sent[CHAT_USER]) == 1 and time.time() - restart_at >= 0.5:
+                # Only the new process can answer this in chat mode
+                feeder.send(CHAT_USER, "Are you still there?")
+            feeder.send(next_user, "/start")
+            start_users.append(next_user)
+            next_user += 1
+            time.sleep(interval)
+
+        pids = read_pids(state_dir)
+        old_exited = wait_for(lambda: old.poll() is not None, drain + 5)
+        wait_for(lambda: any(call[1] == "sendPhoto" for call in fakes.replies().get(str(IMAGE_USER), [])), 15)
+        time.sleep(1)
+        replies = fakes.replies()
+    finally:
+        for pid in read_pids(state_dir):
+            try:
+                os.kill(pid, signal.SIGINT)
+            except ProcessLookupError:
+                pass
+        time.sleep(1)
+        for pid in read_pids(state_dir):
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        old.wait(5)
+        log.close()
+
+    latencies = []
+    missing = duplicates = 0
+    for user_id in start_users:
+        sent = [reply for reply in replies.get(str(user_id), []) if reply[1] == "sendMessage"]
+        if not sent:
+            missing += 1
+            continue
+        duplicates += len(sent) > 1
+        latencies.append(sent[0][0] - feeder.sent[user_id][0])
+    latencies.sort()
+
+    chat_replies = [text for _, method, text in replies.get(str(CHAT_USER), []) if method == "sendMessage"]
+    image_calls = replies.get(str(IMAGE_USER), [])
+    photos = [call for call in image_calls if call[1] in ("sendPhoto", "sendMediaGroup")]
+    return {
+        "start_updates": len(start_users),
+        "processes": len(pids),
+        "gap_ms": round(latencies[-1] * 1000, 1) if latencies else None,
+        "p50_reply_ms": round(latencies[len(latencies) // 2] * 1000, 1) if latencies else None,
+        "missing_replies": missing,
+        "duplicate_replies": duplicates,
+        "chat_mode_kept": any(text.startswith(responses.THINKING_TEXT[:20]) for text in chat_replies),
+        "image_deliveries": len(photos),
+        "image_finished_after_restart_ms": round((photos[0][0] - restart_at) * 1000, 1) if photos else None,
+        "old_process_exited": old_exited,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[2])
+    parser.add_argument("--gap-budget-ms", type=float, default=1000,
+                        help="limit for the slowest /start reply across the restart")
+    parser.add_argument("--rate", type=float, default=20, help="/start updates per second")
+    parser.add_argument("--before", type=float, default=2, help="seconds of traffic before the restart")
+    parser.add_argument("--after", type=float, default=4, help="seconds of traffic after the restart")
+    parser.add_argument("--image-latency", default="fixed:3")
+    parser.add_argument("--drain-seconds", type=float, default=config.RESTART_DRAIN_SECONDS,
+                        help="lower than the image latency to exercise the handoff instead of the drain")
+    args = parser.parse_args()
+
+    settings = behaviors_from_args([
+        "telegram=fixed:0.02", "chat=fixed:0.2", f"image={args.image_latency}",
+    ])
+    with FakeServices(settings) as fakes, tempfile.TemporaryDirectory() as state_dir:
+        result = run(fakes, state_dir, args.rate, args.before, args.after, args.drain_seconds)
+
+    checks = {
+        "gap_within_budget": result["gap_ms"] is not None and result["gap_ms"] < args.gap_budget_ms,
+        "no_missing_replies": result["missing_replies"] == 0,
+        "no_duplicate_replies": result["duplicate_replies"] == 0,
+        "chat_mode_kept": result["chat_mode_kept"],
+        "image_delivered_once": result["image_deliveries"] == 1,
+        "old_process_exited": result["old_process_exited"],
+    }
+    print(json.dumps({"benchmark": "restart", "gap_budget_ms": args.gap_budget_ms,
+                      "result": result, "checks": checks}, indent=2))
+    sys.exit(0 if all(checks.values()) else 1)
+
+
+if __name__ == "__main__":
+    main()
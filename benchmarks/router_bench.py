@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+RYSTRIX AI Router Benchmark
+Dispatch cost with many registered routes: the router's dict lookup vs
+telebot's per-handler filter scan
+
+Usage: python benchmarks/router_bench.py [--routes 1000] [--updates 3000]
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from telebot import types
+from telebot.async_telebot import AsyncTeleBot
+
+import router as router_module
+
+
+class NullBot:
+    def __init__(self):
+        self.sent = 0
+
+    async def answer_callback_query(self, *args, **kwargs):
+        pass
+
+    async def send_message(self, *args, **kwargs):
+        self.sent += 1
+
+
+def make_message(text: str):
+    return types.Message.de_json(json.dumps({
+        "message_id": 1, "date": 0, "chat": {"id": 5, "type": "private"},
+        "from": {"id": 5, "is_bot": False, "first_name": "Ann"}, "text": text
+    }))
+
+
+def make_callback(data: str):
+    return types.CallbackQuery.de_json(json.dumps({
+        "id": "1", "from": {"id": 5, "is_bot": False, "first_name": "Ann"}, "chat_instance": "1", "data": data,
+        "message": {"message_id": 2, "date": 0, "chat": {"id": 5, "type": "private"}, "text": "menu"}
+    }))
+
+
+async def noop(update):
+    pass
+
+
+async def time_per_update(dispatch, updates: list, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for update in updates:
+            await dispatch(update)
+    return (time.perf_counter() - started) / (repeat * len(updates)) * 1e6
+
+
+async def run(routes: int, updates: int) -> dict:
+    names = [f"cmd{i}" for i in range(routes)]
+    # First, middle and last registered routes
+    probes = [names[0], names[routes // 2], names[-1]]
+    messages = [make_message(f"/{name} some text") for name in probes]
+    callbacks = [make_callback(name) for name in probes]
+    repeat = max(1, updates // len(probes))
+
+    # telebot: one handler per command, filters tested in registration order
+    bot = AsyncTeleBot("1:bench")
+    for name in names:
+        bot.register_message_handler(noop, commands=[name])
+        bot.register_callback_query_handler(noop, func=lambda call, data=name: call.data == data)
+    telebot_message = await time_per_update(
+        lambda m: bot._process_updates(bot.message_handlers, [m], "message"), messages, repeat)
+    telebot_callback = await time_per_update(
+        lambda c: bot._process_updates(bot.callback_query_handlers, [c], "callback_query"), callbacks, repeat)
+
+    # Router with no middlewares isolates the lookup itself
+    bare = router_module.Router()
+    bare.bot = NullBot()
+    for name in names:
+        bare.command(name)(noop)
+        bare.callback(name)(noop)
+    router_message = await time_per_update(bare.dispatch_message, messages, repeat)
+    router_callback = await time_per_update(bare.dispatch_callback, callbacks, repeat)
+
+    # Router with the production middleware chain
+    full = router_module.Router()
+    full.bot = NullBot()
+    for name in names:
+        full.command(name)(noop)
+        full.callback(name)(noop)
+    full.use(router_module.TimingMiddleware())
+    full.use(router_module.error_middleware)
+    full.use(router_module.ThrottleMiddleware(0))
+    full.use(router_module.answer_callback_middleware)
+    full.use(router_module.stats_middleware)
+    full.use(router_module.chat_mode_middleware)
+    pipeline_message = await time_per_update(full.dispatch_message, messages, repeat)
+    pipeline_callback = await time_per_update(full.dispatch_callback, callbacks, repeat)
+
+    return {
+        "routes": routes,
+        "us_per_update": {
+            "telebot_scan_message": round(telebot_message, 2),
+            "telebot_scan_callback": round(telebot_callback, 2),
+            "router_message": round(router_message, 2),
+            "router_callback": round(router_callback, 2),
+            "router_with_middlewares_message": round(pipeline_message, 2),
+            "router_with_middlewares_callback": round(pipeline_callback, 2),
+        },
+    }
+
+
+async def burst(size: int, interval: float, max_delay: float) -> dict:
+    """One user pastes size messages at once through the throttle"""
+    handled = []
+    throttled = router_module.Router()
+    throttled.bot = NullBot()
+
+    @throttled.default()
+    async def message(update):
+        handled.append(time.perf_counter())
+
+    throttled.use(router_module.ThrottleMiddleware(interval, max_delay))
+    started = time.perf_counter()
+    await asyncio.gather(*(throttled.dispatch_message(make_message(f"part {i}")) for i in range(size)))
+    return {"sent": size, "handled": len(handled), "resend_notices": throttled.bot.sent,
+            "last_handled_after_ms": round((max(handled) - started) * 1000)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[2])
+    parser.add_argument("--routes", type=int, default=1000)
+    parser.add_argument("--updates", type=int, default=3000)
+    args = parser.parse_args()
+    result = asyncio.run(run(args.routes, args.updates))
+    short = asyncio.run(burst(5, 0.3, 3.0))
+    flood = asyncio.run(burst(30, 0.3, 3.0))
+    checks = {
+        "short_burst_fully_handled": short["handled"] == short["sent"] and short["resend_notices"] == 0,
+        "flood_told_once_to_resend": flood["resend_notices"] == 1 and 0 < flood["handled"] < flood["sent"],
+    }
+    print(json.dumps({"benchmark": "router_dispatch", **result,
+                      "throttle_bursts": {"short": short, "flood": flood}, "checks": checks}, indent=2))
+    sys.exit(0 if all(checks.values()) else 1)
+
+
+if __name__ == "__main__":
+    main()
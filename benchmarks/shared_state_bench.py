@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+RYSTRIX AI Shared State Benchmark
+Runs handler-style state reads and writes on the event loop while background
+threads hammer update_stats, for the previous lock-based shared.py and the
+loop-owned one, and reports loop stalls, per-call latency and lost updates
+
+Usage: python benchmarks/shared_state_bench.py [--threads 4] [--seconds 3]
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import shared
+from load_test import percentiles
+
+
+class LockedShared:
+    """The previous shared.py: one threading.Lock around every read and write"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.user_conversations = {}
+        self.chat_mode_users = set()
+        self.bot_stats = {"total_messages": 0, "total_images": 0, "total_tts": 0,
+                          "active_users": set(), "errors": 0}
+
+    def add_conversation(self, user_id, role, content):
+        with self._lock:
+            history = self.user_conversations.setdefault(user_id, [])
+            history.append({"role": role, "content": content})
+            if len(history) > 20:
+                self.user_conversations[user_id] = history[-20:]
+
+    def get_conversation(self, user_id):
+        with self._lock:
+            return self.user_conversations.get(user_id, []).copy()
+
+    def add_chat_mode_user(self, user_id):
+        with self._lock:
+            self.chat_mode_users.add(user_id)
+
+    def is_in_chat_mode(self, user_id):
+        with self._lock:
+            return user_id in self.chat_mode_users
+
+    def update_stats(self, stat_type, user_id=None):
+        with self._lock:
+            if stat_type in self.bot_stats:
+                if isinstance(self.bot_stats[stat_type], int):
+                    self.bot_stats[stat_type] += 1
+                elif isinstance(self.bot_stats[stat_type], set) and user_id:
+                    self.bot_stats[stat_type].add(user_id)
+
+    def get_stats(self):
+        with self._lock:
+            stats = self.bot_stats.copy()
+            for key, value in stats.items():
+                if isinstance(value, set):
+                    stats[key] = len(value)
+            return stats
+
+
+def hammer(state, stop: threading.Event, counts: list, index: int):
+    """Executor-style worker: bursts of stat updates and conversation writes"""
+    done = 0
+    while not stop.is_set():
+        for _ in range(200):
+            state.update_stats("total_images")
+            state.update_stats("active_users", 100000 + index)
+        state.add_conversation(200000 + index, "user", "hello from a thread")
+        done += 200
+        time.sleep(0.0005)
+    counts[index] = done
+
+
+async def loop_workload(state, seconds: float, users: int) -> dict:
+    loop = asyncio.get_running_loop()
+    lags, calls = [], []
+    tick = 0.001
+    deadline = loop.time() + seconds
+    user = 0
+    while loop.time() < deadline:
+        expected = loop.time() + tick
+        await asyncio.sleep(tick)
+        lags.append(max(0.0, loop.time() - expected))
+        # What a handler does per update: chat-mode check, history read, stats
+        user = (user + 1) % users
+        started = time.perf_counter()
+        state.is_in_chat_mode(user)
+        state.get_conversation(user)
+        state.update_stats("total_messages")
+        state.update_stats("active_users", user)
+        if user % 100 == 0:
+            state.get_stats()
+        calls.append(time.perf_counter() - started)
+    return {
+        "ticks": len(lags),
+        "loop_lag_ms": percentiles(lags),
+        # Twice the interpreter's 5 ms GIL switch interval: longer waits are not thread scheduling
+        "stalls_over_10ms": sum(lag > 0.010 for lag in lags),
+        # percentiles() reports milliseconds; feed it milliseconds to read microseconds
+        "state_calls_us": percentiles([seconds * 1000 for seconds in calls]),
+        "_messages": len(calls),
+    }
+
+
+def run(state, threads: int, seconds: float, users: int) -> dict:
+    for user_id in range(0, users, 2):
+        state.add_chat_mode_user(user_id)
+        state.add_conversation(user_id, "user", "hi")
+    stop = threading.Event()
+    counts = [0] * threads
+    workers = [threading.Thread(target=hammer, args=(state, stop, counts, i)) for i in range(threads)]
+
+    async def main():
+        if state is shared:
+            shared.bind_loop()
+        for worker in workers:
+            worker.start()
+        try:
+            return await loop_workload(state, seconds, users)
+        finally:
+            stop.set()
+            await asyncio.to_thread(lambda: [worker.join() for worker in workers])
+            # Let handed-off conversation writes run
+            await asyncio.sleep(0.01)
+
+    before = state.get_stats()
+    result = asyncio.run(main())
+    after = state.get_stats()
+    messages = result.pop("_messages")
+    result["thread_updates"] = sum(counts)
+    result["lost_updates"] = (sum(counts) - (after["total_images"] - before["total_images"])
+                              + messages - (after["total_messages"] - before["total_messages"]))
+    result["thread_histories_written"] = sum(
+        bool(state.get_conversation(200000 + i)) for i in range(threads))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[2])
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=3)
+    parser.add_argument("--users", type=int, default=10000)
+    args = parser.parse_args()
+
+    locked = run(LockedShared(), args.threads, args.seconds, args.users)
+    loop_owned = run(shared, args.threads, args.seconds, args.users)
+    checks = {
+        "no_lost_updates": loop_owned["lost_updates"] == 0,
+        "thread_writes_handed_to_loop": loop_owned["thread_histories_written"] == args.threads,
+        "no_loop_stalls": loop_owned["stalls_over_10ms"] == 0,
+        "lower_p99_lag_than_lock": loop_owned["loop_lag_ms"]["p99"] <= locked["loop_lag_ms"]["p99"],
+    }
+    print(json.dumps({"benchmark": "shared_state", "threads": args.threads, "seconds": args.seconds,
+                      "locked": locked, "loop_owned": loop_owned, "checks": checks}, indent=2))
+    sys.exit(0 if all(checks.values()) else 1)
+
+
+if __name__ == "__main__":
+    main()
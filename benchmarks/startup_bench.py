@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+RYSTRIX AI Startup Benchmark
+Boots main.py with --profile-startup against the fake Bot API and checks
+time-to-first-getUpdates against a budget, cold and with cached commands
+
+Usage: python benchmarks/startup_bench.py [--budget-ms 1500] [--boots 3]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from fakes import FakeServices, behaviors_from_args
+
+BOOT = """
+import sys
+import config
+config.TELEGRAM_API_URL = {telegram!r}
+config.API_BASE_URL = {reflexai!r}
+config.COMMANDS_HASH_PATH = {hash_path!r}
+config.UPDATE_STATE_PATH = {state_path!r}
+config.JOB_QUEUE_PATH = {job_path!r}
+sys.argv = ["main.py", "--profile-startup"]
+import runpy
+runpy.run_path("main.py", run_name="__main__")
+"""
+
+
+def boot(fakes: FakeServices, state_dir: str) -> dict:
+    """Start main.py in a fresh interpreter and return its startup profile"""
+    code = BOOT.format(
+        telegram=fakes.telegram_url, reflexai=f"{fakes.reflexai_url}/v1",
+        hash_path=os.path.join(state_dir, "commands_hash"),
+        state_path=os.path.join(state_dir, "update_state.json"),
+        job_path=os.path.join(state_dir, "jobs.sqlite3"),
+    )
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, timeout=60)
+    wall_ms = (time.perf_counter() - started) * 1000
+    if result.returncode != 0:
+        raise RuntimeError(f"main.py exited with {result.returncode}:\n{result.stderr[-2000:]}")
+    start = result.stdout.index("{")
+    profile = json.loads(result.stdout[start:])["startup_profile"]
+    profile["process_wall_ms"] = round(wall_ms, 1)
+    return profile
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[2])
+    parser.add_argument("--budget-ms", type=float, default=1500,
+                        help="limit for process start to first getUpdates with cached commands")
+    parser.add_argument("--boots", type=int, default=3, help="warm boots to average")
+    parser.add_argument("--telegram-latency", default="fixed:0.05")
+    args = parser.parse_args()
+
+    settings = behaviors_from_args([f"telegram={args.telegram_latency}"])
+    with FakeServices(settings) as fakes, tempfile.TemporaryDirectory() as state_dir:
+        cold = boot(fakes, state_dir)
+        warm = [boot(fakes, state_dir) for _ in range(args.boots)]
+        calls = fakes.stats()["telegram"]
+
+    warm_wall = sorted(profile["process_wall_ms"] for profile in warm)[len(warm) // 2]
+    checks = {
+        "set_my_commands_called_once": calls.get("setMyCommands", 0) == 1,
+        "within_budget": warm_wall <= args.budget_ms,
+    }
+    print(json.dumps({
+        "benchmark": "startup",
+        "budget_ms": args.budget_ms,
+        "cold": cold,
+        "warm": warm[len(warm) // 2],
+        "warm_median_wall_ms": warm_wall,
+        "telegram_calls": calls,
+        "checks": checks,
+    }, indent=2))
+    sys.exit(0 if all(checks.values()) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+RYSTRIX AI TTS Benchmark
+Runs /say jobs end to end (speech request, encoding, upload) against an
+upstream that serves Opus natively and one that only serves MP3, then
+repeats the texts, and reports upload bytes, latency, loop lag and how the
+per-text audio cache and file_id reuse cut upstream calls
+
+Usage: python benchmarks/tts_bench.py [--texts 24] [--concurrency 4]
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import config
+import tts_audio
+from fakes import FakeServices, behaviors_from_args
+from load_test import percentiles, point_at_fakes
+from media_relay import MediaRelay
+
+SENTENCE = "The quick brown fox jumps over the lazy dog while the bot reads this aloud. "
+
+
+def say_texts(count: int) -> list:
+    # 75 to 900 characters, five seconds to a minute of speech
+    return [f"{i}. " + SENTENCE * (1 + i % 12) for i in range(count)]
+
+
+def recordings(directory: str) -> dict:
+    """Real 20 s MP3 and Opus files for the fake upstream, so ffmpeg gets decodable input"""
+    paths = {"mp3": os.path.join(directory, "speech.mp3"), "opus": os.path.join(directory, "speech.ogg")}
+    source = ["-f", "lavfi", "-i", "sine=frequency=220:duration=20", "-ac", "1"]
+    subprocess.run([tts_audio.FFMPEG, "-y", "-loglevel", "error", *source, "-b:a", "128k", paths["mp3"]], check=True)
+    subprocess.run([tts_audio.FFMPEG, "-y", "-loglevel", "error", *source, "-c:a", "libopus", "-b:a", "32k",
+                    paths["opus"]], check=True)
+    return paths
+
+
+async def say_all(main, texts: list, concurrency: int) -> tuple:
+    """Run one TTS job per text; returns (job latencies, loop lag samples) in seconds"""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, lags = [], []
+    done = asyncio.Event()
+
+    async def ticker():
+        loop = asyncio.get_running_loop()
+        while not done.is_set():
+            expected = loop.time() + 0.01
+            await asyncio.sleep(0.01)
+            lags.append(max(0.0, loop.time() - expected))
+
+    async def say(i: int, text: str):
+        async with semaphore:
+            started = time.perf_counter()
+            await main.process_tts_generation(text, 5000 + i, 1, 1)
+            latencies.append(time.perf_counter() - started)
+
+    tick = asyncio.create_task(ticker())
+    await asyncio.gather(*(say(i, text) for i, text in enumerate(texts)))
+    done.set()
+    await tick
+    return latencies, lags
+
+
+async def phase(fakes: FakeServices, main, texts: list, concurrency: int) -> dict:
+    fakes.reset()
+    latencies, lags = await say_all(main, texts, concurrency)
+    calls = fakes.stats()
+    uploaded = fakes.uploaded_bytes()
+    return {
+        "say_latency_ms": percentiles(latencies),
+        "loop_lag_ms": percentiles(lags),
+        "upstream_tts_calls": calls["reflexai"].get("tts", 0),
+        "upload_bytes": uploaded,
+        "upload_kb_per_voice": round(uploaded / len(texts) / 1024, 1),
+    }
+
+
+async def phases(fakes: FakeServices, main, texts: list, concurrency: int, cache_bytes: int = None) -> dict:
+    main.tts_audio = tts_audio.TtsAudio(cache_bytes=cache_bytes)
+    main.media_relay = MediaRelay()
+    try:
+        first = await phase(fakes, main, texts, concurrency)
+        # Same texts again: sent by the file_id Telegram returned
+        repeated = await phase(fakes, main, texts, concurrency)
+        # File_ids lost (or rejected): uploaded again from the per-text audio cache
+        main.media_relay._file_ids.clear()
+        from_cache = await phase(fakes, main, texts, concurrency)
+    finally:
+        await main.media_relay.close()
+        await main.tts_audio.close()
+        await main.bot.close_session()
+    return {"first": first, "repeated": repeated, "file_ids_lost": from_cache,
+            "voice": main.tts_audio.snapshot()}
+
+
+def upstream_run(settings: dict, options: dict, texts: list, concurrency: int, cache_bytes: int = None) -> dict:
+    import main
+    import workers
+
+    with FakeServices(settings, reflexai_options=options) as fakes:
+        try:
+            return asyncio.run(phases(fakes, main, texts, concurrency, cache_bytes))
+        finally:
+            workers.shutdown_pool()
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[2])
+    parser.add_argument("--texts", type=int, default=24)
+    parser.add_argument("--concurrency", type=int, default=config.JOB_WORKERS["tts"])
+    args = parser.parse_args()
+
+    settings = behaviors_from_args([])
+    texts = say_texts(args.texts)
+    with tempfile.TemporaryDirectory() as directory:
+        files = recordings(directory) if tts_audio.FFMPEG else None
+        # Point config at the fakes before main reads it at import
+        point_at_fakes(FakeServices(settings))
+        import main  # noqa: F401
+        logging.getLogger().setLevel(logging.CRITICAL)
+        native = upstream_run(settings, {"opus_speech": True, "speech_files": files}, texts, args.concurrency)
+        mp3_only = upstream_run(settings, {"opus_speech": False, "speech_files": files}, texts, args.concurrency)
+        # One text the upstream cannot say as Opus must not cost the others their Opus
+        one_rejected = upstream_run(settings, {"opus_speech": True, "speech_files": files,
+                                               "opus_rejected": (texts[0],)}, texts, args.concurrency)
+        # Native Opus goes straight into the upload; with no room to cache it nothing is kept
+        uncached = upstream_run(settings, {"opus_speech": True, "speech_files": files}, texts, args.concurrency,
+                                cache_bytes=1)
+
+    fallback_path = "transcoded" if tts_audio.FFMPEG else "mp3"
+    checks = {
+        "negotiates_opus": native["voice"]["native"] == args.texts and native["voice"]["native_opus"] is True,
+        "falls_back_without_opus": mp3_only["voice"][fallback_path] == args.texts
+                                   and mp3_only["voice"]["native_opus"] is False,
+        # Against the MP3 the upstream sends, which is what every voice note used to be
+        "one_rejection_keeps_opus": one_rejected["voice"]["native"] == args.texts - 1
+                                    and one_rejected["voice"]["native_opus"] is True,
+        # Nothing cached, so the phase after losing the file_ids synthesizes every text again
+        "native_streams_unbuffered": uncached["voice"]["native"] == 2 * args.texts
+                                     and uncached["voice"]["cached_texts"] == 0
+                                     and uncached["first"]["upload_bytes"] >= uncached["voice"]["upstream_bytes"] // 2,
+        "opus_uploads_under_half_of_mp3": native["first"]["upload_bytes"] < 0.5 * mp3_only["voice"]["upstream_bytes"]
+                                          and (not tts_audio.FFMPEG or mp3_only["first"]["upload_bytes"]
+                                               < 0.5 * mp3_only["voice"]["upstream_bytes"]),
+        "repeats_reuse_file_id": native["repeated"]["upstream_tts_calls"] == 0
+                                 and native["repeated"]["upload_bytes"] == 0,
+        "audio_cached_per_text": native["file_ids_lost"]["upstream_tts_calls"] == 0
+                                 and mp3_only["file_ids_lost"]["upstream_tts_calls"] == 0,
+        "loop_stays_free": mp3_only["first"]["loop_lag_ms"]["p99"] < 20,
+    }
+    print(json.dumps({"benchmark": "tts", "texts": args.texts, "concurrency": args.concurrency,
+                      "ffmpeg": tts_audio.FFMPEG, "real_recordings": files is not None,
+                      "opus_upstream": native, "mp3_only_upstream": {"path": fallback_path, **mp3_only},
+                      "one_text_rejected_as_opus": one_rejected["voice"],
+                      "opus_upstream_no_audio_cache": uncached["voice"],
+                      "checks": checks}, indent=2))
+    sys.exit(0 if all(checks.values()) else 1)
+
+
+if __name__ == "__main__":
+    main_cli()
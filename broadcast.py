@@ -0,0 +1,460 @@
+#!/usr/bin/env python3
+"""
+RYSTRIX AI Broadcast
+Persistent user registry and rate-limited, resumable admin announcements
+"""
+
+import asyncio
+import json
+import logging
+import sqlite3
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+import aiohttp
+import config
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    user_id INTEGER PRIMARY KEY,
+    first_seen REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS blocked_users (
+    user_id INTEGER PRIMARY KEY,
+    reason TEXT NOT NULL,
+    blocked_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS broadcasts (
+    id INTEGER PRIMARY KEY,
+    method TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'running',
+    cursor INTEGER NOT NULL DEFAULT 0,
+    total INTEGER NOT NULL,
+    sent INTEGER NOT NULL DEFAULT 0,
+    blocked INTEGER NOT NULL DEFAULT 0,
+    failed INTEGER NOT NULL DEFAULT 0,
+    status_chat_id INTEGER,
+    status_message_id INTEGER,
+    lease_until REAL NOT NULL DEFAULT 0,
+    created REAL NOT NULL
+);
+"""
+
+# Bot API send method and file field for each kind of message that can be broadcast
+MEDIA_FIELDS = {
+    "photo": "sendPhoto",
+    "video": "sendVideo",
+    "animation": "sendAnimation",
+    "document": "sendDocument",
+    "audio": "sendAudio",
+    "voice": "sendVoice",
+}
+
+# Errors meaning the user can never be reached again
+_GONE = ("bot was blocked by the user", "user is deactivated", "chat not found",
+         "bot can't initiate conversation", "bot was kicked")
+
+
+def message_payload(message: dict) -> tuple:
+    """(method, payload) that re-sends a Bot API message by file_id, formatting included"""
+    for field, method in MEDIA_FIELDS.items():
+        media = message.get(field)
+        if media:
+            # Photos come as a list of sizes, largest last
+            file_id = media[-1]["file_id"] if isinstance(media, list) else media["file_id"]
+            payload = {field: file_id}
+            if message.get("caption"):
+                payload["caption"] = message["caption"]
+                if message.get("caption_entities"):
+                    payload["caption_entities"] = message["caption_entities"]
+            return method, payload
+    payload = {"text": message.get("text", "")}
+    if message.get("entities"):
+        payload["entities"] = message["entities"]
+    return "sendMessage", payload
+
+
+class RateLimiter:
+    """Spaces calls 1/rate apart across all senders; a 429 pushes everyone back"""
+
+    def __init__(self, rate: float):
+        self.interval = 1 / rate
+        self._next = 0.0
+
+    async def acquire(self):
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        slot = max(now, self._next)
+        self._next = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    def pause(self, seconds: float):
+        """Hold every sender until retry_after has passed"""
+        self._next = max(self._next, asyncio.get_running_loop().time() + seconds)
+
+
+class Broadcaster:
+    """User registry and broadcast runner backed by one SQLite file.
+
+    Users who open a private chat are registered in memory at once and
+    written in batches. A broadcast walks the registry in user_id order and
+    checkpoints the highest user_id below which every send has finished, so
+    a broadcast interrupted by a crash or restart resumes where it stopped,
+    repeating at most the sends of one checkpoint interval. Users who
+    blocked the bot or deleted their account are moved to blocked_users.
+    """
+
+    def __init__(self, bot, path: str = None, rate: float = None, concurrency: int = None,
+                 token: str = None, api_url: str = None):
+        self.bot = bot
+        self.path = path or config.BROADCAST_DB_PATH
+        self.rate = rate or config.BROADCAST_RATE
+        self.concurrency = concurrency or config.BROADCAST_CONCURRENCY
+        self.token = token or config.BOT_TOKEN
+        self.api_url = (api_url or config.TELEGRAM_API_URL).rstrip("/")
+        self._known = set()
+        self._new = {}  # user_id -> first seen, waiting for the next flush
+        self._flush_task = None
+        self._session = None
+        self._db = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="broadcast")
+        self._task = None
+        self._resume_task = None
+        self.current = None  # row dict of the broadcast this process is running
+        self.rate_limited = 0
+
+    async def _run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    def _open(self) -> list:
+        db = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.executescript(_SCHEMA)
+        self._db = db
+        return [row[0] for row in db.execute("SELECT user_id FROM users")]
+
+    # Registry
+
+    def seen(self, user_id: int):
+        """Register a user who talked to the bot in private; O(1) when already known"""
+        if user_id in self._known:
+            return
+        self._known.add(user_id)
+        self._new[user_id] = time.time()
+
+    async def middleware(self, ctx, call_next):
+        """Router middleware registering private-chat users"""
+        if ctx.user_id is not None and ctx.chat_id == ctx.user_id:
+            self.seen(ctx.user_id)
+        await call_next(ctx)
+
+    def _insert_users(self, users: list):
+        self._db.execute("BEGIN")
+        self._db.executemany("INSERT OR IGNORE INTO users (user_id, first_seen) VALUES (?, ?)", users)
+        # Someone who blocked us and came back can be reached again
+        self._db.executemany("DELETE FROM blocked_users WHERE user_id = ?", [(user,) for user, _ in users])
+        self._db.execute("COMMIT")
+
+    async def flush(self):
+        """Write newly seen users"""
+        if not self._new or self._db is None:
+            return
+        users, self._new = list(self._new.items()), {}
+        try:
+            await self._run(self._insert_users, users)
+        except sqlite3.Error as e:
+            logger.error("Failed to save %s users: %s", len(users), e)
+            for user_id, first_seen in users:
+                self._new.setdefault(user_id, first_seen)
+
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(1.0)
+            await self.flush()
+
+    def _block(self, users: list):
+        self._db.execute("BEGIN")
+        self._db.executemany("DELETE FROM users WHERE user_id = ?", [(user,) for user, _ in users])
+        self._db.executemany(
+            "INSERT OR REPLACE INTO blocked_users (user_id, reason, blocked_at) VALUES (?, ?, ?)",
+            [(user, reason, time.time()) for user, reason in users])
+        self._db.execute("COMMIT")
+
+    def user_count(self) -> int:
+        return len(self._known)
+
+    # Bot API
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(total=config.API_TIMEOUT),
+                connector=aiohttp.TCPConnector(limit=self.concurrency)
+            )
+        return self._session
+
+    async def _send(self, method: str, payload: dict) -> tuple:
+        """(ok, description, retry_after) for one Bot API call"""
+        url = f"{self.api_url}/bot{self.token}/{method}"
+        try:
+            async with self._get_session().post(url, json=payload) as response:
+                result = await response.json(content_type=None)
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            return False, str(e) or e.__class__.__name__, None
+        if result.get("ok"):
+            return True, None, None
+        retry_after = (result.get("parameters") or {}).get("retry_after")
+        return False, result.get("description", str(result.get("error_code"))), retry_after
+
+    # Broadcasting
+
+    def _create(self, method: str, payload: dict, status_chat_id: int, status_message_id: int) -> dict:
+        total = self._db.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+        now = time.time()
+        cursor = self._db.execute(
+            "INSERT INTO broadcasts (method, payload, total, status_chat_id, status_message_id, lease_until, created) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (method, json.dumps(payload), total, status_chat_id, status_message_id,
+             now + config.BROADCAST_LEASE_SECONDS, now))
+        return self._load(cursor.lastrowid)
+
+    def _load(self, broadcast_id: int) -> dict:
+        self._db.row_factory = sqlite3.Row
+        try:
+            row = self._db.execute("SELECT * FROM broadcasts WHERE id = ?", (broadcast_id,)).fetchone()
+        finally:
+            self._db.row_factory = None
+        return dict(row)
+
+    def _claim(self) -> Optional[dict]:
+        """Take over a running broadcast whose owner stopped renewing its lease"""
+        now = time.time()
+        row = self._db.execute(
+            "UPDATE broadcasts SET lease_until = ? WHERE id = (SELECT id FROM broadcasts "
+            "WHERE state = 'running' AND lease_until <= ? ORDER BY id LIMIT 1) RETURNING id",
+            (now + config.BROADCAST_LEASE_SECONDS, now)).fetchone()
+        return self._load(row[0]) if row else None
+
+    def _running_elsewhere(self) -> bool:
+        return self._db.execute("SELECT 1 FROM broadcasts WHERE state = 'running' AND lease_until > ?",
+                                (time.time(),)).fetchone() is not None
+
+    def _renew(self, broadcast_id: int) -> bool:
+        """Extend this process's lease; False once the broadcast was stopped from anywhere"""
+        return self._db.execute(
+            "UPDATE broadcasts SET lease_until = ? WHERE id = ? AND state = 'running' RETURNING id",
+            (time.time() + config.BROADCAST_LEASE_SECONDS, broadcast_id)).fetchone() is not None
+
+    def _stop(self) -> Optional[int]:
+        row = self._db.execute("UPDATE broadcasts SET state = 'stopped' WHERE state = 'running' "
+                               "RETURNING id").fetchone()
+        return row[0] if row else None
+
+    def _checkpoint(self, broadcast: dict, lease: bool = True):
+        # A stop written by /broadcast stop in any process is never undone
+        self._db.execute(
+            "UPDATE broadcasts SET cursor = ?, sent = ?, blocked = ?, failed = ?, "
+            "state = CASE WHEN state = 'stopped' THEN state ELSE ? END, lease_until = ? "
+            "WHERE id = ?",
+            (broadcast["cursor"], broadcast["sent"], broadcast["blocked"], broadcast["failed"],
+             broadcast["state"], time.time() + config.BROADCAST_LEASE_SECONDS if lease else 0,
+             broadcast["id"]))
+
+    def _page(self, after: int, limit: int) -> list:
+        return [row[0] for row in self._db.execute(
+            "SELECT user_id FROM users WHERE user_id > ? ORDER BY user_id LIMIT ?", (after, limit))]
+
+    async def start_broadcast(self, message: dict, status_chat_id: int, status_message_id: int) -> Optional[dict]:
+        """Begin broadcasting a Bot API message dict; None if one is already running"""
+        if self.current is not None or await self._run(self._running_elsewhere):
+            return None
+        # Users seen a moment ago are part of the audience too
+        await self.flush()
+        method, payload = message_payload(message)
+        broadcast = await self._run(self._create, method, payload, status_chat_id, status_message_id)
+        self._launch(broadcast)
+        return broadcast
+
+    def _launch(self, broadcast: dict):
+        self.current = broadcast
+        self._task = asyncio.create_task(self._broadcast(broadcast))
+
+    async def stop_broadcast(self) -> Optional[int]:
+        """Stop the running broadcast for good, whichever process runs it; its id, or None"""
+        broadcast_id = await self._run(self._stop)
+        if self._task is not None:
+            self.current["state"] = "stopped"
+            self._task.cancel()
+        # Another process notices at its next lease renewal
+        return broadcast_id
+
+    async def _deliver(self, broadcast: dict, limiter: RateLimiter, method: str, payload: dict,
+                       user_id: int, blocked: list):
+        attempts = 0
+        while True:
+            await limiter.acquire()
+            ok, error, retry_after = await self._send(method, {**payload, "chat_id": user_id})
+            if ok:
+                broadcast["sent"] += 1
+                return
+            if retry_after is not None:
+                # Flood control applies to the whole bot: everyone waits, nobody is skipped
+                self.rate_limited += 1
+                limiter.pause(retry_after)
+                continue
+            if any(reason in error.lower() for reason in _GONE):
+                broadcast["blocked"] += 1
+                blocked.append((user_id, error))
+                self._known.discard(user_id)
+                return
+            attempts += 1
+            if attempts >= config.BROADCAST_MAX_ATTEMPTS:
+                broadcast["failed"] += 1
+                logger.warning("Broadcast %s gave up on %s: %s", broadcast['id'], user_id, error)
+                return
+            await asyncio.sleep(attempts)
+
+    async def _broadcast(self, broadcast: dict):
+        payload = json.loads(broadcast["payload"])
+        method = broadcast["method"]
+        limiter = RateLimiter(self.rate)
+        semaphore = asyncio.Semaphore(self.concurrency)
+        window = deque()  # [user_id, done] in send order
+        blocked = []
+        tasks = set()
+        started = time.monotonic()
+        sent_before = broadcast["sent"] + broadcast["blocked"] + broadcast["failed"]
+        last_checkpoint = last_progress = 0.0
+        runner = asyncio.current_task()
+
+        async def heartbeat():
+            # Renewed apart from the send loop, which can wait out a retry_after longer than the lease
+            while True:
+                await asyncio.sleep(config.BROADCAST_LEASE_SECONDS / 3)
+                if not await self._run(self._renew, broadcast["id"]):
+                    logger.info("Broadcast %s was stopped elsewhere", broadcast['id'])
+                    broadcast["state"] = "stopped"
+                    runner.cancel()
+                    return
+
+        async def checkpoint(final: bool = False):
+            # Everything up to the first unfinished send is done
+            while window and window[0][1]:
+                broadcast["cursor"] = window.popleft()[0]
+            if blocked:
+                pruned = blocked[:]
+                blocked.clear()
+                await self._run(self._block, pruned)
+            await self._run(self._checkpoint, broadcast, not final)
+
+        async def one(entry):
+            try:
+                await self._deliver(broadcast, limiter, method, payload, entry[0], blocked)
+            finally:
+                entry[1] = True
+                semaphore.release()
+
+        renewer = asyncio.create_task(heartbeat())
+        try:
+            after = broadcast["cursor"]
+            while True:
+                page = await self._run(self._page, after, 500)
+                if not page:
+                    break
+                for user_id in page:
+                    await semaphore.acquire()
+                    entry = [user_id, False]
+                    window.append(entry)
+                    task = asyncio.create_task(one(entry))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+                    now = time.monotonic()
+                    if now - last_checkpoint >= config.BROADCAST_CHECKPOINT_INTERVAL:
+                        last_checkpoint = now
+                        await checkpoint()
+                    if now - last_progress >= config.BROADCAST_PROGRESS_INTERVAL:
+                        last_progress = now
+                        done = broadcast["sent"] + broadcast["blocked"] + broadcast["failed"] - sent_before
+                        await self._show_progress(broadcast, done / max(now - started, 1e-9))
+                after = page[-1]
+            await asyncio.gather(*tasks)
+            broadcast["state"] = "done"
+        except asyncio.CancelledError:
+            # Closing leaves the broadcast running for the next process; /broadcast stop ends it
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        finally:
+            renewer.cancel()
+            await asyncio.gather(renewer, return_exceptions=True)
+            await checkpoint(final=True)
+            if broadcast["state"] != "running":
+                await self._show_progress(broadcast, None)
+            self.current = None
+            self._task = None
+        logger.info("Broadcast %s finished: %s sent, %s blocked, %s failed",
+                    broadcast['id'], broadcast['sent'], broadcast['blocked'], broadcast['failed'])
+
+    def progress_text(self, broadcast: dict, rate: Optional[float]) -> str:
+        """Render the live status of a broadcast"""
+        done = broadcast["sent"] + broadcast["blocked"] + broadcast["failed"]
+        title = {"running": "running", "done": "finished", "stopped": "stopped"}[broadcast["state"]]
+        text = (
+            f"📣 **Broadcast #{broadcast['id']} {title}**\n\n"
+            f"✅ **Sent:** {broadcast['sent']} of {broadcast['total']}\n"
+            f"🚫 **Blocked (pruned):** {broadcast['blocked']}\n"
+            f"⚠️ **Failed:** {broadcast['failed']}\n"
+        )
+        if rate:
+            remaining = max(broadcast["total"] - done, 0)
+            text += f"⚡ **Rate:** {rate:.1f} msg/s | **ETA:** {remaining / rate:.0f}s\n"
+        return text
+
+    async def _show_progress(self, broadcast: dict, rate: Optional[float]):
+        if not broadcast.get("status_message_id"):
+            return
+        try:
+            await self.bot.edit_message_text(self.progress_text(broadcast, rate), broadcast["status_chat_id"],
+                                             broadcast["status_message_id"], parse_mode='Markdown')
+        except Exception as e:
+            logger.debug("Broadcast progress edit failed: %s", e)
+
+    async def _resume_when_free(self):
+        """Pick up an interrupted broadcast, waiting out another process's lease"""
+        while True:
+            broadcast = await self._run(self._claim)
+            if broadcast is not None:
+                logger.info("Resuming broadcast %s after user %s", broadcast['id'], broadcast['cursor'])
+                self._launch(broadcast)
+                return
+            if not await self._run(self._running_elsewhere):
+                return
+            await asyncio.sleep(config.BROADCAST_LEASE_SECONDS / 3)
+
+    # Lifecycle
+
+    async def start(self):
+        """Load the registry and resume an interrupted broadcast"""
+        self._known.update(await self._run(self._open))
+        self._flush_task = asyncio.create_task(self._flush_periodically())
+        self._resume_task = asyncio.create_task(self._resume_when_free())
+
+    async def close(self):
+        """Checkpoint a running broadcast, leaving it to resume, and save new users"""
+        for task in (self._flush_task, self._resume_task, self._task):
+            if task is not None:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+        await self.flush()
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        if self._db is not None:
+            await self._run(self._db.close)
+            self._db = None
+        self._executor.shutdown(wait=False)
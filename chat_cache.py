@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+RYSTRIX AI Chat Cache
+Answers repeated context-free questions from memory, including near-duplicates
+"""
+
+import hashlib
+import re
+import struct
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Optional
+
+import config
+
+_SPACES = re.compile(r"\s+")
+_TRAILING = re.compile(r"[\s?!.]+$")
+_NUMBERS = re.compile(r"\d+")
+# Prose punctuation dropped when comparing words; operators and symbols
+# ("2+2" and "2-2", "c++" and "c#") are part of the question and stay
+_APOSTROPHES = re.compile(r"['\u2019]")
+_PROSE = re.compile(r"[,;:!?\"\u201c\u201d]+|\.(?!\w)")
+
+
+def normalize(text: str) -> str:
+    """Case- and whitespace-insensitive form of a prompt, without trailing ?!."""
+    text = unicodedata.normalize("NFKC", text).casefold()
+    return _TRAILING.sub("", _SPACES.sub(" ", text).strip())
+
+
+def _words(normalized: str) -> tuple:
+    """Words of a normalized prompt for near-duplicate comparison"""
+    return tuple(_PROSE.sub(" ", _APOSTROPHES.sub("", normalized)).split())
+
+
+def shingles(normalized: str) -> frozenset:
+    """Character trigrams of a normalized prompt"""
+    padded = f" {normalized} "
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+def minhash(grams: frozenset) -> tuple:
+    """32 MinHash values: one 64-byte digest per trigram gives 32 16-bit hashes"""
+    rows = [struct.unpack("<32H", hashlib.blake2b(gram.encode()).digest()) for gram in grams]
+    return tuple(min(column) for column in zip(*rows))
+
+
+def _one_edit(a: str, b: str) -> bool:
+    """Whether b is a with one character inserted, dropped or replaced"""
+    if abs(len(a) - len(b)) > 1:
+        return False
+    if len(a) > len(b):
+        a, b = b, a
+    i = 0
+    while i < len(a) and a[i] == b[i]:
+        i += 1
+    return a[i + (len(a) == len(b)):] == b[i + 1:]
+
+
+# Typos in these flip or change the meaning ("dont" vs "done"), so they must match exactly
+_NEGATIONS = frozenset({
+    "no", "not", "never", "none", "nothing", "nobody", "neither", "nor", "without", "cannot", "cant",
+    "dont", "doesnt", "didnt", "isnt", "arent", "wasnt", "werent", "wont", "wouldnt", "shouldnt",
+    "couldnt", "hasnt", "havent", "hadnt", "mustnt", "aint",
+})
+# Shorter words are too often one edit from a different word ("is" and "it")
+_MIN_TYPO_LENGTH = 4
+
+
+def _same_words(words: tuple, other: tuple) -> bool:
+    """Whether two prompts have the same words in the same order, allowing a
+    one-character typo in longer words; any added, dropped or reordered word
+    is a different question ("is it safe" vs "is it not safe")"""
+    if len(words) != len(other):
+        return False
+    for word, theirs in zip(words, other):
+        if word == theirs:
+            continue
+        # Only letters can be typos; a changed digit or symbol is another question
+        if (min(len(word), len(theirs)) < _MIN_TYPO_LENGTH or not (word.isalpha() and theirs.isalpha())
+                or word in _NEGATIONS or theirs in _NEGATIONS or not _one_edit(word, theirs)):
+            return False
+    return True
+
+
+class _Entry:
+    __slots__ = ("reply", "expires", "latency", "grams", "bands", "words")
+
+    def __init__(self, reply: str, expires: float, latency: float, grams: frozenset, bands: list,
+                 words: tuple):
+        self.reply = reply
+        self.expires = expires
+        self.latency = latency
+        self.grams = grams
+        self.bands = bands
+        self.words = words
+
+
+class ChatCache:
+    """LRU cache of chat replies keyed on normalized prompt text.
+
+    Lookups try the exact normalized text first, then near-duplicates: a
+    MinHash LSH index (8 bands of 4 rows) finds candidate prompts, and a
+    candidate matches when the Jaccard similarity of the two trigram sets
+    reaches the threshold and the words are the same, in order, up to
+    one-character typos in words of four letters or more. Any added,
+    dropped or swapped word, a negation, a different number or operator is
+    a miss, and so is anything shorter than min_near_length.
+    """
+
+    BANDS = 8
+    ROWS = 4
+
+    def __init__(self, max_entries: int = None, ttl: float = None, similarity: float = None,
+                 min_near_length: int = None):
+        self.max_entries = max_entries or config.CHAT_CACHE_MAX_ENTRIES
+        self.ttl = ttl or config.CHAT_CACHE_TTL
+        self.similarity = similarity if similarity is not None else config.CHAT_CACHE_SIMILARITY
+        self.min_near_length = min_near_length or config.CHAT_CACHE_MIN_NEAR_LENGTH
+        self._entries = OrderedDict()  # normalized prompt -> _Entry
+        self._index = {}  # (band, numbers, minhash rows) -> set of normalized prompts
+        self.exact_hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.saved_seconds = 0.0
+        self.lookup_seconds = 0.0
+
+    def _band_keys(self, grams: frozenset, numbers: tuple) -> list:
+        # Numbers are part of the key: prompts with different ones never match
+        signature = minhash(grams)
+        return [(band, numbers, signature[band * self.ROWS:(band + 1) * self.ROWS])
+                for band in range(self.BANDS)]
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key)
+        for band_key in entry.bands:
+            keys = self._index[band_key]
+            keys.discard(key)
+            if not keys:
+                del self._index[band_key]
+
+    def _near(self, key: str, now: float) -> Optional[str]:
+        grams = shingles(key)
+        typed = _words(key)
+        numbers = tuple(_NUMBERS.findall(key))
+        best, best_similarity = None, self.similarity
+        seen = set()
+        for band_key in self._band_keys(grams, numbers):
+            for candidate in self._index.get(band_key, ()):
+                if candidate in seen:
+                    continue
+                seen.add(candidate)
+                entry = self._entries[candidate]
+                if entry.expires <= now:
+                    continue
+                similarity = len(grams & entry.grams) / len(grams | entry.grams)
+                if similarity >= best_similarity and _same_words(typed, entry.words):
+                    best, best_similarity = candidate, similarity
+        return best
+
+    def get(self, prompt: str) -> Optional[str]:
+        """Cached reply for this prompt or a near-duplicate of it"""
+        started = time.perf_counter()
+        now = time.monotonic()
+        key = normalize(prompt)
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires <= now:
+            self._remove(key)
+            entry = None
+        if entry is not None:
+            self.exact_hits += 1
+        elif len(key) >= self.min_near_length and self.similarity <= 1:
+            near = self._near(key, now)
+            if near is not None:
+                key, entry = near, self._entries[near]
+                self.near_hits += 1
+        if entry is None:
+            self.misses += 1
+        else:
+            self._entries.move_to_end(key)
+            self.saved_seconds += entry.latency
+        self.lookup_seconds += time.perf_counter() - started
+        return entry.reply if entry is not None else None
+
+    def put(self, prompt: str, reply: str, latency: float):
+        """Store a reply; latency is what a later hit saves"""
+        key = normalize(prompt)
+        if not key:
+            return
+        if key in self._entries:
+            self._remove(key)
+        grams = shingles(key)
+        numbers = tuple(_NUMBERS.findall(key))
+        bands = self._band_keys(grams, numbers) if len(key) >= self.min_near_length else []
+        self._entries[key] = _Entry(reply, time.monotonic() + self.ttl, latency, grams, bands, _words(key))
+        for band_key in bands:
+            self._index.setdefault(band_key, set()).add(key)
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+
+    def bypass(self):
+        """Count a message answered without the cache because it has context"""
+        self.bypassed += 1
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def snapshot(self) -> dict:
+        lookups = self.exact_hits + self.near_hits + self.misses
+        hits = self.exact_hits + self.near_hits
+        return {
+            "entries": len(self._entries),
+            "lookups": lookups,
+            "exact_hits": self.exact_hits,
+            "near_hits": self.near_hits,
+            "bypassed": self.bypassed,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "saved_seconds": self.saved_seconds,
+            "mean_lookup_us": self.lookup_seconds / lookups * 1e6 if lookups else 0.0,
+        }
@@ -1,21 +1,18 @@
 import aiohttp
 import asyncio
+import time
 import shared
-from utils import animated_thinking, back_keyboard
-from telegram.constants import ParseMode
-import re
-import urllib.parse
 import config
+import adaptive_limit
 
-def validate_markdown(text):
-    """Ensure proper Markdown formatting"""
-    text = text.replace("** ", "**").replace(" **", "**")
-    text = re.sub(r"\*\*(.+?)\*\*", r"**\1**", text)
-    return text
+chat_cache = None
+if config.CHAT_CACHE_ENABLED:
+    from chat_cache import ChatCache
+    chat_cache = ChatCache()
 
 async def generate_gpt4_text(prompt: str) -> str:
     async with aiohttp.ClientSession() as sess:
-        async with sess.post(
+        async with adaptive_limit.limiter('chat').slot() as slot, sess.post(
             config.CHAT_API_URL,
             json={
                 "model": config.CHAT_MODEL,
@@ -26,39 +23,34 @@ async def generate_gpt4_text(prompt: str) -> str:
             },
             timeout=config.API_TIMEOUT
         ) as resp:
+            if resp.status == 429 or resp.status >= 500:
+                slot.overloaded()
             resp.raise_for_status()
             data = await resp.json()
             return data["choices"][0]["message"]["content"]
 
-async def process_chat(text, thinking_msg, uid):
-    think_task = asyncio.create_task(animated_thinking(thinking_msg))
-    
+async def process_chat(text, uid):
+    """Generate a reply and record the exchange; Markdown is rendered at send time"""
     try:
-        if uid not in shared.user_conversations:
-            shared.user_conversations[uid] = []
-
-        # Call GPT-4 AI for text
-        reply = await generate_gpt4_text(text)
-
-        # Validate Markdown
-        reply = validate_markdown(reply)
+        # Only a first message is context-free enough to share answers
+        cacheable = chat_cache is not None and not shared.get_conversation(uid)
+        reply = chat_cache.get(text) if cacheable else None
+        if chat_cache is not None and not cacheable:
+            chat_cache.bypass()
+
+        if reply is None:
+            # Call GPT-4 AI for text
+            started = time.monotonic()
+            reply = await generate_gpt4_text(text)
+            if cacheable:
+                chat_cache.put(text, reply, time.monotonic() - started)
 
         # Store in conversation history
-        shared.user_conversations[uid].append({"role": "user", "content": text})
-        shared.user_conversations[uid].append({"role": "assistant", "content": reply})
-
-        if len(shared.user_conversations[uid]) > 10:
-            shared.user_conversations[uid] = shared.user_conversations[uid][-10:]
+        shared.add_exchange(uid, text, reply)
 
     except (aiohttp.ClientError, asyncio.TimeoutError):
         reply = "⚠️ Connection error. Please check your network."
     except Exception as e:
         reply = f"⚠️ Processing error: {str(e)}"
-    
-    think_task.cancel()
 
-    await thinking_msg.edit_text(
-        f"💬 Bot:\n\n{reply.strip()}\n\n",
-        parse_mode=ParseMode.MARKDOWN,
-        reply_markup=back_keyboard()
-    )
+    return reply
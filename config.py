@@ -11,6 +11,7 @@ API_BASE_URL = "https://reflexai-j0ro.onrender.com/v1"
 CHAT_API_URL = "https://reflexai-j0ro.onrender.com/v1/chat/completions"
 IMAGE_API_URL = "https://reflexai-j0ro.onrender.com/v1/images/generate"
 TTS_API_URL = "https://reflexai-j0ro.onrender.com/v1/audio/speech"
+TELEGRAM_API_URL = "https://api.telegram.org"
 
 # Model Configuration
 CHAT_MODEL = "gpt-4"
@@ -21,6 +22,185 @@ TTS_MODEL = "gpt-4o-mini-tts"
 UNIQUE_WORD = "🚀 By • @RytstrixHub"
 API_TIMEOUT = 30
 MAX_CONVERSATION_HISTORY = 10
+THROTTLE_INTERVAL = 0.3  # Minimum seconds between updates from one user
+THROTTLE_MAX_DELAY = 3.0  # Longest a queued message waits before the user is asked to resend
+SLOW_HANDLER_SECONDS = 5.0
+
+# Quotas: "burst" requests can be made back to back, then they refill at
+# "per_minute". Image costs one token per variant. Admins are exempt.
+USER_QUOTAS = {
+    'chat': {'burst': 10, 'per_minute': 20},
+    'image': {'burst': 4, 'per_minute': 3},
+    'tts': {'burst': 5, 'per_minute': 6},
+}
+# Shared across all users, to protect the upstream service
+GLOBAL_QUOTAS = {
+    'image': {'burst': 20, 'per_minute': 40},
+    'tts': {'burst': 30, 'per_minute': 60},
+}
+
+# Update State: the polling offset and recently handled update IDs survive
+# restarts so redelivered updates are not processed twice. This is dedup
+# only; updates in flight during a crash are not redelivered
+UPDATE_STATE_PATH = "update_state.json"
+UPDATE_DEDUP_WINDOW = 5000
+UPDATE_STATE_FLUSH_INTERVAL = 1.0
+
+# Graceful Restart: the old process drains in-flight updates for up to
+# RESTART_DRAIN_SECONDS, then hands the rest to its replacement.
+# RESTART_COMMAND defaults to re-running the current command line.
+RESTART_SNAPSHOT_PATH = "restart_snapshot.json"
+RESTART_HANDOFF_PATH = "restart_handoff.json"
+RESTART_DRAIN_SECONDS = 25
+RESTART_SNAPSHOT_MAX_AGE = 120
+RESTART_COMMAND = None
+
+# Job Queue: image and TTS jobs are stored in SQLite so they survive a crash.
+# A job is leased for JOB_LEASE_SECONDS, renewed every JOB_HEARTBEAT_SECONDS
+# while it runs, so a crashed process's jobs resume within one lease. Jobs
+# are retried with exponential backoff from JOB_RETRY_DELAY; jobs older than
+# JOB_MAX_AGE are failed on startup.
+JOB_QUEUE_PATH = "jobs.sqlite3"
+JOB_WORKERS = {'image': 4, 'tts': 4}
+JOB_LEASE_SECONDS = 15
+JOB_HEARTBEAT_SECONDS = 5
+JOB_MAX_ATTEMPTS = 3
+JOB_RETRY_DELAY = 2.0
+JOB_MAX_AGE = 900
+
+# Chat Cache (opt-in): replies to a user's first, context-free question are
+# reused for the same normalized text, or for a near-duplicate whose
+# character-trigram Jaccard similarity reaches CHAT_CACHE_SIMILARITY and
+# whose words differ only by typos (never an added, dropped or negated word)
+CHAT_CACHE_ENABLED = False
+CHAT_CACHE_MAX_ENTRIES = 5000
+CHAT_CACHE_TTL = 6 * 3600
+CHAT_CACHE_SIMILARITY = 0.8
+CHAT_CACHE_MIN_NEAR_LENGTH = 12
+
+# Inline Mode: "@bot prompt" for images, "@bot say text" for speech.
+# A query is generated only once the user stops typing for
+# INLINE_DEBOUNCE_SECONDS; results are uploaded to INLINE_STORAGE_CHAT_ID
+# (a dedicated private channel or group with the bot as admin; the upload
+# is deleted right away) and served by file_id, with Telegram caching
+# answers for INLINE_CACHE_TIME seconds. Without a storage chat, inline
+# mode only serves media already cached. Prefix suggestions are limited to
+# each user's own last INLINE_USER_PREFIX_ENTRIES prompts.
+INLINE_DEBOUNCE_SECONDS = 0.8
+INLINE_ANSWER_DEADLINE = 8.0  # Telegram drops answers to older queries
+INLINE_CACHE_TIME = 900
+INLINE_MAX_RESULTS = 10
+INLINE_CACHE_PATH = "inline_cache.json"
+INLINE_CACHE_MAX_ENTRIES = 5000
+INLINE_USER_PREFIX_ENTRIES = 200
+INLINE_STORAGE_CHAT_ID = None
+INLINE_WARM_GALLERY = True
+
+# Diagnostics: loop lag is sampled every DIAG_LAG_INTERVAL seconds and any
+# callback blocking the loop for longer than DIAG_SLOW_CALLBACK_SECONDS is
+# logged with its route and stack. Admins can request a sampling CPU
+# profile or a tracemalloc snapshot, delivered as a file.
+DIAG_ENABLED = True
+DIAG_LAG_INTERVAL = 0.5
+DIAG_SLOW_CALLBACK_SECONDS = 0.1
+DIAG_PROFILE_SECONDS = 15
+DIAG_PROFILE_INTERVAL = 0.005
+DIAG_TRACEMALLOC_SECONDS = 30
+DIAG_TRACEMALLOC_FRAMES = 10
+
+# Broadcast: /broadcast sends a message to every user registered in
+# BROADCAST_DB_PATH at BROADCAST_RATE messages per second (Telegram allows
+# about 30), pausing everyone for retry_after on a 429. Progress is
+# checkpointed every BROADCAST_CHECKPOINT_INTERVAL seconds, so a broadcast
+# interrupted by a crash or restart resumes in the next process.
+BROADCAST_DB_PATH = "broadcast.sqlite3"
+BROADCAST_RATE = 25
+BROADCAST_CONCURRENCY = 30
+BROADCAST_CHECKPOINT_INTERVAL = 1.0
+BROADCAST_PROGRESS_INTERVAL = 3.0
+BROADCAST_LEASE_SECONDS = 15
+BROADCAST_MAX_ATTEMPTS = 3
+
+# Adaptive Upstream Limits: in-flight requests per upstream endpoint start
+# at "initial" and move between "min" and "max". The limit grows while
+# latency stays within ADAPTIVE_LIMIT_TOLERANCE times its long-run average
+# (over ADAPTIVE_LIMIT_LONG_WINDOW requests), shrinks as latency climbs
+# past that, and halves on a timeout, connection failure, 429 or 5xx.
+# Requests over the limit wait up to API_TIMEOUT for a slot.
+ADAPTIVE_LIMITS = {
+    'image': {"initial": 4, "min": 1, "max": 32},
+    'chat': {"initial": 8, "min": 2, "max": 64},
+    'tts': {"initial": 4, "min": 1, "max": 32},
+}
+ADAPTIVE_LIMIT_TOLERANCE = 1.5
+ADAPTIVE_LIMIT_SMOOTHING = 0.2
+ADAPTIVE_LIMIT_LONG_WINDOW = 500
+
+# Logging: records queue up for a writer thread so a burst of log lines
+# never blocks the event loop. Once LOG_QUEUE_SIZE records are waiting,
+# new ones are dropped and counted. A warning or error repeated from the
+# same line more than LOG_REPEAT_BURST times in LOG_REPEAT_WINDOW seconds
+# is suppressed for the rest of the window. LOG_FORMAT is "json" or "text".
+LOG_LEVEL = "INFO"
+LOG_FORMAT = "json"
+LOG_QUEUE_SIZE = 10000
+LOG_REPEAT_BURST = 5
+LOG_REPEAT_WINDOW = 60.0
+
+# Traffic Recorder (opt-in): anonymized updates appended as JSONL for
+# benchmarks/replay.py. User IDs are HMAC-hashed with a secret salt: set
+# RECORDER_SALT, or leave it empty to generate one into RECORDER_SALT_PATH
+# on first use. Keep the salt private; with it, hashed IDs can be reversed.
+RECORDER_ENABLED = False
+RECORDER_PATH = "traffic.jsonl"
+RECORDER_SALT = ""
+RECORDER_SALT_PATH = ".recorder_salt"
+RECORDER_FLUSH_INTERVAL = 1.0
+RECORDER_MAX_BUFFER = 10000
+
+# Hash of the last command menu sent with set_my_commands; startup skips
+# the call while it matches
+COMMANDS_HASH_PATH = ".commands_hash"
+
+# Media Relay Settings
+# Mode is one of "auto", "url", "stream" or "file_id"; "auto" tries a cached
+# file_id, then URL pass-through, then a streamed re-upload.
+MEDIA_RELAY_MODE = "auto"
+MEDIA_RELAY_CHUNK_SIZE = 64 * 1024
+MEDIA_RELAY_BUFFER_CHUNKS = 4
+MEDIA_FILE_ID_CACHE_SIZE = 1024
+
+# Multi-variant Image Settings
+IMAGE_MAX_VARIANTS = 4
+IMAGE_VARIANT_CONCURRENCY = 2
+# Models that return several images from one request with "n" > 1
+IMAGE_BATCH_MODELS = {"dall-e-2"}
+
+# Worker Process Pool (CPU-bound work kept off the event loop)
+WORKER_PROCESSES = 2
+
+# Image Post-processing Settings (requires Pillow)
+IMAGE_POSTPROCESS_ENABLED = False
+IMAGE_POSTPROCESS_FORMAT = "jpeg"  # "jpeg" (progressive) or "webp"
+IMAGE_POSTPROCESS_QUALITY = 82
+IMAGE_POSTPROCESS_MAX_SIDE = 1024  # 0 keeps the original size
+IMAGE_POSTPROCESS_WATERMARK = False
+# Upstream images above this many pixels are refused before decoding
+IMAGE_POSTPROCESS_MAX_PIXELS = 40_000_000
+
+# TTS Voice Settings: speech is requested as Ogg/Opus, the format Telegram
+# plays as a voice note. A text whose "opus" request is ignored or rejected
+# falls back to MP3, transcoded with ffmpeg in the worker pool (sent as MP3
+# when ffmpeg is missing). After TTS_OPUS_DECLINES fallbacks in a row MP3 is
+# requested directly, and Opus is tried again every TTS_OPUS_RETRY_SECONDS.
+# Rendered audio is cached per text.
+TTS_VOICE = "aria"
+TTS_NEGOTIATE_OPUS = True
+TTS_OPUS_DECLINES = 3
+TTS_OPUS_RETRY_SECONDS = 600
+TTS_OPUS_BITRATE = "32k"
+TTS_FFMPEG_PATH = "ffmpeg"
+TTS_AUDIO_CACHE_BYTES = 32 * 1024 * 1024
 
 # Bot Information
 BOT_NAME = "RYSTRIX AI"
@@ -37,6 +217,16 @@ PROMPT_ENHANCERS = {
     'realistic': "{prompt}, photorealistic, professional photography, high detail, 4k resolution, natural lighting"
 }
 
+# Keyword weights used to pick a prompt template; every keyword also
+# matches its plural ("mountain" matches "mountains").
+PROMPT_KEYWORDS = {
+    'portrait': {"portrait": 3, "headshot": 3, "face": 2, "selfie": 2, "person": 1},
+    'landscape': {"landscape": 3, "scenery": 3, "mountain": 2, "ocean": 2, "nature": 2, "sunset": 1, "forest": 1},
+    'anime': {"anime": 3, "manga": 3, "chibi": 3, "cartoon": 3, "kawaii": 2},
+    'realistic': {"photorealistic": 3, "realistic": 3, "lifelike": 3, "photo": 2, "photograph": 2, "photography": 2, "real": 1}
+}
+PROMPT_CLASSIFIER_CACHE_SIZE = 4096
+
 # System Prompt for Chat
 SYSTEM_PROMPT = (
     "You are RYSTRIX AI, a helpful, friendly, and witty Telegram assistant. "
@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+RYSTRIX AI Diagnostics
+Event-loop lag, slow-callback detection and on-demand CPU and memory profiles
+"""
+
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter, deque
+
+import config
+from router import current_in
+
+logger = logging.getLogger(__name__)
+
+_original_run = asyncio.events.Handle._run
+
+
+def _describe(handle) -> str:
+    """Name the coroutine behind a task step, or the plain callback"""
+    callback = handle._callback
+    task = getattr(callback, "__self__", None)
+    if isinstance(task, asyncio.Task):
+        coro = task.get_coro()
+        return f"task {task.get_name()} ({getattr(coro, '__qualname__', coro)})"
+    return getattr(callback, "__qualname__", None) or repr(callback)[:120]
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+def _stack(frame) -> list:
+    """Function names of a frame and its callers, outermost first"""
+    names = []
+    while frame is not None:
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+    names.reverse()
+    return names
+
+
+class Diagnostics:
+    """Always-on loop monitoring plus admin-triggered profiles.
+
+    Loop lag is the lateness of a sleep woken every lag_interval. Every
+    callback the loop runs is timed (two perf_counter calls); one that
+    blocks for longer than slow_threshold is logged with the route of the
+    update that scheduled it. A watchdog thread checks twice per threshold
+    and grabs the loop thread's stack while the callback is still stuck,
+    so the log shows where it was blocked, not just that it was.
+    """
+
+    def __init__(self, lag_interval: float = None, slow_threshold: float = None, history: int = 240):
+        self.lag_interval = lag_interval or config.DIAG_LAG_INTERVAL
+        self.slow_threshold = slow_threshold or config.DIAG_SLOW_CALLBACK_SECONDS
+        self.lags = deque(maxlen=history)
+        self.slow_callbacks = 0
+        self.worst_callback = 0.0
+        self.profiling = False
+        self._loop = None
+        self._loop_thread = None
+        self._running_since = 0.0  # perf_counter at callback start, 0 when idle
+        self._running_handle = None
+        self._blocked_stack = None
+        self._blocked_route = None
+        self._lag_task = None
+        self._watchdog = None
+        self._stop = threading.Event()
+
+    def _install(self):
+        diagnostics = self
+
+        def _run(handle):
+            if handle._loop is not diagnostics._loop:
+                return _original_run(handle)
+            diagnostics._running_handle = handle
+            started = diagnostics._running_since = time.perf_counter()
+            try:
+                _original_run(handle)
+            finally:
+                diagnostics._running_since = 0.0
+                elapsed = time.perf_counter() - started
+                if elapsed > diagnostics.slow_threshold:
+                    diagnostics._report_slow(handle, elapsed)
+
+        asyncio.events.Handle._run = _run
+
+    @staticmethod
+    def _route(handle) -> str:
+        # The callback runs in the contextvars of the update that scheduled it
+        context = current_in(handle._context) if handle._context is not None else None
+        return context.route if context is not None else None
+
+    def _report_slow(self, handle, elapsed: float):
+        self.slow_callbacks += 1
+        self.worst_callback = max(self.worst_callback, elapsed)
+        stack, self._blocked_stack = self._blocked_stack, None
+        # A handler that finished inside this callback has already left its route
+        route = self._blocked_route or self._route(handle) or "-"
+        self._blocked_route = None
+        where = f"\n  blocked in: {' > '.join(stack[-8:])}" if stack else ""
+        logger.warning("Slow callback %.0fms on route %s: %s%s", elapsed * 1000, route, _describe(handle), where)
+
+    def _watch(self):
+        """Watchdog thread: sample the loop's stack and route while a callback overruns"""
+        interval = self.slow_threshold / 2
+        sampled_for = None
+        while not self._stop.wait(interval):
+            since, handle = self._running_since, self._running_handle
+            if since and since != sampled_for and time.perf_counter() - since > self.slow_threshold:
+                frame = sys._current_frames().get(self._loop_thread)
+                if frame is not None:
+                    self._blocked_route = self._route(handle)
+                    self._blocked_stack = _stack(frame)
+                    sampled_for = since
+
+    async def _measure_lag(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.lag_interval
+            await asyncio.sleep(self.lag_interval)
+            self.lags.append(max(0.0, loop.time() - expected))
+
+    def start(self):
+        """Begin monitoring the running loop"""
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._install()
+        self._lag_task = asyncio.create_task(self._measure_lag())
+        self._stop.clear()
+        self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+
+    def stop(self):
+        """Stop monitoring and restore the stock callback runner"""
+        asyncio.events.Handle._run = _original_run
+        if self._lag_task is not None:
+            self._lag_task.cancel()
+            self._lag_task = None
+        self._stop.set()
+
+    def snapshot(self) -> dict:
+        """Recent loop lag in milliseconds and slow-callback counts"""
+        lags = sorted(self.lags)
+        if not lags:
+            return {"lag_p50_ms": 0.0, "lag_p99_ms": 0.0, "lag_max_ms": 0.0,
+                    "slow_callbacks": self.slow_callbacks, "worst_callback_ms": self.worst_callback * 1000}
+        return {
+            "lag_p50_ms": lags[len(lags) // 2] * 1000,
+            "lag_p99_ms": lags[min(len(lags) - 1, int(len(lags) * 0.99))] * 1000,
+            "lag_max_ms": lags[-1] * 1000,
+            "slow_callbacks": self.slow_callbacks,
+            "worst_callback_ms": self.worst_callback * 1000,
+        }
+
+    def _sample(self, seconds: float, interval: float) -> str:
+        """Sample the loop thread's stack every interval; runs in a worker thread"""
+        own = Counter()
+        cumulative = Counter()
+        folded = Counter()
+        samples = idle = 0
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            frame = sys._current_frames().get(self._loop_thread)
+            if frame is not None:
+                stack = _stack(frame)
+                samples += 1
+                if stack[-1].startswith("selectors.py:"):
+                    idle += 1
+                own[stack[-1]] += 1
+                cumulative.update(set(stack))
+                folded[";".join(stack)] += 1
+            time.sleep(interval)
+
+        lines = [
+            f"CPU profile of the event loop thread: {seconds:.0f}s, {samples} samples every {interval * 1000:.0f}ms",
+            f"Idle (waiting for I/O): {idle / max(samples, 1):.1%}",
+            "",
+            "Top functions by own samples",
+        ]
+        lines += [f"{count / samples:7.1%}  {name}" for name, count in own.most_common(25)] if samples else []
+        lines += ["", "Top functions including callees"]
+        lines += [f"{count / samples:7.1%}  {name}" for name, count in cumulative.most_common(25)] if samples else []
+        lines += ["", "Folded stacks (flamegraph.pl / speedscope)"]
+        lines += [f"{stack} {count}" for stack, count in folded.most_common()]
+        return "\n".join(lines) + "\n"
+
+    async def cpu_profile(self, seconds: float = None, interval: float = None) -> str:
+        """Time-boxed sampling profile of the loop thread, as text"""
+        seconds = seconds or config.DIAG_PROFILE_SECONDS
+        interval = interval or config.DIAG_PROFILE_INTERVAL
+        self.profiling = True
+        # The sampler needs the GIL to read the loop's stack. Left at 5 ms, the
+        # loop mostly hands it over when it parks in select(), which hides
+        # short CPU bursts, so switch more often while sampling.
+        switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(min(switch_interval, interval / 10))
+        try:
+            return await asyncio.to_thread(self._sample, seconds, interval)
+        finally:
+            sys.setswitchinterval(switch_interval)
+            self.profiling = False
+
+    async def memory_profile(self, seconds: float = None, limit: int = 25) -> str:
+        """Top allocation sites over a time window, as text"""
+        seconds = seconds or config.DIAG_TRACEMALLOC_SECONDS
+        self.profiling = True
+        started_here = not tracemalloc.is_tracing()
+        try:
+            if started_here:
+                tracemalloc.start(config.DIAG_TRACEMALLOC_FRAMES)
+            await asyncio.sleep(seconds)
+            snapshot = tracemalloc.take_snapshot()
+            traced, peak = tracemalloc.get_traced_memory()
+        finally:
+            if started_here:
+                tracemalloc.stop()
+            self.profiling = False
+        window = f"allocated over {seconds:.0f}s" if started_here else "since tracing started"
+        header = f"Memory still held, {window}: {traced / 1024:.0f} KiB (peak {peak / 1024:.0f} KiB)"
+        # Grouping thousands of traces takes a while; keep it off the loop
+        return await asyncio.to_thread(_allocation_report, snapshot, header, limit)
+
+
+def _allocation_report(snapshot: tracemalloc.Snapshot, header: str, limit: int) -> str:
+    snapshot = snapshot.filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        tracemalloc.Filter(False, "<unknown>"),
+    ))
+    lines = [header, "", "Top allocation sites"]
+    for stat in snapshot.statistics("lineno")[:limit]:
+        frame = stat.traceback[0]
+        lines.append(f"{stat.size / 1024:9.1f} KiB {stat.count:7d} blocks  {frame.filename}:{frame.lineno}")
+    lines += ["", "Largest allocation tracebacks"]
+    for stat in snapshot.statistics("traceback")[:5]:
+        lines.append(f"{stat.size / 1024:.1f} KiB in {stat.count} blocks")
+        lines += [f"    {line}" for line in stat.traceback.format()]
+    return "\n".join(lines) + "\n"
@@ -7,78 +7,142 @@ Handles AI image generation with ReflexAI integration
 import aiohttp
 import asyncio
 import logging
+import adaptive_limit
 import config
+import prompt_classifier
 
 logger = logging.getLogger(__name__)
 
+class ImageServiceError(Exception):
+    """Raised when the image API answers with an error status"""
+
+def enhance_prompt(prompt: str, template: str = 'default') -> str:
+    """Apply the prompt enhancer for a template"""
+    return config.PROMPT_ENHANCERS.get(template, config.PROMPT_ENHANCERS['default']).format(prompt=prompt)
+
+async def _request_images(session: aiohttp.ClientSession, enhanced_prompt: str, n: int = 1) -> list:
+    """Request n images in one upstream call and return their URLs"""
+    async with adaptive_limit.limiter('image').slot() as slot, session.post(
+        config.IMAGE_API_URL,
+        json={
+            "prompt": enhanced_prompt,
+            "model": config.IMAGE_MODEL,
+            "n": n,
+            "size": "1024x1024",
+            "quality": "hd",
+            "style": "vivid"
+        },
+        headers={"Content-Type": "application/json"},
+        timeout=config.API_TIMEOUT
+    ) as response:
+        if response.status != 200:
+            if response.status == 429 or response.status >= 500:
+                slot.overloaded()
+            error_text = await response.text()
+            logger.error("ReflexAI Image API error %s: %s", response.status, error_text)
+            raise ImageServiceError("Image service is currently unavailable. Please try again later.")
+        data = await response.json()
+        return [item["url"] for item in data["data"]]
+
+def _error_message(error: Exception) -> str:
+    """Map an image request failure to a user-facing message"""
+    if isinstance(error, ImageServiceError):
+        return str(error)
+    if isinstance(error, asyncio.TimeoutError):
+        logger.error("ReflexAI Image API timeout")
+        return "Request timeout. The image generation is taking too long."
+    if isinstance(error, aiohttp.ClientError):
+        logger.error("ReflexAI Image API connection error: %s", error)
+        return "Connection error. Please check your network."
+    logger.error("ReflexAI Image API unexpected error: %s", error)
+    return f"Processing error: {str(error)}"
+
 async def generate_reflexai_image(prompt: str, template: str = 'default') -> dict:
     """Generate image using ReflexAI with enhanced prompts"""
     
     # Enhance prompt based on template
-    enhanced_prompt = config.PROMPT_ENHANCERS.get(template, config.PROMPT_ENHANCERS['default']).format(prompt=prompt)
+    enhanced_prompt = enhance_prompt(prompt, template)
     
     try:
         async with aiohttp.ClientSession() as session:
-            async with session.post(
-                config.IMAGE_API_URL,
-                json={
-                    "prompt": enhanced_prompt,
-                    "model": config.IMAGE_MODEL,
-                    "n": 1,
-                    "size": "1024x1024",
-                    "quality": "hd",
-                    "style": "vivid"
-                },
-                headers={"Content-Type": "application/json"},
-                timeout=config.API_TIMEOUT
-            ) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    return {
-                        "success": True,
-                        "image_url": data["data"][0]["url"],
-                        "enhanced_prompt": enhanced_prompt
-                    }
-                else:
-                    error_text = await response.text()
-                    logger.error(f"ReflexAI Image API error {response.status}: {error_text}")
-                    return {
-                        "success": False,
-                        "error": "Image service is currently unavailable. Please try again later."
-                    }
-    except asyncio.TimeoutError:
-        logger.error("ReflexAI Image API timeout")
+            image_urls = await _request_images(session, enhanced_prompt)
         return {
-            "success": False,
-            "error": "Request timeout. The image generation is taking too long."
+            "success": True,
+            "image_url": image_urls[0],
+            "enhanced_prompt": enhanced_prompt
         }
-    except aiohttp.ClientError as e:
-        logger.error(f"ReflexAI Image API connection error: {e}")
+    except Exception as e:
         return {
             "success": False,
-            "error": "Connection error. Please check your network."
+            "error": _error_message(e)
         }
-    except Exception as e:
-        logger.error(f"ReflexAI Image API unexpected error: {e}")
+
+async def generate_reflexai_images(prompt: str, template: str = 'default', n: int = 1) -> dict:
+    """Generate n image variants, batched when the model supports it"""
+    
+    enhanced_prompt = enhance_prompt(prompt, template)
+    n = max(1, min(n, config.IMAGE_MAX_VARIANTS))
+    image_urls = []
+    errors = []
+    
+    async with aiohttp.ClientSession() as session:
+        if n > 1 and config.IMAGE_MODEL in config.IMAGE_BATCH_MODELS:
+            try:
+                image_urls = (await _request_images(session, enhanced_prompt, n))[:n]
+            except Exception as e:
+                errors.append(_error_message(e))
+        else:
+            # Fan out single-image requests with a bounded number in flight
+            semaphore = asyncio.Semaphore(config.IMAGE_VARIANT_CONCURRENCY)
+            
+            async def one_variant():
+                async with semaphore:
+                    return await _request_images(session, enhanced_prompt)
+            
+            results = await asyncio.gather(*(one_variant() for _ in range(n)), return_exceptions=True)
+            for result in results:
+                if isinstance(result, BaseException):
+                    errors.append(_error_message(result))
+                else:
+                    image_urls.extend(result[:1])
+    
+    if not image_urls:
         return {
             "success": False,
-            "error": f"Processing error: {str(e)}"
+            "error": errors[0] if errors else "Image service returned no images.",
+            "requested": n
         }
+    return {
+        "success": True,
+        "image_urls": image_urls,
+        "enhanced_prompt": enhanced_prompt,
+        "requested": n,
+        "failed": n - len(image_urls)
+    }
 
-def detect_image_template(prompt: str) -> str:
+def parse_image_options(args: str) -> tuple:
+    """Split leading "-n <count>" and "-s <style>" options off /image arguments"""
+    variants = 1
+    style = None
+    words = args.split()
+    while words and words[0][:2] in ("-n", "-s"):
+        flag, value = words[0][:2], words[0][2:]
+        if not value and len(words) > 1:
+            value, words = words[1], words[2:]
+        else:
+            words = words[1:]
+        if flag == "-n" and value.isdigit():
+            variants = max(1, min(int(value), config.IMAGE_MAX_VARIANTS))
+        elif flag == "-s" and value.lower() in config.PROMPT_ENHANCERS:
+            style = value.lower()
+        else:
+            # Not an option we understand, treat everything as the prompt
+            return args, 1, None
+    return " ".join(words), variants, style
+
+def detect_image_template(prompt: str, style: str = None) -> str:
     """Detect the best template based on prompt content"""
-    prompt_lower = prompt.lower()
-    
-    if any(word in prompt_lower for word in ["portrait", "face", "person", "headshot"]):
-        return 'portrait'
-    elif any(word in prompt_lower for word in ["landscape", "scenery", "mountain", "ocean", "sunset", "nature"]):
-        return 'landscape'
-    elif any(word in prompt_lower for word in ["anime", "cartoon", "manga", "chibi", "kawaii"]):
-        return 'anime'
-    elif any(word in prompt_lower for word in ["realistic", "photo", "photorealistic", "real", "lifelike"]):
-        return 'realistic'
-    else:
-        return 'default'
+    return prompt_classifier.classify(prompt, style)
 
 async def process_image_generation(prompt: str) -> dict:
     """Process image generation request"""
@@ -110,7 +174,7 @@ async def process_image_generation(prompt: str) -> dict:
         return result
         
     except Exception as e:
-        logger.error(f"Image processing error: {e}")
+        logger.error("Image processing error: %s", e)
         return {
             "success": False,
             "error": "Processing error. Please try again."
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+RYSTRIX AI Image Post-processing
+Re-encodes, resizes and watermarks generated images in worker processes
+"""
+
+import asyncio
+import importlib.util
+import io
+import logging
+
+import aiohttp
+import config
+import workers
+
+# Pillow is optional and only imported where images are re-encoded; the
+# stage is skipped without it
+PILLOW_AVAILABLE = importlib.util.find_spec("PIL") is not None
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPES = {
+    "jpeg": "image/jpeg",
+    "webp": "image/webp",
+}
+
+def is_enabled() -> bool:
+    """Check whether post-processing is configured and Pillow is available"""
+    return config.IMAGE_POSTPROCESS_ENABLED and PILLOW_AVAILABLE
+
+def _watermark_text() -> str:
+    """Watermark text limited to what Pillow's default font can draw"""
+    return " ".join(config.UNIQUE_WORD.encode("ascii", "ignore").decode().split())
+
+def reencode_image(data: bytes, fmt: str, quality: int, max_side: int = 0, watermark: str = "") -> bytes:
+    """Resize, watermark and re-encode one image (runs in a worker process)"""
+    from PIL import Image, ImageDraw, ImageFont
+
+    # Upstream images are untrusted: set the decompression-bomb limit
+    # explicitly and check the header size before decoding any pixels
+    Image.MAX_IMAGE_PIXELS = config.IMAGE_POSTPROCESS_MAX_PIXELS
+    image = Image.open(io.BytesIO(data))
+    if image.width * image.height > config.IMAGE_POSTPROCESS_MAX_PIXELS:
+        raise ValueError(f"Image too large to post-process: {image.width}x{image.height}")
+    image.load()
+    if max_side and max(image.size) > max_side:
+        image.thumbnail((max_side, max_side), Image.LANCZOS)
+    image = image.convert("RGB")
+
+    if watermark:
+        draw = ImageDraw.Draw(image)
+        font = ImageFont.load_default()
+        left, top, right, bottom = draw.textbbox((0, 0), watermark, font=font)
+        margin = 8
+        position = (image.width - (right - left) - margin, image.height - (bottom - top) - margin)
+        # Dark outline keeps the text readable on light backgrounds
+        draw.text(position, watermark, font=font, fill=(255, 255, 255), stroke_width=1, stroke_fill=(0, 0, 0))
+
+    output = io.BytesIO()
+    if fmt == "webp":
+        image.save(output, "WEBP", quality=quality, method=4)
+    else:
+        image.save(output, "JPEG", quality=quality, progressive=True, optimize=True)
+    return output.getvalue()
+
+async def download_image(session: aiohttp.ClientSession, url: str) -> bytes:
+    """Download a generated image"""
+    async with session.get(url, timeout=config.API_TIMEOUT) as response:
+        response.raise_for_status()
+        return await response.read()
+
+async def postprocess_url(session: aiohttp.ClientSession, url: str) -> dict:
+    """Download one image and re-encode it off the event loop"""
+    fmt = config.IMAGE_POSTPROCESS_FORMAT
+    original = await download_image(session, url)
+    processed = await workers.run_in_process(
+        reencode_image,
+        original,
+        fmt,
+        config.IMAGE_POSTPROCESS_QUALITY,
+        config.IMAGE_POSTPROCESS_MAX_SIDE,
+        _watermark_text() if config.IMAGE_POSTPROCESS_WATERMARK else ""
+    )
+    return {
+        "data": processed,
+        "content_type": CONTENT_TYPES.get(fmt, "image/jpeg"),
+        "filename": f"image.{'webp' if fmt == 'webp' else 'jpg'}",
+        "original_size": len(original),
+    }
+
+async def postprocess_urls(image_urls: list) -> list:
+    """Post-process images, keeping the URL for any image that fails"""
+    async with aiohttp.ClientSession() as session:
+        results = await asyncio.gather(
+            *(postprocess_url(session, url) for url in image_urls),
+            return_exceptions=True
+        )
+
+    processed = []
+    for url, result in zip(image_urls, results):
+        if isinstance(result, BaseException):
+            logger.warning("Image post-processing failed, sending original: %s", result)
+            processed.append(url)
+        else:
+            logger.info("Post-processed image: %s -> %s bytes", result['original_size'], len(result['data']))
+            processed.append(result)
+    return processed
@@ -0,0 +1,418 @@
+#!/usr/bin/env python3
+"""
+RYSTRIX AI Inline Mode
+Answers @bot queries with images and speech from cached file_ids
+"""
+
+import asyncio
+import bisect
+import hashlib
+import json
+import logging
+import os
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from telebot import types
+
+import config
+import image_handler
+from chat_cache import normalize
+from media_relay import MediaRelayError
+from tts_audio import TtsAudio
+
+logger = logging.getLogger(__name__)
+
+KIND_IMAGE = "image"
+KIND_TTS = "tts"
+
+# "say hello there" asks for speech; anything else is an image prompt
+_TTS_PREFIXES = ("say ", "tts ")
+
+
+def parse_query(query: str) -> Tuple[str, str]:
+    """Split an inline query into (kind, prompt)"""
+    text = query.strip()
+    lowered = text.lower()
+    for prefix in _TTS_PREFIXES:
+        if lowered.startswith(prefix) or lowered == prefix.strip():
+            return KIND_TTS, text[len(prefix):].strip()
+    return KIND_IMAGE, text
+
+
+def _result_id(kind: str, key: str) -> str:
+    # Result IDs are limited to 64 bytes; prompts are not
+    return hashlib.blake2b(f"{kind}\0{key}".encode(), digest_size=16).hexdigest()
+
+
+class InlineIndex:
+    """LRU map of (kind, normalized prompt) to a Telegram file_id.
+
+    File_ids are shared: whoever types a cached prompt exactly gets it
+    without a new generation. Prefix suggestions come only from the prompts
+    the same user asked for, so one user's prompts and speech text are
+    never offered to another.
+    """
+
+    def __init__(self, path: str = None, max_entries: int = None, max_user_entries: int = None):
+        self.path = path or config.INLINE_CACHE_PATH
+        self.max_entries = max_entries or config.INLINE_CACHE_MAX_ENTRIES
+        self.max_user_entries = max_user_entries or config.INLINE_USER_PREFIX_ENTRIES
+        self._entries = OrderedDict()  # "kind\0key" -> (prompt, file_id)
+        self._users: Dict[int, Tuple[OrderedDict, List[str]]] = {}  # user -> (LRU names, sorted names)
+        self._owners: Dict[str, set] = {}  # "kind\0key" -> users who asked for it
+        self.changes = 0  # bumped by every put or remember
+        self._saved_changes = 0
+
+    @property
+    def dirty(self) -> bool:
+        return self.changes != self._saved_changes
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, kind: str, key: str) -> Optional[str]:
+        """file_id for exactly this normalized prompt"""
+        entry = self._entries.get(f"{kind}\0{key}")
+        if entry is None:
+            return None
+        self._entries.move_to_end(f"{kind}\0{key}")
+        return entry[1]
+
+    def put(self, kind: str, key: str, prompt: str, file_id: str, user_id: int = None):
+        """Remember a file_id, evicting the least recently used entry"""
+        name = f"{kind}\0{key}"
+        self._entries[name] = (prompt, file_id)
+        self._entries.move_to_end(name)
+        while len(self._entries) > self.max_entries:
+            oldest, _ = self._entries.popitem(last=False)
+            for owner in self._owners.pop(oldest, ()):
+                self._forget(owner, oldest)
+        if user_id is not None:
+            self.remember(user_id, kind, key)
+        self.changes += 1
+
+    def remember(self, user_id: int, kind: str, key: str):
+        """Offer this cached prompt to user_id in prefix suggestions"""
+        name = f"{kind}\0{key}"
+        if name not in self._entries:
+            return
+        recent, ordered = self._users.setdefault(user_id, (OrderedDict(), []))
+        if name in recent:
+            recent.move_to_end(name)
+            return
+        recent[name] = None
+        bisect.insort(ordered, name)
+        self._owners.setdefault(name, set()).add(user_id)
+        if len(recent) > self.max_user_entries:
+            oldest = next(iter(recent))
+            self._owners[oldest].discard(user_id)
+            self._forget(user_id, oldest)
+        self.changes += 1
+
+    def _forget(self, user_id: int, name: str):
+        recent, ordered = self._users[user_id]
+        del recent[name]
+        del ordered[bisect.bisect_left(ordered, name)]
+        if not recent:
+            del self._users[user_id]
+
+    def prefix(self, user_id: int, kind: str, typed: str, limit: int) -> List[Tuple[str, str, str]]:
+        """Up to limit of the user's (key, prompt, file_id) entries whose prompt starts with typed"""
+        if user_id not in self._users:
+            return []
+        ordered = self._users[user_id][1]
+        start = f"{kind}\0{typed}"
+        matches = []
+        for name in ordered[bisect.bisect_left(ordered, start):]:
+            if not name.startswith(start) or len(matches) >= limit:
+                break
+            prompt, file_id = self._entries[name]
+            matches.append((name.split("\0", 1)[1], prompt, file_id))
+        return matches
+
+    def load(self):
+        """Read the entries saved by a previous run, if any"""
+        try:
+            with open(self.path, encoding="utf-8") as handle:
+                data = json.load(handle)
+        except (OSError, ValueError):
+            return
+        # Files from before per-user suggestions hold just the entry list
+        entries, users = (data, {}) if isinstance(data, list) else (data["entries"], data["users"])
+        for kind, key, prompt, file_id in entries:
+            self.put(kind, key, prompt, file_id)
+        for user_id, names in users.items():
+            for kind, key in names:
+                self.remember(int(user_id), kind, key)
+        self._saved_changes = self.changes
+
+    def snapshot(self) -> dict:
+        """The entries and each user's prompts, oldest first, as saved (on the loop)"""
+        return {
+            "entries": [[*name.split("\0", 1), prompt, file_id] for name, (prompt, file_id) in self._entries.items()],
+            "users": {user_id: [name.split("\0", 1) for name in recent]
+                      for user_id, (recent, _) in self._users.items()},
+        }
+
+    def write(self, data: dict):
+        """Atomically write a snapshot; touches no index state, so it can run in a thread"""
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as handle:
+            json.dump(data, handle, separators=(",", ":"))
+        os.replace(tmp_path, self.path)
+
+    def saved(self, changes: int):
+        """Mark the index clean up to the change count its written snapshot had"""
+        self._saved_changes = max(self._saved_changes, changes)
+
+
+class InlineMode:
+    """Inline image and TTS results with per-user debouncing.
+
+    Telegram sends an inline query on every keystroke. A query for a prompt
+    already in the index is answered at once; otherwise it waits
+    INLINE_DEBOUNCE_SECONDS and is dropped if the same user types again in
+    the meantime, so only the settled query reaches the upstream. Generated
+    media is uploaded to the storage chat once and served by file_id from
+    then on, together with the user's own cached prompts that start with the
+    typed text. Without INLINE_STORAGE_CHAT_ID nothing is generated and
+    only cached media is offered.
+    """
+
+    def __init__(self, bot, media_relay, quotas=None, index: InlineIndex = None, debounce: float = None,
+                 cache_time: int = None, answer_deadline: float = None, storage_chat_id: int = None,
+                 tts_audio: TtsAudio = None):
+        self.bot = bot
+        self.media_relay = media_relay
+        self._owns_tts = tts_audio is None
+        self.tts_audio = tts_audio if tts_audio is not None else TtsAudio()
+        self.quotas = quotas
+        self.index = index if index is not None else InlineIndex()
+        self.debounce = debounce if debounce is not None else config.INLINE_DEBOUNCE_SECONDS
+        self.cache_time = cache_time if cache_time is not None else config.INLINE_CACHE_TIME
+        self.answer_deadline = answer_deadline or config.INLINE_ANSWER_DEADLINE
+        self.storage_chat_id = storage_chat_id or config.INLINE_STORAGE_CHAT_ID
+        self.gallery = [(normalize(prompt), prompt) for prompt in image_handler.get_example_prompts()]
+        self._pending: Dict[int, asyncio.Task] = {}
+        self._generating: Dict[tuple, asyncio.Task] = {}
+        self._tasks = set()
+        self.queries = 0
+        self.cache_answers = 0
+        self.superseded = 0
+        self.generated = 0
+        self.placeholders = 0
+        self.failed = 0
+        self._save_lock = asyncio.Lock()
+
+    def _spawn(self, coro) -> asyncio.Task:
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    def _result(self, kind: str, key: str, prompt: str, file_id: str):
+        if kind == KIND_TTS:
+            return types.InlineQueryResultCachedVoice(_result_id(kind, key), file_id, prompt[:64] or "🔊")
+        return types.InlineQueryResultCachedPhoto(_result_id(kind, key), file_id, title=prompt[:64],
+                                                  description=prompt[:128])
+
+    def _notice(self, title: str, description: str, prompt: str):
+        return types.InlineQueryResultArticle(
+            "notice", title, types.InputTextMessageContent(prompt or title), description=description
+        )
+
+    def _results(self, user_id: int, kind: str, key: str, first: list) -> list:
+        """first, then the user's cached prompts starting with key"""
+        results = list(first)
+        for match_key, prompt, file_id in self.index.prefix(user_id, kind, key, config.INLINE_MAX_RESULTS):
+            if match_key != key:
+                results.append(self._result(kind, match_key, prompt, file_id))
+        return results[:config.INLINE_MAX_RESULTS]
+
+    async def _answer(self, query, results: list, cache_time: int, personal: bool = False):
+        try:
+            await self.bot.answer_inline_query(query.id, results, cache_time=cache_time, is_personal=personal)
+        except Exception as e:
+            # Usually "query is too old": the user moved on
+            logger.warning("Inline answer failed: %s", e)
+
+    def _gallery_results(self) -> Tuple[list, bool]:
+        results = []
+        for key, prompt in self.gallery:
+            file_id = self.index.get(KIND_IMAGE, key)
+            if file_id:
+                results.append(self._result(KIND_IMAGE, key, prompt, file_id))
+        return results, len(results) == len(self.gallery)
+
+    async def handle(self, query):
+        """Inline query handler for the router; returns without waiting for generation"""
+        self.queries += 1
+        user_id = query.from_user.id
+        pending = self._pending.pop(user_id, None)
+        if pending is not None:
+            pending.cancel()
+            self.superseded += 1
+
+        kind, prompt = parse_query(query.query)
+        key = normalize(prompt)
+        if not key:
+            self.cache_answers += 1
+            if kind == KIND_IMAGE:
+                results, complete = self._gallery_results()
+                # Re-ask soon while the gallery is still warming
+                await self._answer(query, results, self.cache_time if complete else 10)
+            else:
+                await self._answer(query, [], self.cache_time)
+            return
+
+        file_id = self.index.get(kind, key)
+        if file_id is not None:
+            self.cache_answers += 1
+            self.index.remember(user_id, kind, key)
+            await self._answer(query, self._results(user_id, kind, key, [self._result(kind, key, prompt, file_id)]),
+                               self.cache_time, personal=True)
+            return
+        if self.storage_chat_id is None:
+            await self._answer(query, self._results(user_id, kind, key, [self._notice(
+                "🔧 Inline generation is off", "Open the bot's chat to generate this", prompt
+            )]), self.cache_time, personal=True)
+            return
+
+        task = self._spawn(self._settle(query, user_id, kind, prompt, key))
+        self._pending[user_id] = task
+
+    async def _settle(self, query, user_id: int, kind: str, prompt: str, key: str):
+        await asyncio.sleep(self.debounce)
+        # Settled: from here on a newer query no longer cancels this one
+        if self._pending.get(user_id) is asyncio.current_task():
+            del self._pending[user_id]
+
+        task = self._generating.get((kind, key))
+        if task is None:
+            if self.quotas is not None:
+                allowed = self.quotas.acquire(user_id, kind)
+                if not allowed.allowed:
+                    await self._answer(query, self._results(user_id, kind, key, [self._notice(
+                        "🚦 Slow down a little", f"Try again in {allowed.retry_after:.0f}s", prompt
+                    )]), 0, personal=True)
+                    return
+            task = self._start_generation(kind, key, prompt)
+
+        try:
+            # Shielded: generation carries on into the cache past the deadline
+            file_id = await asyncio.wait_for(asyncio.shield(task), self.answer_deadline - self.debounce)
+        except asyncio.TimeoutError:
+            self.placeholders += 1
+            await self._answer(query, self._results(user_id, kind, key, [self._notice(
+                "⏳ Still generating…", "Reopen this query in a few seconds to get it", prompt
+            )]), 0, personal=True)
+            return
+        if file_id is None:
+            await self._answer(query, self._results(user_id, kind, key, [self._notice(
+                "⚠️ Generation failed", "Try a different prompt", prompt
+            )]), 0, personal=True)
+            return
+        self.index.remember(user_id, kind, key)
+        await self._answer(query, self._results(user_id, kind, key, [self._result(kind, key, prompt, file_id)]),
+                           self.cache_time, personal=True)
+
+    def _start_generation(self, kind: str, key: str, prompt: str) -> asyncio.Task:
+        """One upstream request per prompt, however many users ask for it"""
+        task = self._spawn(self._generate(kind, key, prompt))
+        self._generating[(kind, key)] = task
+        task.add_done_callback(lambda _: self._generating.pop((kind, key), None))
+        return task
+
+    async def _generate(self, kind: str, key: str, prompt: str) -> Optional[str]:
+        """Generate media, upload it to the storage chat and index its file_id"""
+        try:
+            if kind == KIND_TTS:
+                cache_key = f"tts:{self.tts_audio.voice}:{prompt}"
+                message = await self.tts_audio.send(self.media_relay, self.storage_chat_id, prompt)
+            else:
+                template = image_handler.detect_image_template(prompt)
+                result = await image_handler.generate_reflexai_images(prompt, template, 1)
+                if not result["success"]:
+                    logger.warning("Inline image failed: %s", result['error'])
+                    self.failed += 1
+                    return None
+                cache_key = f"inline:image:{key}"
+                message = await self.media_relay.send_photo(
+                    self.storage_chat_id,
+                    result["image_urls"][0],
+                    caption=prompt[:1024],
+                    cache_key=cache_key
+                )
+        except MediaRelayError as e:
+            logger.warning("Inline %s upload failed: %s", kind, e)
+            self.failed += 1
+            return None
+        file_id = self.media_relay.cached_file_id(cache_key)
+        if file_id is None:
+            self.failed += 1
+            return None
+        self.generated += 1
+        self.index.put(kind, key, prompt, file_id)
+        await self.save()
+        try:
+            # The file_id outlives the message; keep the storage chat empty
+            await self.bot.delete_message(self.storage_chat_id, message["message_id"])
+        except Exception:
+            pass
+        return file_id
+
+    async def warm_gallery(self):
+        """Generate the example prompts missing from the index, one at a time"""
+        for key, prompt in self.gallery:
+            if self.index.get(KIND_IMAGE, key) is not None:
+                continue
+            task = self._generating.get((KIND_IMAGE, key)) or self._start_generation(KIND_IMAGE, key, prompt)
+            await task
+
+    def start(self):
+        """Load the saved index and warm the example gallery in the background"""
+        self.index.load()
+        if self.storage_chat_id is None:
+            logger.warning("INLINE_STORAGE_CHAT_ID is not set; inline mode serves cached media only")
+        elif config.INLINE_WARM_GALLERY:
+            self._spawn(self.warm_gallery())
+
+    async def save(self):
+        """Persist the index if it changed"""
+        async with self._save_lock:
+            if not self.index.dirty:
+                return
+            # Built here, on the loop that owns the index; the thread only writes it
+            changes, data = self.index.changes, self.index.snapshot()
+            try:
+                await asyncio.to_thread(self.index.write, data)
+            except OSError as e:
+                logger.error("Failed to save the inline cache: %s", e)
+                return
+            # Changes made during the write stay dirty for the next save
+            self.index.saved(changes)
+
+    async def close(self):
+        """Cancel pending work and persist the index"""
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        await self.save()
+        if self._owns_tts:
+            await self.tts_audio.close()
+
+    def install(self, router):
+        """Register as the router's inline query handler, behind its middlewares"""
+        router.inline()(self.handle)
+
+    def snapshot(self) -> dict:
+        return {
+            "queries": self.queries,
+            "from_cache": self.cache_answers,
+            "superseded": self.superseded,
+            "generated": self.generated,
+            "placeholders": self.placeholders,
+            "failed": self.failed,
+            "indexed": len(self.index),
+        }
@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+"""
+RYSTRIX AI Job Queue
+SQLite-backed queue for image and TTS jobs that survives process death
+"""
+
+import asyncio
+import json
+import logging
+import os
+import random
+import secrets
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+import config
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    run_after REAL NOT NULL,
+    lease_until REAL NOT NULL DEFAULT 0,
+    owner TEXT,
+    created REAL NOT NULL,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_due ON jobs (kind, state, run_after);
+"""
+
+
+class Job:
+    """A leased job; payload is the dict given to enqueue()"""
+
+    __slots__ = ("id", "kind", "payload", "attempts", "created")
+
+    def __init__(self, job_id: int, kind: str, payload: str, attempts: int, created: float):
+        self.id = job_id
+        self.kind = kind
+        self.payload = json.loads(payload)
+        self.attempts = attempts
+        self.created = created
+
+
+class RetryJob(Exception):
+    """Raised by a handler when the job should be tried again later"""
+
+
+class JobQueue:
+    """Durable job queue with leases, retries and group commit.
+
+    Every enqueue waits until its row is committed with synchronous=FULL.
+    Enqueues that arrive while a commit is running share the next one, so
+    durability costs one fsync per batch rather than per job. Workers lease
+    a job for JOB_LEASE_SECONDS under a random per-process owner token, and
+    a heartbeat renews the leases of running jobs every JOB_HEARTBEAT_SECONDS.
+    A job whose lease ran out, because its process died or stalled, is
+    picked up again, or failed by an idle worker when that was its last
+    attempt; PIDs are not used, since a restarted container often
+    gets the same one. A handler that raises is retried
+    with exponential backoff until JOB_MAX_ATTEMPTS, then its failure
+    callback runs.
+    """
+
+    def __init__(self, path: str = None, lease_seconds: float = None, max_attempts: int = None,
+                 retry_delay: float = None, max_age: float = None, heartbeat_seconds: float = None):
+        self.path = path or config.JOB_QUEUE_PATH
+        self.lease_seconds = lease_seconds or config.JOB_LEASE_SECONDS
+        self.heartbeat_seconds = heartbeat_seconds or min(config.JOB_HEARTBEAT_SECONDS, self.lease_seconds / 3)
+        self.max_attempts = max_attempts or config.JOB_MAX_ATTEMPTS
+        self.retry_delay = retry_delay if retry_delay is not None else config.JOB_RETRY_DELAY
+        self.max_age = max_age or config.JOB_MAX_AGE
+        # Never numeric, so it is stored as text even in an old INTEGER column
+        self.owner = f"{os.getpid()}-{secrets.token_hex(8)}"
+        self._handlers = {}
+        self._wakeups = {}
+        self._workers = []
+        self._running = {}  # job id -> worker task
+        self._pending = []  # (kind, payload, future) waiting for the next commit
+        self._commit_task = None
+        self._heartbeat_task = None
+        self._stopping = False
+        self.commits = 0
+        self.completed = 0
+        self.failed = 0
+        # One thread owns the connection, which also serializes every statement
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="job-queue")
+        self._db = None
+
+    def handler(self, kind: str, on_failure: Callable = None, workers: int = 1):
+        """Decorator registering the coroutine that runs jobs of this kind"""
+        def decorator(func):
+            self._handlers[kind] = (func, on_failure, workers)
+            self._wakeups[kind] = asyncio.Event()
+            return func
+        return decorator
+
+    async def _run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    def _open(self):
+        db = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=FULL")
+        db.executescript(_SCHEMA)
+        self._db = db
+
+    # Enqueue with group commit
+
+    async def enqueue(self, kind: str, payload: dict) -> int:
+        """Durably add a job and return its id"""
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((kind, json.dumps(payload, separators=(",", ":")), future))
+        if self._commit_task is None:
+            self._commit_task = asyncio.create_task(self._commit_pending())
+        return await future
+
+    def _insert(self, batch: list) -> list:
+        now = time.time()
+        ids = []
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            for kind, payload in batch:
+                cursor = self._db.execute(
+                    "INSERT INTO jobs (kind, payload, run_after, created) VALUES (?, ?, ?, ?)",
+                    (kind, payload, now, now))
+                ids.append(cursor.lastrowid)
+            self._db.execute("COMMIT")
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+        return ids
+
+    async def _commit_pending(self):
+        try:
+            while self._pending:
+                batch, self._pending = self._pending, []
+                try:
+                    ids = await self._run(self._insert, [(kind, payload) for kind, payload, _ in batch])
+                except Exception as e:
+                    for _, _, future in batch:
+                        if not future.done():
+                            future.set_exception(e)
+                    continue
+                self.commits += 1
+                for (kind, _, future), job_id in zip(batch, ids):
+                    if not future.done():
+                        future.set_result(job_id)
+                    if kind in self._wakeups:
+                        self._wakeups[kind].set()
+        finally:
+            self._commit_task = None
+
+    # Leasing and completion
+
+    def _lease(self, kind: str) -> Optional[Job]:
+        now = time.time()
+        row = self._db.execute(
+            "UPDATE jobs SET state = 'leased', attempts = attempts + 1, lease_until = ?, owner = ? "
+            "WHERE id = (SELECT id FROM jobs WHERE kind = ? AND attempts < ? AND ("
+            "(state = 'queued' AND run_after <= ?) OR (state = 'leased' AND lease_until <= ?)) "
+            "ORDER BY run_after, id LIMIT 1) "
+            "RETURNING id, kind, payload, attempts, created",
+            (now + self.lease_seconds, self.owner, kind, self.max_attempts, now, now)).fetchone()
+        return Job(*row) if row else None
+
+    def _finish(self, job_id: int, state: str, error: str = None):
+        self._db.execute("UPDATE jobs SET state = ?, error = ?, lease_until = 0 WHERE id = ? AND owner = ?",
+                         (state, error, job_id, self.owner))
+
+    def _retry(self, job_id: int, run_after: float, error: str):
+        self._db.execute("UPDATE jobs SET state = 'queued', run_after = ?, error = ?, lease_until = 0 "
+                         "WHERE id = ? AND owner = ?", (run_after, error, job_id, self.owner))
+
+    def _renew(self, job_ids: list):
+        until = time.time() + self.lease_seconds
+        self._db.executemany("UPDATE jobs SET lease_until = ? WHERE id = ? AND owner = ? AND state = 'leased'",
+                             [(until, job_id, self.owner) for job_id in job_ids])
+
+    async def _heartbeat(self):
+        """Keep the leases of running jobs from running out while they are alive"""
+        while True:
+            await asyncio.sleep(self.heartbeat_seconds)
+            if self._running:
+                try:
+                    await self._run(self._renew, list(self._running))
+                except sqlite3.Error as e:
+                    logger.error("Job lease renewal failed: %s", e)
+
+    def _claim_exhausted(self, kind: str) -> Optional[Job]:
+        """Take a job whose last attempt's lease ran out, which _lease never hands out again"""
+        now = time.time()
+        row = self._db.execute(
+            "UPDATE jobs SET owner = ?, lease_until = ? WHERE id = (SELECT id FROM jobs WHERE kind = ? "
+            "AND state = 'leased' AND lease_until <= ? AND attempts >= ? LIMIT 1) "
+            "RETURNING id, kind, payload, attempts, created",
+            (self.owner, now + self.lease_seconds, kind, now, self.max_attempts)).fetchone()
+        return Job(*row) if row else None
+
+    def _purge(self, before: float):
+        self._db.execute("DELETE FROM jobs WHERE state IN ('done', 'failed') AND created < ?", (before,))
+
+    async def _fail(self, job: Job, on_failure: Optional[Callable], error: str):
+        self.failed += 1
+        await self._run(self._finish, job.id, "failed", error)
+        logger.error("Job %s (%s) failed after %s attempts: %s", job.id, job.kind, job.attempts, error)
+        if on_failure is not None:
+            try:
+                await on_failure(job, error)
+            except Exception as e:
+                logger.error("Failure callback for job %s raised: %s", job.id, e)
+
+    async def _execute(self, job: Job):
+        func, on_failure, _ = self._handlers[job.kind]
+        try:
+            await func(job)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            error = str(e) or e.__class__.__name__
+            if job.attempts >= self.max_attempts or not isinstance(e, (RetryJob, asyncio.TimeoutError, OSError)):
+                await self._fail(job, on_failure, error)
+                return
+            delay = self.retry_delay * 2 ** (job.attempts - 1) * random.uniform(0.8, 1.2)
+            await self._run(self._retry, job.id, time.time() + delay, error)
+            asyncio.get_running_loop().call_later(delay, self._wakeups[job.kind].set)
+            logger.warning("Job %s (%s) attempt %s failed, retrying in %.1fs: %s", job.id, job.kind, job.attempts, delay, error)
+            return
+        self.completed += 1
+        await self._run(self._finish, job.id, "done")
+
+    async def _worker(self, kind: str):
+        wakeup = self._wakeups[kind]
+        while not self._stopping:
+            try:
+                job = await self._run(self._lease, kind)
+            except sqlite3.Error as e:
+                logger.error("Job lease failed: %s", e)
+                job = None
+            if job is None:
+                try:
+                    # A final attempt whose process died fails now, not at the next restart
+                    exhausted = await self._run(self._claim_exhausted, kind)
+                except sqlite3.Error as e:
+                    logger.error("Job lease failed: %s", e)
+                    exhausted = None
+                if exhausted is not None:
+                    await self._fail(exhausted, self._handlers[kind][1], "abandoned before it could finish")
+                    continue
+                wakeup.clear()
+                try:
+                    # Expired leases and other processes' jobs become due without a wakeup
+                    await asyncio.wait_for(wakeup.wait(), timeout=1.0)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            self._running[job.id] = asyncio.current_task()
+            try:
+                await self._execute(job)
+            finally:
+                self._running.pop(job.id, None)
+
+    # Lifecycle
+
+    async def start(self):
+        """Open the database, recover orphaned jobs and start the workers"""
+        await self._run(self._open)
+        await self.recover()
+        self._heartbeat_task = asyncio.create_task(self._heartbeat())
+        for kind, (_, _, workers) in self._handlers.items():
+            for _ in range(workers):
+                self._workers.append(asyncio.create_task(self._worker(kind)))
+
+    def _orphans(self) -> tuple:
+        """Count jobs whose owner stopped renewing; return jobs too old or retried too often"""
+        now = time.time()
+        orphaned = self._db.execute(
+            "SELECT COUNT(*) FROM jobs WHERE state = 'leased' AND lease_until <= ?", (now,)).fetchone()[0]
+        expired = self._db.execute(
+            "SELECT id, kind, payload, attempts, created FROM jobs "
+            "WHERE (state = 'queued' OR (state = 'leased' AND lease_until <= ?)) "
+            "AND (created < ? OR attempts >= ?)",
+            (now, now - self.max_age, self.max_attempts)).fetchall()
+        self._db.executemany("UPDATE jobs SET owner = ? WHERE id = ?", [(self.owner, row[0]) for row in expired])
+        self._purge(now - 7 * 86400)
+        return orphaned, [Job(*row) for row in expired]
+
+    async def recover(self):
+        """Resume jobs a dead process left behind and fail the ones past saving"""
+        requeued, expired = await self._run(self._orphans)
+        for job in expired:
+            _, on_failure, _ = self._handlers.get(job.kind, (None, None, None))
+            await self._fail(job, on_failure, "abandoned before it could finish")
+        if requeued or expired:
+            logger.info("Job recovery: resumed %s orphaned jobs, failed %s", requeued, len(expired))
+
+    def running(self) -> int:
+        """Jobs this process is executing right now"""
+        return len(self._running)
+
+    def stop(self):
+        """Stop leasing new jobs; running jobs continue"""
+        self._stopping = True
+        for wakeup in self._wakeups.values():
+            wakeup.set()
+
+    def _unlease(self, job_ids: list):
+        self._db.executemany(
+            "UPDATE jobs SET state = 'queued', attempts = attempts - 1, lease_until = 0, run_after = ? "
+            "WHERE id = ? AND owner = ?", [(time.time(), job_id, self.owner) for job_id in job_ids])
+
+    async def release(self):
+        """Cancel running jobs and put them back in the queue for another process"""
+        job_ids = list(self._running)
+        for job_id in job_ids:
+            self._running[job_id].cancel()
+        if job_ids:
+            await self._run(self._unlease, job_ids)
+            logger.info("Released %s running jobs", len(job_ids))
+
+    def _depth(self) -> int:
+        return self._db.execute("SELECT COUNT(*) FROM jobs WHERE state IN ('queued', 'leased')").fetchone()[0]
+
+    async def depth(self) -> int:
+        """Jobs waiting or running, in any process"""
+        return await self._run(self._depth)
+
+    def stats(self) -> dict:
+        """Counters for this process"""
+        return {"running": len(self._running), "completed": self.completed,
+                "failed": self.failed, "commits": self.commits}
+
+    async def close(self):
+        """Stop the workers and close the database"""
+        self.stop()
+        tasks = self._workers + ([self._heartbeat_task] if self._heartbeat_task is not None else [])
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._workers = []
+        self._heartbeat_task = None
+        if self._db is not None:
+            await self._run(self._db.close)
+            self._db = None
+        self._executor.shutdown(wait=False)
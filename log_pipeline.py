@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+RYSTRIX AI Log Pipeline
+Non-blocking logging: a bounded queue to a writer thread, JSON records with update context
+"""
+
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+import time
+
+import config
+from router import current
+from update_state import current_update_id
+
+CONTEXT_FIELDS = ("update_id", "user_id", "route")
+
+
+class RepeatFilter(logging.Filter):
+    """Lets the first `burst` warnings or errors from one call site through per window.
+
+    Records count as repeats when they come from the same logger and line
+    with the same message template, so lazily formatted calls (%s
+    arguments) collapse however their arguments vary. The first record
+    after a window with suppressions carries the count as `suppressed`.
+    """
+
+    def __init__(self, burst: int, window: float):
+        super().__init__()
+        self.burst = burst
+        self.window = window
+        self.suppressed = 0
+        self._seen = {}  # (logger, line, template) -> [window start, records in window]
+        # Records arrive from the event loop and from worker pool threads alike
+        self._lock = threading.Lock()
+
+    def filter(self, record) -> bool:
+        if record.levelno < logging.WARNING:
+            return True
+        with self._lock:
+            return self._count(record)
+
+    def _count(self, record) -> bool:
+        key = (record.name, record.lineno, record.msg)
+        entry = self._seen.get(key)
+        if entry is None or record.created - entry[0] >= self.window:
+            if entry is not None and entry[1] > self.burst:
+                record.suppressed = entry[1] - self.burst
+            elif entry is None and len(self._seen) >= 1000:
+                self._forget(record.created)
+            self._seen[key] = [record.created, 1]
+            return True
+        entry[1] += 1
+        if entry[1] <= self.burst:
+            return True
+        self.suppressed += 1
+        return False
+
+    def _forget(self, now: float):
+        self._seen = {key: entry for key, entry in self._seen.items() if now - entry[0] < self.window}
+
+
+class BoundedQueueHandler(logging.handlers.QueueHandler):
+    """Queues records with their message rendered; drops and counts them when the queue is full"""
+
+    def __init__(self, capacity: int):
+        super().__init__(queue.Queue(capacity))
+        self.dropped = 0
+        self._exceptions = logging.Formatter()
+
+    def prepare(self, record):
+        # Runs on the logging thread, so the update's contextvars are still set.
+        # Arguments are rendered now, while they hold the values they were
+        # logged with, and the traceback is rendered to text so its frames
+        # are not kept alive in the queue. Layout is left to the writer thread.
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        if record.exc_info:
+            record.exc_text = record.exc_text or self._exceptions.formatException(record.exc_info)
+        record.msg, record.args, record.exc_info = record.message, None, None
+        ctx = current()
+        record.update_id = current_update_id()
+        record.user_id = ctx.user_id if ctx is not None else None
+        record.route = ctx.route if ctx is not None else None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line"""
+
+    def format(self, record) -> str:
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for field in CONTEXT_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if getattr(record, "suppressed", None):
+            entry["suppressed"] = record.suppressed
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        if record.stack_info:
+            entry["stack"] = record.stack_info
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """The classic one-line format with the update context appended"""
+
+    def __init__(self):
+        super().__init__("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+
+    def formatMessage(self, record) -> str:
+        line = super().formatMessage(record)
+        context = " ".join(f"{field}={getattr(record, field)}" for field in CONTEXT_FIELDS
+                           if getattr(record, field, None) is not None)
+        if context:
+            line += f" [{context}]"
+        if getattr(record, "suppressed", None):
+            line += f" ({record.suppressed} similar suppressed)"
+        return line
+
+
+class _Listener(logging.handlers.QueueListener):
+    """Writer thread; reports drops in the stream at most once a second"""
+
+    def __init__(self, handler: BoundedQueueHandler, *handlers):
+        super().__init__(handler.queue, *handlers, respect_handler_level=True)
+        self._source = handler
+        self._reported = 0
+        self._reported_at = 0.0
+
+    def enqueue_sentinel(self):
+        # Waits for room: the stock put_nowait fails when the queue is full
+        self.queue.put(self._sentinel)
+
+    def handle(self, record):
+        dropped = self._source.dropped
+        if dropped > self._reported and time.monotonic() - self._reported_at >= 1:
+            self._reported_at = time.monotonic()
+            notice = logging.LogRecord(__name__, logging.WARNING, __file__, 0,
+                                       "Log queue full: dropped %d records", (dropped - self._reported,), None)
+            self._reported = dropped
+            super().handle(notice)
+        super().handle(record)
+
+
+class LogPipeline:
+    """Routes every logger through one bounded queue to a stream written by a thread.
+
+    Handlers on the root logger are replaced by the queue handler, so a
+    slow terminal or pipe only ever blocks the writer thread. When the
+    writer falls behind by `capacity` records new ones are dropped and
+    counted instead of waiting. Repeats of the same warning or error are
+    capped per window before they take queue space.
+    """
+
+    def __init__(self, level: str = None, fmt: str = None, capacity: int = None, stream=None):
+        self.level = level or config.LOG_LEVEL
+        self.handler = BoundedQueueHandler(capacity or config.LOG_QUEUE_SIZE)
+        self.repeats = RepeatFilter(config.LOG_REPEAT_BURST, config.LOG_REPEAT_WINDOW)
+        self.handler.addFilter(self.repeats)
+        output = logging.StreamHandler(stream or sys.stderr)
+        output.setFormatter(JsonFormatter() if (fmt or config.LOG_FORMAT) == "json" else TextFormatter())
+        self.listener = _Listener(self.handler, output)
+        self._installed = []
+
+    def install(self):
+        """Take over the root logger and start the writer thread"""
+        root = logging.getLogger()
+        for logger in (root, logging.getLogger("TeleBot")):
+            # telebot writes straight to stderr from its own handler
+            self._installed.append((logger, logger.handlers[:]))
+            for handler in logger.handlers[:]:
+                logger.removeHandler(handler)
+        root.addHandler(self.handler)
+        root.setLevel(self.level)
+        self.listener.start()
+        atexit.register(self.stop)
+
+    def stop(self):
+        """Write out what is queued, stop the thread and restore the previous handlers"""
+        if self.listener._thread is None:
+            return
+        self.listener.stop()
+        logging.getLogger().removeHandler(self.handler)
+        for logger, handlers in self._installed:
+            for handler in handlers:
+                logger.addHandler(handler)
+        self._installed = []
+
+    def snapshot(self) -> dict:
+        """Queued, dropped and suppressed record counts"""
+        return {"queued": self.handler.queue.qsize(), "dropped": self.handler.dropped,
+                "suppressed": self.repeats.suppressed}
@@ -4,83 +4,106 @@ RYSTRIX AI Telegram Bot
 A comprehensive Telegram bot with AI chat, image generation, and TTS capabilities.
 """
 
+import startup_profile
 import logging
 import asyncio
 import aiohttp
-import time
+import hashlib
 import json
+import time
 from datetime import datetime
-import telebot
-from telebot import types
+from telebot import asyncio_helper, types
 from telebot.async_telebot import AsyncTeleBot
 import config
-from chat_handler import process_chat as handle_chat
-
-# Configure logging
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
+from chat_handler import process_chat as handle_chat, chat_cache
+from media_relay import MediaRelay, MediaRelayError
+import image_handler
+import image_postprocess
+import workers
+from quota import QuotaManager
+from update_state import UpdateState
+from job_queue import JobQueue, RetryJob
+from restart import RestartController
+from inline_mode import InlineMode
+from diagnostics import Diagnostics
+from broadcast import Broadcaster
+from log_pipeline import LogPipeline
+from tts_audio import TtsAudio
+import adaptive_limit
+import utils
+import responses
+import shared
+from router import (
+    Router, TimingMiddleware, ThrottleMiddleware, error_middleware, stats_middleware,
+    chat_mode_middleware, answer_callback_middleware, current
 )
+from utils import main_keyboard, chat_mode_keyboard, back_keyboard
+
+startup_profile.mark("imports")
+
+# Log through a queue so a slow stderr never blocks the event loop
+log_pipeline = LogPipeline()
+log_pipeline.install()
 logger = logging.getLogger(__name__)
 
-# Initialize bot
-bot = AsyncTeleBot(config.BOT_TOKEN)
+# Initialize bot, resuming from the persisted polling offset
+asyncio_helper.API_URL = f"{config.TELEGRAM_API_URL.rstrip('/')}/bot{{0}}/{{1}}"
+update_state = UpdateState()
+bot = AsyncTeleBot(config.BOT_TOKEN, offset=update_state.next_offset)
+media_relay = MediaRelay()
+tts_audio = TtsAudio()
+quotas = QuotaManager()
+job_queue = JobQueue()
+inline_mode = InlineMode(bot, media_relay, quotas, tts_audio=tts_audio)
+diagnostics = Diagnostics()
+broadcaster = Broadcaster(bot)
 
-# User data storage
-user_conversations = {}
-chat_mode_users = set()
+# Route updates through one dispatcher; middlewares run in this order
+router = Router()
+traffic_recorder = None
+if config.RECORDER_ENABLED:
+    from recorder import TrafficRecorder
+    traffic_recorder = TrafficRecorder()
+    router.use(traffic_recorder.middleware)
+route_timing = TimingMiddleware(config.SLOW_HANDLER_SECONDS)
+router.use(route_timing)
+router.use(error_middleware)
+router.use(broadcaster.middleware)
+router.use(ThrottleMiddleware(config.THROTTLE_INTERVAL))
+router.use(answer_callback_middleware)
+router.use(stats_middleware)
+router.use(chat_mode_middleware)
 
 # Bot start time for uptime calculation
 bot_start_time = datetime.now()
 
-def main_keyboard():
-    """Create main menu inline keyboard"""
-    keyboard = types.InlineKeyboardMarkup(row_width=2)
-    keyboard.add(
-        types.InlineKeyboardButton("💬 Chat Mode", callback_data="chat_mode"),
-        types.InlineKeyboardButton("🖼️ Generate Image", callback_data="image_gen")
-    )
-    keyboard.add(
-        types.InlineKeyboardButton("🔊 Text-to-Speech", callback_data="tts"),
-        types.InlineKeyboardButton("❓ Help", callback_data="help")
-    )
-    return keyboard
+# Graceful restart: pick up a snapshot left by the process we replace
+restart_controller = RestartController(bot, update_state, job_queue)
+restart_controller.install()
+resumed_from_restart = restart_controller.resume()
 
-def chat_mode_keyboard():
-    """Create chat mode keyboard"""
-    keyboard = types.InlineKeyboardMarkup()
-    keyboard.add(types.InlineKeyboardButton("🚪 Exit Chat Mode", callback_data="exit_chat"))
-    return keyboard
+def format_uptime() -> str:
+    """Uptime as 1d 2h 3m 4s"""
+    uptime = datetime.now() - bot_start_time
+    hours, remainder = divmod(uptime.seconds, 3600)
+    minutes, seconds = divmod(remainder, 60)
+    return f"{uptime.days}d {hours}h {minutes}m {seconds}s"
 
-def back_keyboard():
-    """Create back to main menu keyboard"""
-    keyboard = types.InlineKeyboardMarkup()
-    keyboard.add(types.InlineKeyboardButton("🔙 Back to Main Menu", callback_data="back_main"))
-    return keyboard
+async def enforce_quota(message, capability, cost=1):
+    """Reply with a retry hint and return False when the user is over quota"""
+    result = quotas.acquire(message.from_user.id, capability, cost)
+    if not result.allowed:
+        await bot.send_message(
+            message.chat.id,
+            responses.quota_text(capability, result.retry_after, result.scope),
+            parse_mode='Markdown'
+        )
+    return result.allowed
 
-@bot.message_handler(commands=['start'])
+@router.command('start')
 async def start_command(message):
     """Handle /start command"""
-    user = message.from_user
-    welcome_message = (
-        f"🤖 **Welcome to {config.BOT_NAME}**, {user.first_name}!\n\n"
-        "🚀 **Your AI-Powered Assistant**\n\n"
-        "✨ **Features:**\n"
-        "💬 **Smart Chat** - Intelligent conversations with advanced AI\n"
-        "🖼️ **Image Creation** - Generate stunning artwork and visuals\n"
-        "🔊 **Voice Synthesis** - High-quality text-to-speech conversion\n"
-        "⚡ **Chat Mode** - Seamless conversation experience\n\n"
-        "🎯 **Available Commands:**\n"
-        "• `/chat` - Enter interactive chat mode\n"
-        "• `/image <prompt>` - Create custom images\n"
-        "• `/say <text>` - Convert text to speech\n"
-        "• `/ping` - Check system status & performance\n"
-        "• `/help` - Get detailed help information\n\n"
-        f"🏆 **{config.BOT_VERSION}** | Powered by Advanced AI Technology\n"
-        f"👨‍💻 **Developer:** {config.DEVELOPER_HANDLE}\n"
-        f"🌟 **Community:** {config.COMMUNITY_HANDLE}\n\n"
-        "**Ready to assist you 24/7!**"
-    )
+    welcome_message = responses.welcome_text(message.from_user.first_name)
     
     keyboard = main_keyboard()
     await bot.send_message(
@@ -90,24 +113,10 @@ async def start_command(message):
         reply_markup=keyboard
     )
 
-@bot.message_handler(commands=['help'])
+@router.command('help')
 async def help_command(message):
     """Handle /help command"""
-    help_text = (
-        f"🤖 **{config.BOT_NAME} Help**\n\n"
-        "**🔧 Commands:**\n"
-        "/start - Start the bot\n"
-        "/help - Show this help message\n"
-        "/chat - Enter chat mode for conversations\n"
-        "/image <prompt> - Generate an image\n"
-        "/say <text> - Convert text to speech\n"
-        "/ping - Check bot status and uptime\n\n"
-        "**💡 Tips:**\n"
-        "• Use Chat Mode for cleaner conversations\n"
-        "• Be specific with image prompts for better results\n"
-        "• TTS supports multiple languages\n\n"
-        f"**📞 Support:** {config.COMMUNITY_HANDLE}"
-    )
+    help_text = responses.HELP_TEXT
     
     keyboard = main_keyboard()
     await bot.send_message(
@@ -117,17 +126,11 @@ async def help_command(message):
         reply_markup=keyboard
     )
 
-@bot.message_handler(commands=['ping'])
+@router.command('ping')
 async def ping_command(message):
     """Handle /ping command"""
     start_time = time.time()
     
-    # Calculate uptime
-    uptime = datetime.now() - bot_start_time
-    days = uptime.days
-    hours, remainder = divmod(uptime.seconds, 3600)
-    minutes, seconds = divmod(remainder, 60)
-    
     # Send initial message
     msg = await bot.send_message(
         message.chat.id,
@@ -151,9 +154,9 @@ async def ping_command(message):
     ping_message = (
         "🏓 **Bot Status**\n\n"
         f"📊 **Response Time:** {response_time:.0f}ms\n"
-        f"⏱️ **Uptime:** {days}d {hours}h {minutes}m {seconds}s\n"
+        f"⏱️ **Uptime:** {format_uptime()}\n"
         f"🔗 **API Status:** {api_status}\n"
-        f"👥 **Active Users:** {len(user_conversations)}\n"
+        f"👥 **Active Users:** {shared.get_stats()['active_users']}\n"
         f"🤖 **Bot Version:** {config.BOT_VERSION}\n\n"
         f"Made by {config.DEVELOPER_HANDLE}"
     )
@@ -167,23 +170,20 @@ async def ping_command(message):
         reply_markup=keyboard
     )
 
-@bot.message_handler(commands=['chat'])
+@router.command('chat')
 async def chat_command(message):
     """Handle /chat command - enter chat mode"""
-    user_id = message.from_user.id
-    chat_mode_users.add(user_id)
+    shared.add_chat_mode_user(message.from_user.id)
     
     keyboard = chat_mode_keyboard()
     await bot.send_message(
         message.chat.id,
-        "💬 **Chat Mode Activated!**\n\n"
-        f"Now you can chat directly with {config.BOT_NAME}. Just send your messages!\n"
-        "Use the 'Exit Chat Mode' button below to return to main menu.",
+        responses.CHAT_MODE_ON_TEXT,
         parse_mode='Markdown',
         reply_markup=keyboard
     )
 
-@bot.message_handler(commands=['image'])
+@router.command('image')
 async def image_command(message):
     """Handle /image command"""
     # Extract prompt from message
@@ -192,28 +192,38 @@ async def image_command(message):
         keyboard = main_keyboard()
         await bot.send_message(
             message.chat.id,
-            "🖼️ **Image Generation**\n\n"
-            "Please provide a prompt:\n"
-            "`/image your prompt here`\n\n"
-            "**Examples:**\n"
-            "• `/image a beautiful sunset over mountains`\n"
-            "• `/image anime girl with blue hair`\n"
-            "• `/image realistic portrait of a cat`",
+            responses.IMAGE_USAGE_TEXT,
             parse_mode='Markdown',
             reply_markup=keyboard
         )
         return
     
-    prompt = command_parts[1]
+    prompt, variants, style = image_handler.parse_image_options(command_parts[1])
+    if not prompt.strip():
+        await bot.send_message(
+            message.chat.id,
+            "⚠️ **Missing prompt**\n\nUsage: `/image -n 4 -s anime your prompt here`",
+            parse_mode='Markdown',
+            reply_markup=main_keyboard()
+        )
+        return
+    
+    if not await enforce_quota(message, "image", variants):
+        return
+    
     status_msg = await bot.send_message(
         message.chat.id,
         "🎨 **Generating image...**\n\nThis may take a moment.",
         parse_mode='Markdown'
     )
     
-    await process_image_generation(prompt, status_msg, message, message.from_user.id)
+    # Durable from here on: a crash or restart resumes the job instead of losing it
+    await job_queue.enqueue("image", {
+        "prompt": prompt, "variants": variants, "style": style, "chat_id": message.chat.id,
+        "status_message_id": status_msg.message_id, "reply_to": message.message_id,
+    })
 
-@bot.message_handler(commands=['say'])
+@router.command('say')
 async def say_command(message):
     """Handle /say command - Text to Speech"""
     # Extract text from message
@@ -222,12 +232,7 @@ async def say_command(message):
         keyboard = main_keyboard()
         await bot.send_message(
             message.chat.id,
-            "🔊 **Text-to-Speech**\n\n"
-            "Please provide text to convert:\n"
-            "`/say your text here`\n\n"
-            "**Examples:**\n"
-            f"• `/say Hello, this is {config.BOT_NAME}!`\n"
-            "• `/say Welcome to our community`",
+            responses.SAY_USAGE_TEXT,
             parse_mode='Markdown',
             reply_markup=keyboard
         )
@@ -245,129 +250,122 @@ async def say_command(message):
         )
         return
     
+    if not await enforce_quota(message, "tts"):
+        return
+    
     status_msg = await bot.send_message(
         message.chat.id,
         "🔊 **Generating speech...**\n\nProcessing your text...",
         parse_mode='Markdown'
     )
     
-    await process_tts_generation(text, status_msg, message)
+    await job_queue.enqueue("tts", {
+        "text": text, "chat_id": message.chat.id,
+        "status_message_id": status_msg.message_id, "reply_to": message.message_id,
+    })
+
+async def tts_job_failed(job, error):
+    """Tell the user a TTS job could not be completed"""
+    await bot.edit_message_text(
+        "⚠️ **TTS generation failed**\n\nPlease try again or contact support.",
+        job.payload["chat_id"],
+        job.payload["status_message_id"],
+        parse_mode='Markdown',
+        reply_markup=main_keyboard()
+    )
+
+@job_queue.handler("tts", on_failure=tts_job_failed, workers=config.JOB_WORKERS['tts'])
+async def tts_job(job):
+    """Run a queued TTS job"""
+    await process_tts_generation(**job.payload)
 
-async def process_tts_generation(text, status_msg, message):
-    """Process TTS generation"""
+async def process_tts_generation(text, chat_id, status_message_id, reply_to):
+    """Process TTS generation; raising hands the job back to the queue"""
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                config.TTS_API_URL,
-                json={
-                    "model": config.TTS_MODEL,
-                    "input": text,
-                    "voice": "aria",
-                    "response_format": "mp3"
-                },
-                timeout=config.API_TIMEOUT
-            ) as response:
-                if response.status == 200:
-                    audio_data = await response.read()
-                    
-                    await bot.send_voice(
-                        message.chat.id,
-                        audio_data,
-                        caption=f"🔊 **TTS Generated**\n\n📝 **Text:** {text[:100]}{'...' if len(text) > 100 else ''}\n\n`{config.UNIQUE_WORD}`",
-                        parse_mode='Markdown',
-                        reply_to_message_id=message.message_id
-                    )
-                    await bot.delete_message(message.chat.id, status_msg.message_id)
-                else:
-                    keyboard = main_keyboard()
-                    await bot.edit_message_text(
-                        "⚠️ **TTS service unavailable**\n\nPlease try again later.",
-                        message.chat.id,
-                        status_msg.message_id,
-                        parse_mode='Markdown',
-                        reply_markup=keyboard
-                    )
-    except asyncio.TimeoutError:
-        keyboard = main_keyboard()
-        await bot.edit_message_text(
-            "⚠️ **Request timeout**\n\nThe text was too long or service is slow.",
-            message.chat.id,
-            status_msg.message_id,
+        await tts_audio.send(
+            media_relay,
+            chat_id,
+            text,
+            caption=f"🔊 **TTS Generated**\n\n📝 **Text:** {text[:100]}{'...' if len(text) > 100 else ''}\n\n`{config.UNIQUE_WORD}`",
             parse_mode='Markdown',
-            reply_markup=keyboard
-        )
-    except Exception as e:
-        logger.error(f"TTS error: {e}")
-        keyboard = main_keyboard()
-        await bot.edit_message_text(
-            "⚠️ **TTS generation failed**\n\nPlease try again or contact support.",
-            message.chat.id,
-            status_msg.message_id,
-            parse_mode='Markdown',
-            reply_markup=keyboard
+            reply_to_message_id=reply_to
         )
+    except MediaRelayError as e:
+        logger.error("TTS relay error: %s", e)
+        raise RetryJob(str(e))
+    shared.update_stats("total_tts")
+    await bot.delete_message(chat_id, status_message_id)
+
+async def image_job_failed(job, error):
+    """Tell the user an image job could not be completed; the job queue logs the cause"""
+    await bot.edit_message_text(
+        "⚠️ **Image generation failed**\n\nPlease try again or contact support.",
+        job.payload["chat_id"],
+        job.payload["status_message_id"],
+        parse_mode='Markdown',
+        reply_markup=main_keyboard()
+    )
 
-async def process_image_generation(text, status_msg, message, uid):
-    """Process image generation"""
-    imaging_task = asyncio.create_task(animate_imaging(status_msg))
+@job_queue.handler("image", on_failure=image_job_failed, workers=config.JOB_WORKERS['image'])
+async def image_job(job):
+    """Run a queued image job"""
+    await process_image_generation(**job.payload)
+
+async def process_image_generation(prompt, chat_id, status_message_id, reply_to, variants=1, style=None):
+    """Process image generation; raising hands the job back to the queue"""
+    imaging_task = asyncio.create_task(animate_imaging(chat_id, status_message_id))
     
     try:
-        prompt_lower = text.lower()
-        template = 'default'
+        template = image_handler.detect_image_template(prompt, style)
+        result = await image_handler.generate_reflexai_images(prompt, template, variants)
+        imaging_task.cancel()
+        if not result["success"]:
+            await bot.edit_message_text(
+                f"⚠️ {result['error']}",
+                chat_id,
+                status_message_id
+            )
+            return
         
-        if "portrait" in prompt_lower or "face" in prompt_lower:
-            template = 'portrait'
-        elif "landscape" in prompt_lower or "scenery" in prompt_lower:
-            template = 'landscape'
-        elif "anime" in prompt_lower or "cartoon" in prompt_lower:
-            template = 'anime'
-        elif "realistic" in prompt_lower or "photo" in prompt_lower:
-            template = 'realistic'
+        image_urls = result["image_urls"]
+        caption = f"🖼️ **Generated Image**\n\n📝 **Prompt:** {prompt}\n\n`{config.UNIQUE_WORD}`"
+        if result["failed"]:
+            caption += f"\n\n⚠️ {len(image_urls)} of {result['requested']} variants generated"
         
-        enhanced_prompt = config.PROMPT_ENHANCERS[template].format(prompt=text)
+        if image_postprocess.is_enabled():
+            image_urls = await image_postprocess.postprocess_urls(image_urls)
         
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                config.IMAGE_API_URL,
-                json={
-                    "prompt": enhanced_prompt,
-                    "model": config.IMAGE_MODEL,
-                    "n": 1,
-                    "size": "1024x1024",
-                    "quality": "hd"
-                },
-                timeout=config.API_TIMEOUT
-            ) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    image_url = data["data"][0]["url"]
-                    
-                    await bot.send_photo(
-                        message.chat.id,
-                        image_url,
-                        caption=f"🖼️ **Generated Image**\n\n📝 **Prompt:** {text}\n\n`{config.UNIQUE_WORD}`",
-                        parse_mode='Markdown',
-                        reply_to_message_id=message.message_id
-                    )
-                    await bot.delete_message(message.chat.id, status_msg.message_id)
-                else:
-                    await bot.edit_message_text(
-                        "⚠️ Image service is busy. Please try again later.",
-                        message.chat.id,
-                        status_msg.message_id
-                    )
-    except (aiohttp.ClientError, asyncio.TimeoutError):
-        await bot.edit_message_text(
-            "⚠️ Connection to image service failed.",
-            message.chat.id,
-            status_msg.message_id
-        )
-    except Exception as e:
-        await bot.edit_message_text(
-            f"⚠️ Failed to generate image: {str(e)}",
-            message.chat.id,
-            status_msg.message_id
-        )
+        if len(image_urls) == 1 and not isinstance(image_urls[0], str):
+            await media_relay.send_photo_file(
+                chat_id,
+                image_urls[0]["data"],
+                image_urls[0]["filename"],
+                image_urls[0]["content_type"],
+                caption=caption,
+                parse_mode='Markdown',
+                reply_to_message_id=reply_to
+            )
+        elif len(image_urls) == 1:
+            await media_relay.send_photo(
+                chat_id,
+                image_urls[0],
+                caption=caption,
+                parse_mode='Markdown',
+                reply_to_message_id=reply_to
+            )
+        else:
+            await media_relay.send_media_group(
+                chat_id,
+                image_urls,
+                caption=caption,
+                parse_mode='Markdown',
+                reply_to_message_id=reply_to
+            )
+        shared.update_stats("total_images")
+        await bot.delete_message(chat_id, status_message_id)
+    except MediaRelayError as e:
+        logger.error("Image delivery error: %s", e)
+        raise RetryJob("Connection to image service failed.")
     finally:
         imaging_task.cancel()
 
@@ -375,133 +373,263 @@ async def process_image_generation(text, status_msg, message, uid):
 
 async def process_chat_message(text, thinking_msg, uid):
     """Process chat message and generate AI response"""
-    from chat_handler import process_chat_message as handle_chat
-    
     think_task = asyncio.create_task(animate_thinking(thinking_msg))
     
     try:
         # Use the dedicated chat handler
-        reply = await handle_chat(text, thinking_msg, user_id)
+        reply = await handle_chat(text, uid)
         
     except Exception as e:
-        logger.error(f"Chat processing error: {e}")
+        logger.error("Chat processing error: %s", e)
         reply = "⚠️ Processing error. Please try again."
     
     think_task.cancel()
 
     keyboard = back_keyboard()
-    await bot.edit_message_text(
-        f"💬 **{config.BOT_NAME}:**\n\n{reply.strip()}\n\n",
+    await utils.send_rendered(
+        bot,
         thinking_msg.chat.id,
-        thinking_msg.message_id,
+        f"💬 **{config.BOT_NAME}:**\n\n{reply.strip()}",
+        edit_message_id=thinking_msg.message_id,
+        reply_markup=keyboard
+    )
+
+async def edit_menu(call, text, keyboard):
+    """Replace a menu message with another static screen"""
+    await bot.edit_message_text(
+        text,
+        call.message.chat.id,
+        call.message.message_id,
         parse_mode='Markdown',
         reply_markup=keyboard
     )
 
-@bot.callback_query_handler(func=lambda call: True)
-async def handle_callback_query(call):
-    """Handle inline keyboard callbacks"""
-    await bot.answer_callback_query(call.id)
-    
-    user_id = call.from_user.id
-    message = call.message
-    
-    if call.data == "chat_mode":
-        chat_mode_users.add(user_id)
-        keyboard = chat_mode_keyboard()
-        await bot.edit_message_text(
-            "💬 **Chat Mode Activated!**\n\n"
-            f"Now you can chat directly with {config.BOT_NAME}. Just send your messages!\n"
-            "Use the 'Exit Chat Mode' button below to return to main menu.",
-            message.chat.id,
-            message.message_id,
-            parse_mode='Markdown',
-            reply_markup=keyboard
-        )
-    
-    elif call.data == "exit_chat":
-        chat_mode_users.discard(user_id)
-        keyboard = main_keyboard()
-        await bot.edit_message_text(
-            "👋 **Chat Mode Deactivated**\n\n"
-            f"You've exited chat mode. Use the buttons below to interact with {config.BOT_NAME}.",
-            message.chat.id,
-            message.message_id,
-            parse_mode='Markdown',
-            reply_markup=keyboard
-        )
-    
-    elif call.data == "image_gen":
-        keyboard = back_keyboard()
-        await bot.edit_message_text(
-            "🖼️ **Image Generation**\n\n"
-            "Use the command: `/image your prompt here`\n\n"
-            "**Tips for better results:**\n"
-            "• Be specific and descriptive\n"
-            "• Mention style (realistic, anime, cartoon)\n"
-            "• Include lighting and mood details",
-            message.chat.id,
-            message.message_id,
-            parse_mode='Markdown',
-            reply_markup=keyboard
-        )
-    
-    elif call.data == "tts":
-        keyboard = back_keyboard()
-        await bot.edit_message_text(
-            "🔊 **Text-to-Speech**\n\n"
-            "Use the command: `/say your text here`\n\n"
-            "**Features:**\n"
-            "• High-quality voice synthesis\n"
-            "• Multiple language support\n"
-            "• Fast processing",
-            message.chat.id,
-            message.message_id,
-            parse_mode='Markdown',
-            reply_markup=keyboard
-        )
-    
-    elif call.data == "help":
-        keyboard = back_keyboard()
-        await bot.edit_message_text(
-            f"🤖 **{config.BOT_NAME} Help**\n\n"
-            "**🔧 Commands:**\n"
-            "/start - Start the bot\n"
-            "/help - Show help message\n"
-            "/chat - Enter chat mode\n"
-            "/image <prompt> - Generate image\n"
-            "/say <text> - Text-to-speech\n"
-            "/ping - Bot status\n\n"
-            f"**📞 Support:** {config.COMMUNITY_HANDLE}",
+@router.callback("chat_mode")
+async def chat_mode_callback(call):
+    """Enter chat mode from the menu"""
+    shared.add_chat_mode_user(call.from_user.id)
+    await edit_menu(call, responses.CHAT_MODE_ON_TEXT, chat_mode_keyboard())
+
+@router.callback("exit_chat")
+async def exit_chat_callback(call):
+    """Leave chat mode"""
+    shared.remove_chat_mode_user(call.from_user.id)
+    await edit_menu(call, responses.CHAT_MODE_OFF_TEXT, main_keyboard())
+
+@router.callback("image_gen")
+async def image_gen_callback(call):
+    """Show image generation instructions"""
+    await edit_menu(call, responses.IMAGE_GEN_INFO_TEXT, back_keyboard())
+
+@router.callback("tts")
+async def tts_callback(call):
+    """Show text-to-speech instructions"""
+    await edit_menu(call, responses.TTS_INFO_TEXT, back_keyboard())
+
+@router.callback("help")
+async def help_callback(call):
+    """Show the short help screen"""
+    await edit_menu(call, responses.HELP_SHORT_TEXT, back_keyboard())
+
+@router.callback("back_main")
+async def back_main_callback(call):
+    """Return to the main menu"""
+    await edit_menu(call, responses.MAIN_MENU_TEXT, main_keyboard())
+
+@router.command('admin')
+async def admin_command(message):
+    """Show the admin panel"""
+    if not utils.is_admin(message.from_user.id):
+        await bot.send_message(message.chat.id, responses.ADMIN_ONLY_TEXT, parse_mode='Markdown')
+        return
+    await bot.send_message(
+        message.chat.id,
+        responses.ADMIN_PANEL_TEXT,
+        parse_mode='Markdown',
+        reply_markup=utils.admin_keyboard()
+    )
+
+def chat_cache_line() -> str:
+    """Chat cache effectiveness for the admin panel, if the cache is on"""
+    if chat_cache is None:
+        return ""
+    cache = chat_cache.snapshot()
+    return (
+        f"🗃️ **Chat cache:** {cache['hit_rate']:.0%} hits ({cache['exact_hits']} exact, "
+        f"{cache['near_hits']} near) of {cache['lookups']}, {cache['bypassed']} with context, "
+        f"{cache['saved_seconds']:.0f}s saved\n"
+    )
+
+def inline_line() -> str:
+    """Inline mode activity for the admin panel"""
+    inline = inline_mode.snapshot()
+    return (
+        f"🔎 **Inline:** {inline['queries']} queries, {inline['from_cache']} from cache, "
+        f"{inline['superseded']} superseded, {inline['generated']} generated\n"
+    )
+
+def loop_line() -> str:
+    """Event-loop health for the admin panel"""
+    loop = diagnostics.snapshot()
+    return (
+        f"🩺 **Loop lag:** p50 {loop['lag_p50_ms']:.1f}ms p99 {loop['lag_p99_ms']:.1f}ms "
+        f"max {loop['lag_max_ms']:.0f}ms | **Slow callbacks:** {loop['slow_callbacks']}\n"
+    )
+
+def voice_paths() -> str:
+    """How voice notes were produced, for the admin panel"""
+    voice = tts_audio.snapshot()
+    return f" | **Opus:** {voice['native']} native, {voice['transcoded']} transcoded, {voice['mp3']} MP3"
+
+def upstream_line() -> str:
+    """Adaptive upstream concurrency limits for the admin panel"""
+    limits = adaptive_limit.snapshot()
+    if not limits:
+        return ""
+    parts = ", ".join(
+        f"{name} {limit['in_flight']}/{limit['limit']}" + (f" (+{limit['waiting']} waiting)" if limit['waiting'] else "")
+        for name, limit in sorted(limits.items())
+    )
+    return f"🎚️ **Upstream in flight/limit:** {parts}\n"
+
+def log_line() -> str:
+    """Logging pipeline health for the admin panel"""
+    logs = log_pipeline.snapshot()
+    return f"📝 **Logs:** {logs['queued']} queued, {logs['dropped']} dropped, {logs['suppressed']} repeats suppressed\n"
+
+def admin_stats_text() -> str:
+    """Render runtime statistics for the admin panel"""
+    stats = shared.get_stats()
+    quota = quotas.snapshot()
+    jobs = job_queue.stats()
+    routes = sorted(route_timing.snapshot().items(), key=lambda item: item[1]["count"], reverse=True)[:6]
+    route_lines = "\n".join(
+        f"• `{route}` {timing['count']}× avg {timing['mean_ms']:.0f}ms max {timing['max_ms']:.0f}ms"
+        for route, timing in routes
+    ) or "• none yet"
+    return (
+        "📊 **Admin Statistics**\n\n"
+        f"⏱️ **Uptime:** {format_uptime()}\n"
+        f"👥 **Active Users:** {stats['active_users']} | **Registered:** {broadcaster.user_count()}\n"
+        f"💬 **Messages:** {stats['total_messages']}\n"
+        f"🖼️ **Images:** {stats['total_images']}\n"
+        f"🔊 **TTS:** {stats['total_tts']}{voice_paths()}\n"
+        f"⚠️ **Errors:** {stats['errors']}\n"
+        f"⏳ **In flight:** {len(update_state.in_flight())} | **Duplicates skipped:** {update_state.skipped}\n"
+        f"🧵 **Jobs:** {jobs['running']} running, {jobs['completed']} done, {jobs['failed']} failed\n"
+        f"{chat_cache_line()}"
+        f"{inline_line()}"
+        f"{loop_line() if config.DIAG_ENABLED else ''}"
+        f"{upstream_line()}"
+        f"{log_line()}"
+        f"🚦 **Quota denials:** {quota['denied']['user']} user, {quota['denied']['global']} global "
+        f"({quota['tracked_users']} users tracked)\n\n"
+        f"**Busiest routes:**\n{route_lines}"
+    )
+
+@router.callback("admin_stats")
+async def admin_stats_callback(call):
+    """Show runtime statistics to the admin"""
+    if not utils.is_admin(call.from_user.id):
+        return
+    await edit_menu(call, admin_stats_text(), utils.admin_keyboard())
+
+@router.callback("admin_restart")
+async def admin_restart_callback(call):
+    """Restart into a fresh process without dropping updates"""
+    if not utils.is_admin(call.from_user.id):
+        return
+    await edit_menu(call, responses.RESTARTING_TEXT, None)
+    await restart_controller.restart()
+
+async def send_profile(call, title, make_report, filename):
+    """Run a time-boxed profile and send the admin its report as a file"""
+    chat_id = call.message.chat.id
+    if diagnostics.profiling:
+        await bot.send_message(chat_id, responses.PROFILE_BUSY_TEXT, parse_mode='Markdown')
+        return
+    status_msg = await bot.send_message(chat_id, f"🩺 **{title}** running...", parse_mode='Markdown')
+    report = await make_report()
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+    await bot.send_document(chat_id, report.encode(), visible_file_name=f"{filename}-{stamp}.txt", caption=title)
+    await bot.delete_message(chat_id, status_msg.message_id)
+
+@router.callback("admin_profile_cpu")
+async def admin_profile_cpu_callback(call):
+    """Sample the event loop thread and send the CPU profile"""
+    if not utils.is_admin(call.from_user.id):
+        return
+    await send_profile(call, f"CPU profile ({config.DIAG_PROFILE_SECONDS}s)", diagnostics.cpu_profile, "cpu-profile")
+
+@router.callback("admin_profile_memory")
+async def admin_profile_memory_callback(call):
+    """Trace allocations for a while and send the top allocators"""
+    if not utils.is_admin(call.from_user.id):
+        return
+    await send_profile(call, f"Memory top ({config.DIAG_TRACEMALLOC_SECONDS}s)", diagnostics.memory_profile,
+                       "memory-top")
+
+def command_entities(message, text: str) -> list:
+    """Entities of the text after a command, re-based to that text"""
+    # The command and the whitespace after it are ASCII, so UTF-16 offsets shift by len()
+    shift = len(message.text) - len(text)
+    return [
+        {**entity, "offset": entity["offset"] - shift}
+        for entity in message.json.get("entities", [])
+        if entity["offset"] >= shift
+    ]
+
+@router.command('broadcast')
+async def broadcast_command(message):
+    """Send an announcement to every registered user"""
+    if not utils.is_admin(message.from_user.id):
+        await bot.send_message(message.chat.id, responses.ADMIN_ONLY_TEXT, parse_mode='Markdown')
+        return
+    command_parts = message.text.split(None, 1)
+    text = command_parts[1] if len(command_parts) > 1 else ""
+    if text.strip().lower() == "stop":
+        broadcast_id = await broadcaster.stop_broadcast()
+        if broadcast_id is None:
+            reply = responses.NO_BROADCAST_TEXT
+        else:
+            reply = responses.broadcast_stopped_text(broadcast_id)
+        await bot.send_message(message.chat.id, reply, parse_mode='Markdown')
+        return
+    if message.reply_to_message is not None:
+        source = message.reply_to_message.json
+    elif text:
+        source = {"text": text, "entities": command_entities(message, text)}
+    else:
+        await bot.send_message(
             message.chat.id,
-            message.message_id,
-            parse_mode='Markdown',
-            reply_markup=keyboard
+            responses.broadcast_usage_text(broadcaster.user_count()),
+            parse_mode='Markdown'
         )
+        return
     
-    elif call.data == "back_main":
-        keyboard = main_keyboard()
+    status_msg = await bot.send_message(message.chat.id, responses.BROADCAST_STARTING_TEXT, parse_mode='Markdown')
+    # Runs in the background: the update completes now, so a restart never replays it
+    if await broadcaster.start_broadcast(source, message.chat.id, status_msg.message_id) is None:
         await bot.edit_message_text(
-            f"🤖 **{config.BOT_NAME}**\n\n"
-            "Your intelligent assistant for chat, image generation, and text-to-speech!\n\n"
-            "Choose an option below to get started:",
+            responses.BROADCAST_BUSY_TEXT,
             message.chat.id,
-            message.message_id,
-            parse_mode='Markdown',
-            reply_markup=keyboard
+            status_msg.message_id,
+            parse_mode='Markdown'
         )
 
-@bot.message_handler(func=lambda message: True)
+@router.default()
 async def handle_message(message):
     """Handle regular messages"""
     user_id = message.from_user.id
     text = message.text
     
-    # Check if user is in chat mode
-    if user_id in chat_mode_users:
+    # Chat mode was looked up once by the router middleware
+    if current().in_chat_mode:
+        if not await enforce_quota(message, "chat"):
+            return
         thinking_msg = await bot.send_message(
             message.chat.id,
-            f"🤔 **{config.BOT_NAME} is thinking...**",
+            responses.THINKING_TEXT,
             parse_mode='Markdown'
         )
         await process_chat_message(text, thinking_msg, user_id)
@@ -510,13 +638,16 @@ async def handle_message(message):
         keyboard = main_keyboard()
         await bot.send_message(
             message.chat.id,
-            f"🤖 **{config.BOT_NAME}**\n\n"
-            "Please use the buttons below or commands to interact with me!\n\n"
-            "💡 **Tip:** Use `/chat` to enter chat mode for direct conversations.",
+            responses.NOT_IN_CHAT_MODE_TEXT,
             parse_mode='Markdown',
             reply_markup=keyboard
         )
 
+router.install(bot)
+inline_mode.install(router)
+update_state.install(bot)
+startup_profile.mark("bot and handler setup")
+
 async def animate_thinking(message):
     """Animate thinking dots"""
     thinking_states = [
@@ -547,7 +678,7 @@ async def animate_thinking(message):
     except asyncio.CancelledError:
         pass
 
-async def animate_imaging(message):
+async def animate_imaging(chat_id, message_id):
     """Animate image generation status"""
     imaging_states = [
         "🎨 **Creating your image**.",
@@ -567,8 +698,8 @@ async def animate_imaging(message):
                 try:
                     await bot.edit_message_text(
                         state,
-                        message.chat.id,
-                        message.message_id,
+                        chat_id,
+                        message_id,
                         parse_mode="Markdown"
                     )
                     await asyncio.sleep(1.0)
@@ -577,29 +708,110 @@ async def animate_imaging(message):
     except asyncio.CancelledError:
         pass
 
+BOT_COMMANDS = [
+    ("start", "Start the bot"),
+    ("help", "Show help message"),
+    ("chat", "Enter chat mode"),
+    ("image", "Generate an image"),
+    ("say", "Text-to-speech"),
+    ("ping", "Check bot status"),
+]
+
+def commands_hash() -> str:
+    """Fingerprint of the command menu for this bot"""
+    bot_id = config.BOT_TOKEN.split(":", 1)[0]
+    return hashlib.sha256(json.dumps([bot_id, BOT_COMMANDS]).encode()).hexdigest()
+
 async def setup_commands():
-    """Setup bot commands menu"""
-    commands = [
-        types.BotCommand("start", "Start the bot"),
-        types.BotCommand("help", "Show help message"),
-        types.BotCommand("chat", "Enter chat mode"),
-        types.BotCommand("image", "Generate an image"),
-        types.BotCommand("say", "Text-to-speech"),
-        types.BotCommand("ping", "Check bot status"),
-    ]
-    await bot.set_my_commands(commands)
+    """Setup bot commands menu, skipping the call when it is unchanged"""
+    digest = commands_hash()
+    try:
+        with open(config.COMMANDS_HASH_PATH, encoding="utf-8") as handle:
+            if handle.read().strip() == digest:
+                startup_profile.mark("set_my_commands (cached)")
+                return
+    except OSError:
+        pass
+    
+    try:
+        await bot.set_my_commands([types.BotCommand(name, description) for name, description in BOT_COMMANDS])
+    except Exception as e:
+        logger.error("Failed to set bot commands: %s", e)
+        return
+    try:
+        with open(config.COMMANDS_HASH_PATH, "w", encoding="utf-8") as handle:
+            handle.write(digest)
+    except OSError as e:
+        logger.warning("Could not store the command hash: %s", e)
+    startup_profile.mark("set_my_commands")
+
+def profile_first_poll(commands_task):
+    """Time get_me and the first getUpdates, then stop polling"""
+    get_me, get_updates = bot.get_me, bot.get_updates
+
+    async def timed_get_me(*args, **kwargs):
+        result = await get_me(*args, **kwargs)
+        startup_profile.mark("get_me")
+        return result
+
+    async def first_get_updates(*args, **kwargs):
+        await get_updates(*args, **kwargs)
+        startup_profile.mark("first getUpdates")
+        # Polling closes the HTTP session on exit; let registration finish first
+        await commands_task
+        # AsyncTeleBot has no stop_polling(); its loop runs while _polling is set
+        bot._polling = False
+        return []
+
+    bot.get_me = timed_get_me
+    bot.get_updates = first_get_updates
 
 async def main():
     """Main function to run the bot"""
-    # Setup commands
-    await setup_commands()
+    startup_profile.mark("event loop")
+    profiling = startup_profile.enabled()
+    # Shared state is owned by this loop; executor threads hand writes to it
+    shared.bind_loop()
+    if config.DIAG_ENABLED:
+        diagnostics.start()
+    
+    logger.info("🚀 %s Bot is starting...", config.BOT_NAME)
+    logger.info("👑 Admin ID: %s", config.ADMIN_ID)
+    logger.info("🔗 API Base URL: %s", config.API_BASE_URL)
     
-    logger.info(f"🚀 {config.BOT_NAME} Bot is starting...")
-    logger.info(f"👑 Admin ID: {config.ADMIN_ID}")
-    logger.info(f"🔗 API Base URL: {config.API_BASE_URL}")
+    # Command registration runs alongside polling so it doesn't delay the first update
+    commands_task = asyncio.create_task(setup_commands())
+    # Resumes image and TTS jobs a crashed or restarted process left behind
+    await job_queue.start()
+    # Loads the user registry and resumes a broadcast a previous process left unfinished
+    await broadcaster.start()
+    # Loads cached inline results and fills in the example gallery
+    inline_mode.start()
+    if resumed_from_restart:
+        # Held so the task is not garbage collected while it waits
+        handoff_task = asyncio.create_task(restart_controller.adopt_handoff())
+    if profiling:
+        profile_first_poll(commands_task)
     
     # Run the bot
-    await bot.polling(non_stop=True)
+    try:
+        await bot.polling(non_stop=True, timeout=0 if profiling else 20)
+        if profiling:
+            startup_profile.print_report()
+        if restart_controller.stopping:
+            await restart_controller.drain()
+    finally:
+        await update_state.close()
+        if traffic_recorder is not None:
+            await traffic_recorder.close()
+        await job_queue.close()
+        await inline_mode.close()
+        await broadcaster.close()
+        await media_relay.close()
+        await tts_audio.close()
+        workers.shutdown_pool()
+        diagnostics.stop()
+        log_pipeline.stop()
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
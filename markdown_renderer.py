@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+RYSTRIX AI Markdown Renderer
+Converts model output to valid Telegram Markdown/MarkdownV2 and splits long replies
+"""
+
+import re
+from typing import List, NamedTuple, Optional
+
+MARKDOWN = "Markdown"
+MARKDOWN_V2 = "MarkdownV2"
+MESSAGE_LIMIT = 4096
+
+# Characters that must be backslash-escaped in plain MarkdownV2 text
+_V2_SPECIALS = "_*[]()~`>#+-=|{}.!\\"
+_V2_ESCAPE = str.maketrans({char: f"\\{char}" for char in _V2_SPECIALS})
+_V2_CODE_ESCAPE = str.maketrans({"`": "\\`", "\\": "\\\\"})
+_V2_URL_ESCAPE = str.maketrans({")": "\\)", "\\": "\\\\"})
+# Legacy Markdown cannot escape inside a URL; percent-encoding means the same
+_URL_PERCENT = str.maketrans({"(": "%28", ")": "%29"})
+
+# Entity markers, inline code, links (URLs may hold one level of balanced
+# parentheses, as Wikipedia links do) and lone special characters
+_TOKEN = re.compile(r"\*\*|__|`[^`\n]+`|\[[^\]\n]+\]\((?:[^()\s]|\([^()\s]*\))+\)|[*_`\[]")
+_LIST_ITEM = re.compile(r"^(\s*)[-*+] ")
+_HEADING = re.compile(r"^#{1,6} +")
+# Emphasis inside a heading, which is bold as a whole; snake_case stays
+_HEADING_EMPHASIS = re.compile(r"\*+|(?<!\w)_+|_+(?!\w)")
+_FENCE = "```"
+
+
+class RenderedChunk(NamedTuple):
+    """One message worth of rendered text plus its plain-text fallback"""
+    text: str
+    parse_mode: Optional[str]
+    plain: str
+
+
+def _escape(text: str, v2: bool) -> str:
+    """Escape a run of plain text"""
+    return text.translate(_V2_ESCAPE) if v2 else text
+
+
+def _render_line(line: str, v2: bool) -> str:
+    """Render one line of inline markup with balanced, non-nested entities"""
+    heading = _HEADING.match(line)
+    if heading:
+        title = _HEADING_EMPHASIS.sub("", line[heading.end():]).strip()
+        line = f"**{title}**" if title else title
+    else:
+        item = _LIST_ITEM.match(line)
+        if item:
+            line = f"{item.group(1)}• {line[item.end():]}"
+
+    # An opener left unclosed at the end of the line is re-read as literal
+    # text; this only repeats for the rare line with several stray markers.
+    literal_at = set()
+    while True:
+        rendered, unclosed = _render_inline(line, v2, literal_at)
+        if unclosed is None:
+            return rendered
+        literal_at.add(unclosed)
+
+
+def _render_inline(line: str, v2: bool, literal_at: set) -> tuple:
+    """Render inline markup, returning the text and any unclosed opener offset"""
+    out = []
+    open_marker = None
+    open_start = None
+    pos = 0
+
+    def literal(char):
+        # Legacy Markdown cannot escape inside an entity: close, escape, reopen
+        if open_marker and not v2:
+            return f"{open_marker}\\{char}{open_marker}"
+        return f"\\{char}"
+
+    for match in _TOKEN.finditer(line):
+        start, pos_end = match.span()
+        out.append(_escape(line[pos:start], v2))
+        token = match.group()
+        pos = pos_end
+
+        if token in ("**", "__", "*", "_"):
+            if start in literal_at or (token == "_" and 0 < start and pos_end < len(line)
+                                       and line[start - 1].isalnum() and line[pos_end].isalnum()):
+                # Stray marker or snake_case, not an entity
+                out.extend(literal(char) for char in token)
+                continue
+            marker = "*" if len(token) == 2 else "_"
+            if open_marker is None:
+                open_marker, open_start = marker, start
+                out.append(marker)
+            elif open_marker == marker:
+                out.append(marker)
+                open_marker = None
+            else:
+                out.extend(literal(char) for char in token)
+            continue
+
+        if len(token) > 1:
+            if token[0] == "`":
+                body = token[1:-1]
+                rendered = f"`{body.translate(_V2_CODE_ESCAPE) if v2 else body}`"
+            else:
+                label, url = token[1:-1].split("](", 1)
+                if v2:
+                    rendered = f"[{_escape(label, True)}]({url.translate(_V2_URL_ESCAPE)})"
+                else:
+                    rendered = f"[{label.replace('[', '').replace(']', '')}]({url.translate(_URL_PERCENT)})"
+            if open_marker and not v2:
+                # No nesting in legacy Markdown: step out of the open entity
+                rendered = f"{open_marker}{rendered}{open_marker}"
+            out.append(rendered)
+            continue
+
+        out.append(literal(token))
+
+    out.append(_escape(line[pos:], v2))
+    return "".join(out), (open_start if open_marker else None)
+
+
+def _render_code(lines: List[str], language: str, v2: bool) -> str:
+    """Render a fenced code block"""
+    body = "\n".join(lines)
+    if v2:
+        body = body.translate(_V2_CODE_ESCAPE)
+    else:
+        body = body.replace(_FENCE, "'''")
+    return f"{_FENCE}{language}\n{body}\n{_FENCE}"
+
+
+def _blocks(text: str):
+    """Yield (kind, lines, language) for paragraphs and fenced code blocks"""
+    paragraph = []
+    code = None
+    language = ""
+    for line in text.split("\n"):
+        if code is not None:
+            if line.strip().startswith(_FENCE):
+                yield "code", code, language
+                code = None
+            else:
+                code.append(line)
+        elif line.strip().startswith(_FENCE):
+            if paragraph:
+                yield "text", paragraph, ""
+                paragraph = []
+            code = []
+            language = line.strip()[3:].strip()
+        elif not line.strip():
+            if paragraph:
+                yield "text", paragraph, ""
+                paragraph = []
+        else:
+            paragraph.append(line)
+    if code is not None:
+        yield "code", code, language
+    if paragraph:
+        yield "text", paragraph, ""
+
+
+def _split_line(line: str, size: int) -> List[str]:
+    """Split an overlong line at whitespace, hard-cutting words longer than size"""
+    pieces = []
+    current = ""
+    for word in line.split(" "):
+        while len(word) > size:
+            if current:
+                pieces.append(current)
+                current = ""
+            pieces.append(word[:size])
+            word = word[size:]
+        if current and len(current) + 1 + len(word) > size:
+            pieces.append(current)
+            current = word
+        else:
+            current = f"{current} {word}" if current else word
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def _render_block(kind: str, lines: List[str], language: str, v2: bool, limit: int):
+    """Render one block as (rendered, plain) pieces that each fit in limit"""
+    if kind == "code":
+        # Fence overhead plus worst-case escaping of every character
+        budget = max(1, (limit - len(language) - 8) // (2 if v2 else 1))
+        group = []
+        size = 0
+        for line in lines:
+            for piece in (_split_line(line, budget) if len(line) > budget else [line]):
+                if group and size + len(piece) + 1 > budget:
+                    yield _render_code(group, language, v2), "\n".join(group)
+                    group, size = [], 0
+                group.append(piece)
+                size += len(piece) + 1
+        yield _render_code(group, language, v2), "\n".join(group)
+        return
+
+    rendered_lines = []
+    plain_lines = []
+    size = 0
+    for line in lines:
+        rendered = _render_line(line, v2)
+        parts = [(rendered, line)]
+        if len(rendered) > limit:
+            # Escapes at most triple a character inside legacy entities
+            parts = [(_render_line(piece, v2), piece) for piece in _split_line(line, limit // 3)]
+        for rendered, plain in parts:
+            if rendered_lines and size + len(rendered) + 1 > limit:
+                yield "\n".join(rendered_lines), "\n".join(plain_lines)
+                rendered_lines, plain_lines, size = [], [], 0
+            rendered_lines.append(rendered)
+            plain_lines.append(plain)
+            size += len(rendered) + 1
+    if rendered_lines:
+        yield "\n".join(rendered_lines), "\n".join(plain_lines)
+
+
+def render(text: str, parse_mode: str = MARKDOWN, limit: int = MESSAGE_LIMIT) -> List[RenderedChunk]:
+    """Render model output into Telegram-safe chunks no longer than limit"""
+    v2 = parse_mode == MARKDOWN_V2
+    chunks = []
+    rendered_parts = []
+    plain_parts = []
+    size = 0
+
+    for kind, lines, language in _blocks(text):
+        for rendered, plain in _render_block(kind, lines, language, v2, limit):
+            # Paragraph and fence boundaries are the only split points
+            if rendered_parts and size + len(rendered) + 2 > limit:
+                chunks.append(RenderedChunk("\n\n".join(rendered_parts), parse_mode, "\n\n".join(plain_parts)))
+                rendered_parts, plain_parts, size = [], [], 0
+            rendered_parts.append(rendered)
+            plain_parts.append(plain)
+            size += len(rendered) + 2
+
+    if rendered_parts:
+        chunks.append(RenderedChunk("\n\n".join(rendered_parts), parse_mode, "\n\n".join(plain_parts)))
+    return chunks or [RenderedChunk("", None, "")]
@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+"""
+RYSTRIX AI Media Relay
+Delivers upstream media to Telegram without buffering whole files in memory
+"""
+
+import asyncio
+import json
+import logging
+from collections import OrderedDict
+from contextlib import AsyncExitStack
+from typing import AsyncIterator, Optional
+
+import aiohttp
+import config
+
+logger = logging.getLogger(__name__)
+
+MODE_AUTO = "auto"
+MODE_URL = "url"
+MODE_STREAM = "stream"
+MODE_FILE_ID = "file_id"
+
+
+class MediaRelayError(Exception):
+    """Raised when upstream media cannot be delivered to Telegram"""
+
+
+def _extract_file_id(result: dict, field: str) -> Optional[str]:
+    """Pull the file_id of the uploaded media out of a Bot API Message"""
+    media = result.get(field)
+    if isinstance(media, list):
+        # Photos come back as a list of sizes, largest last
+        media = media[-1] if media else None
+    return media.get("file_id") if media else None
+
+
+class MediaRelay:
+    """Send media by URL pass-through, streamed re-upload or cached file_id"""
+
+    def __init__(self, token: str = None, api_url: str = None, chunk_size: int = None,
+                 buffer_chunks: int = None, cache_size: int = None):
+        self.token = token or config.BOT_TOKEN
+        self.api_url = (api_url or config.TELEGRAM_API_URL).rstrip("/")
+        self.chunk_size = chunk_size or config.MEDIA_RELAY_CHUNK_SIZE
+        self.buffer_chunks = buffer_chunks or config.MEDIA_RELAY_BUFFER_CHUNKS
+        self.cache_size = cache_size or config.MEDIA_FILE_ID_CACHE_SIZE
+        self._file_ids = OrderedDict()
+        # Upstream downloads and Bot API uploads use separate connection pools:
+        # a streamed job holds one connection in each, so a shared pool
+        # deadlocks once every slot is taken by an upstream download.
+        self._session = None
+        self._upstream_session = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        """Lazily create the Bot API session"""
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(total=None, sock_connect=10, sock_read=config.API_TIMEOUT)
+            )
+        return self._session
+
+    def _get_upstream_session(self) -> aiohttp.ClientSession:
+        """Lazily create the upstream media session"""
+        if self._upstream_session is None or self._upstream_session.closed:
+            self._upstream_session = aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(total=config.API_TIMEOUT),
+                read_bufsize=self.chunk_size
+            )
+        return self._upstream_session
+
+    async def close(self):
+        """Close both HTTP sessions"""
+        for session in (self._session, self._upstream_session):
+            if session is not None and not session.closed:
+                await session.close()
+
+    def cached_file_id(self, cache_key: str) -> Optional[str]:
+        """Return a previously uploaded file_id for cache_key"""
+        file_id = self._file_ids.get(cache_key)
+        if file_id is not None:
+            self._file_ids.move_to_end(cache_key)
+        return file_id
+
+    def remember_file_id(self, cache_key: str, file_id: str):
+        """Store a file_id, evicting the least recently used entry"""
+        self._file_ids[cache_key] = file_id
+        self._file_ids.move_to_end(cache_key)
+        while len(self._file_ids) > self.cache_size:
+            self._file_ids.popitem(last=False)
+
+    def forget_file_id(self, cache_key: str):
+        """Drop a cached file_id that Telegram no longer accepts"""
+        self._file_ids.pop(cache_key, None)
+
+    async def _call(self, method: str, data) -> dict:
+        """Call a Bot API method and return its result"""
+        url = f"{self.api_url}/bot{self.token}/{method}"
+        session = self._get_session()
+        try:
+            async with session.post(url, data=data) as response:
+                payload = await response.json(content_type=None)
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            raise MediaRelayError(f"{method} request failed: {e}") from e
+        if not payload.get("ok"):
+            raise MediaRelayError(f"{method} failed: {payload.get('description', response.status)}")
+        return payload["result"]
+
+    async def _relay_body(self, response: aiohttp.ClientResponse) -> AsyncIterator[bytes]:
+        """Yield the upstream body through a bounded buffer of chunks"""
+        queue = asyncio.Queue(maxsize=self.buffer_chunks)
+
+        async def pump():
+            try:
+                async for chunk in response.content.iter_chunked(self.chunk_size):
+                    await queue.put(chunk)
+            except Exception as e:
+                await queue.put(e)
+                return
+            await queue.put(None)
+
+        pump_task = asyncio.create_task(pump())
+        try:
+            while True:
+                item = await queue.get()
+                if item is None:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            pump_task.cancel()
+
+    @staticmethod
+    def _form(fields: dict) -> aiohttp.FormData:
+        """Build multipart form data from the non-empty fields"""
+        form = aiohttp.FormData()
+        for name, value in fields.items():
+            if value is not None:
+                form.add_field(name, str(value))
+        return form
+
+    async def _send_by_reference(self, method: str, field: str, reference: str, fields: dict) -> dict:
+        """Send media that Telegram can resolve itself (URL or file_id)"""
+        form = self._form(fields)
+        form.add_field(field, reference)
+        return await self._call(method, form)
+
+    async def _send_streamed(self, method: str, field: str, filename: str, content_type: str,
+                             upstream_url: str, upstream_json: Optional[dict], fields: dict) -> dict:
+        """Stream the upstream body straight into a multipart upload"""
+        session = self._get_upstream_session()
+        request = session.post if upstream_json is not None else session.get
+        async with request(upstream_url, json=upstream_json) as response:
+            if response.status != 200:
+                raise MediaRelayError(f"Upstream returned {response.status}")
+            form = self._form(fields)
+            form.add_field(
+                field,
+                self._relay_body(response),
+                filename=filename,
+                content_type=response.headers.get("Content-Type", content_type)
+            )
+            return await self._call(method, form)
+
+    async def _send(self, method: str, field: str, filename: str, content_type: str, chat_id: int,
+                    upstream_url: str, upstream_json: Optional[dict], caption: Optional[str],
+                    parse_mode: Optional[str], reply_to_message_id: Optional[int],
+                    cache_key: Optional[str], mode: Optional[str]) -> dict:
+        """Pick a delivery mode for one media message and send it"""
+        mode = mode or config.MEDIA_RELAY_MODE
+        fields = {
+            "chat_id": chat_id,
+            "caption": caption,
+            "parse_mode": parse_mode,
+            "reply_to_message_id": reply_to_message_id,
+        }
+
+        if cache_key and mode in (MODE_AUTO, MODE_FILE_ID):
+            result = await self._send_cached(method, field, cache_key, fields)
+            if result is not None:
+                return result
+            if mode == MODE_FILE_ID:
+                mode = MODE_STREAM
+
+        # URL pass-through only works for plain GET-able URLs
+        if upstream_json is None and mode in (MODE_AUTO, MODE_URL):
+            try:
+                result = await self._send_by_reference(method, field, upstream_url, fields)
+            except MediaRelayError as e:
+                if mode == MODE_URL:
+                    raise
+                logger.warning("URL pass-through failed, streaming instead: %s", e)
+            else:
+                if cache_key:
+                    self._remember_result(cache_key, result, field)
+                return result
+
+        try:
+            result = await self._send_streamed(
+                method, field, filename, content_type, upstream_url, upstream_json, fields
+            )
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise MediaRelayError(f"Upstream request failed: {e}") from e
+        if cache_key:
+            self._remember_result(cache_key, result, field)
+        return result
+
+    async def _send_cached(self, method: str, field: str, cache_key: str, fields: dict) -> Optional[dict]:
+        """Resend by cached file_id; None when there is none or Telegram rejects it"""
+        file_id = self.cached_file_id(cache_key)
+        if not file_id:
+            return None
+        try:
+            return await self._send_by_reference(method, field, file_id, fields)
+        except MediaRelayError as e:
+            logger.warning("Cached file_id rejected, re-uploading: %s", e)
+            self.forget_file_id(cache_key)
+            return None
+
+    async def send_cached(self, method: str, field: str, cache_key: str, chat_id: int,
+                          caption: str = None, parse_mode: str = None,
+                          reply_to_message_id: int = None) -> Optional[dict]:
+        """Send media uploaded earlier under cache_key, or return None to upload it"""
+        return await self._send_cached(method, field, cache_key, {
+            "chat_id": chat_id,
+            "caption": caption,
+            "parse_mode": parse_mode,
+            "reply_to_message_id": reply_to_message_id,
+        })
+
+    def _remember_result(self, cache_key: str, result: dict, field: str):
+        """Cache the file_id Telegram assigned to an upload"""
+        file_id = _extract_file_id(result, field)
+        if file_id:
+            self.remember_file_id(cache_key, file_id)
+
+    async def send_photo(self, chat_id: int, upstream_url: str, upstream_json: dict = None,
+                         caption: str = None, parse_mode: str = None,
+                         reply_to_message_id: int = None, cache_key: str = None,
+                         mode: str = None) -> dict:
+        """Deliver an upstream image as a photo message"""
+        return await self._send(
+            "sendPhoto", "photo", "image.png", "image/png", chat_id, upstream_url, upstream_json,
+            caption, parse_mode, reply_to_message_id, cache_key, mode
+        )
+
+    async def send_photo_file(self, chat_id: int, data: bytes, filename: str, content_type: str,
+                              caption: str = None, parse_mode: str = None,
+                              reply_to_message_id: int = None) -> dict:
+        """Upload locally produced image bytes as a photo message"""
+        form = self._form({
+            "chat_id": chat_id,
+            "caption": caption,
+            "parse_mode": parse_mode,
+            "reply_to_message_id": reply_to_message_id,
+        })
+        form.add_field("photo", data, filename=filename, content_type=content_type)
+        return await self._call("sendPhoto", form)
+
+    async def send_voice_file(self, chat_id: int, data, filename: str, content_type: str,
+                              caption: str = None, parse_mode: str = None,
+                              reply_to_message_id: int = None, cache_key: str = None) -> dict:
+        """Upload audio as a voice message; data is bytes, or an async iterator of chunks sent as they arrive"""
+        form = self._form({
+            "chat_id": chat_id,
+            "caption": caption,
+            "parse_mode": parse_mode,
+            "reply_to_message_id": reply_to_message_id,
+        })
+        form.add_field("voice", data, filename=filename, content_type=content_type)
+        result = await self._call("sendVoice", form)
+        if cache_key:
+            self._remember_result(cache_key, result, "voice")
+        return result
+
+    async def send_voice(self, chat_id: int, upstream_url: str, upstream_json: dict = None,
+                         caption: str = None, parse_mode: str = None,
+                         reply_to_message_id: int = None, cache_key: str = None,
+                         mode: str = None) -> dict:
+        """Deliver upstream audio as a voice message"""
+        return await self._send(
+            "sendVoice", "voice", "voice.mp3", "audio/mpeg", chat_id, upstream_url, upstream_json,
+            caption, parse_mode, reply_to_message_id, cache_key, mode
+        )
+
+    async def send_media_group(self, chat_id: int, upstream_urls: list, caption: str = None,
+                               parse_mode: str = None, reply_to_message_id: int = None,
+                               mode: str = None) -> list:
+        """Deliver several images as one album, caption on the first
+
+        Items are upstream URLs, or dicts with "data", "filename" and
+        "content_type" for images that were produced locally.
+        """
+        mode = mode or config.MEDIA_RELAY_MODE
+        if not all(isinstance(item, str) for item in upstream_urls):
+            mode = MODE_STREAM
+        fields = {"chat_id": chat_id, "reply_to_message_id": reply_to_message_id}
+
+        def media(references):
+            items = [{"type": "photo", "media": reference} for reference in references]
+            if caption:
+                items[0]["caption"] = caption
+                if parse_mode:
+                    items[0]["parse_mode"] = parse_mode
+            return json.dumps(items)
+
+        # Fresh variants have no cached file_id, so only URL and stream apply
+        if mode != MODE_STREAM:
+            try:
+                form = self._form(fields)
+                form.add_field("media", media(upstream_urls))
+                return await self._call("sendMediaGroup", form)
+            except MediaRelayError as e:
+                if mode == MODE_URL:
+                    raise
+                logger.warning("URL pass-through failed for album, streaming instead: %s", e)
+
+        session = self._get_upstream_session()
+        try:
+            async with AsyncExitStack() as stack:
+                form = self._form(fields)
+                form.add_field("media", media([f"attach://photo{i}" for i in range(len(upstream_urls))]))
+                for i, url in enumerate(upstream_urls):
+                    if not isinstance(url, str):
+                        form.add_field(f"photo{i}", url["data"], filename=url["filename"],
+                                       content_type=url["content_type"])
+                        continue
+                    response = await stack.enter_async_context(session.get(url))
+                    if response.status != 200:
+                        raise MediaRelayError(f"Upstream returned {response.status}")
+                    form.add_field(
+                        f"photo{i}",
+                        self._relay_body(response),
+                        filename=f"image{i}.png",
+                        content_type=response.headers.get("Content-Type", "image/png")
+                    )
+                return await self._call("sendMediaGroup", form)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise MediaRelayError(f"Upstream request failed: {e}") from e
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+RYSTRIX AI Prompt Classifier
+Picks the image prompt template from a weighted keyword table in one pass
+"""
+
+import re
+from functools import lru_cache
+from typing import Optional
+
+import config
+
+_pattern = None
+_weights = {}
+
+def build_classifier():
+    """Compile the keyword table into a single word-boundary regex"""
+    global _pattern, _weights
+    weights = {}
+    for template, keywords in config.PROMPT_KEYWORDS.items():
+        if template not in config.PROMPT_ENHANCERS:
+            continue
+        for keyword, weight in keywords.items():
+            weights.setdefault(keyword.lower(), []).append((template, weight))
+
+    # Longest first so "photorealistic" wins over "photo" at the same position
+    alternation = "|".join(re.escape(keyword) for keyword in sorted(weights, key=len, reverse=True))
+    _pattern = re.compile(rf"\b({alternation})(?:s|es)?\b", re.IGNORECASE)
+    _weights = weights
+    _classify_cached.cache_clear()
+
+def score_templates(prompt: str) -> dict:
+    """Sum keyword weights per template for a prompt"""
+    if _pattern is None:
+        build_classifier()
+    scores = {}
+    for match in _pattern.finditer(prompt):
+        for template, weight in _weights[match.group(1).lower()]:
+            scores[template] = scores.get(template, 0) + weight
+    return scores
+
+@lru_cache(maxsize=config.PROMPT_CLASSIFIER_CACHE_SIZE)
+def _classify_cached(prompt: str) -> str:
+    scores = score_templates(prompt)
+    if not scores:
+        return 'default'
+    # Ties go to the template listed first in the keyword table
+    order = list(config.PROMPT_KEYWORDS)
+    return max(scores, key=lambda template: (scores[template], -order.index(template)))
+
+def classify(prompt: str, style: Optional[str] = None) -> str:
+    """Return the template for a prompt, honouring a user-chosen style"""
+    if style:
+        style = style.lower()
+        if style in config.PROMPT_ENHANCERS:
+            return style
+    return _classify_cached(" ".join(prompt.lower().split()))
+
+def available_styles() -> list:
+    """Styles a user can pick explicitly"""
+    return list(config.PROMPT_ENHANCERS)
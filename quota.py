@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+RYSTRIX AI Quotas
+Per-user and global token buckets for chat, image and TTS requests
+"""
+
+import mmap
+import time
+from typing import Dict, NamedTuple
+
+import config
+import utils
+
+_GOLDEN = 0x9E3779B97F4A7C15
+_MASK64 = (1 << 64) - 1
+_MIN_CAPACITY = 1024
+# Old-table slots moved per acquire while resizing; a new table of twice
+# the live users fills to 3/4 only after the move is long finished
+_MIGRATE_STEPS = 64
+
+
+def _zeroed(typecode: str, count: int) -> memoryview:
+    """A zero-filled typed array in anonymous memory; pages are zeroed by the
+    kernel on first touch, so allocating a large table costs no upfront pass"""
+    size = count * (8 if typecode == "q" else 4)
+    return memoryview(mmap.mmap(-1, size)).cast(typecode)
+
+
+def _capacity_for(users: int) -> int:
+    """Power-of-two table size at most half full with this many users"""
+    capacity = _MIN_CAPACITY
+    while capacity < (users + 1) * 2:
+        capacity *= 2
+    return capacity
+
+
+class QuotaResult(NamedTuple):
+    allowed: bool
+    retry_after: float
+    scope: str  # "user" or "global"
+
+
+def _rules(quotas: Dict[str, dict]) -> Dict[str, tuple]:
+    """Turn {capability: {burst, per_minute}} into (interval, limit) in deciseconds"""
+    rules = {}
+    for capability, quota in quotas.items():
+        burst = max(1, int(quota["burst"]))
+        interval = max(1, round(600 / quota["per_minute"]))
+        rules[capability] = (burst, interval, burst * interval)
+    return rules
+
+
+class QuotaManager:
+    """Token buckets refilled lazily on access, with no background sweep.
+
+    A bucket is stored as the time it will be full again ("full at"), so one
+    uint32 per capability describes it: tokens = burst - (full_at - now) / interval.
+    Users live in an open-addressing table of parallel arrays keyed by user ID;
+    a zeroed slot is a full bucket. Telegram user IDs are positive, so key 0
+    marks an empty slot and -1 a user already moved out of an old table.
+
+    Resizing is incremental: a new table is allocated and each acquire moves
+    a bounded number of old slots into it, dropping users whose buckets have
+    all refilled, so no single call scans the whole table. Until the move is
+    done, users not yet in the new table are looked up in the old one.
+    """
+
+    def __init__(self, user_quotas: Dict[str, dict] = None, global_quotas: Dict[str, dict] = None):
+        self.user_rules = _rules(config.USER_QUOTAS if user_quotas is None else user_quotas)
+        self.global_rules = _rules(config.GLOBAL_QUOTAS if global_quotas is None else global_quotas)
+        self.capabilities = tuple(self.user_rules)
+        self._column = {capability: i for i, capability in enumerate(self.capabilities)}
+        self._global_full_at = {capability: 0 for capability in self.global_rules}
+        self._epoch = time.monotonic()
+        self.denied = {"user": 0, "global": 0}
+        self._old = None  # (keys, full_at, shift) of the table being moved
+        self._old_cursor = 0
+        self._old_pending = 0
+        self._allocate(_MIN_CAPACITY)
+
+    def _allocate(self, capacity: int):
+        self.capacity = capacity
+        self.used = 0
+        self._shift = 64 - (capacity.bit_length() - 1)
+        self.keys = _zeroed("q", capacity)
+        self.full_at = [_zeroed("I", capacity) for _ in self.capabilities]
+
+    def _now(self) -> int:
+        """Deciseconds since the manager started; fits uint32 for 13 years"""
+        return int((time.monotonic() - self._epoch) * 10)
+
+    @staticmethod
+    def _probe(keys: memoryview, shift: int, user_id: int) -> int:
+        """Slot holding user_id in keys, or the empty slot where it would go"""
+        mask = len(keys) - 1
+        slot = ((user_id * _GOLDEN) & _MASK64) >> shift
+        while True:
+            key = keys[slot]
+            if key == user_id or key == 0:
+                return slot
+            slot = (slot + 1) & mask
+
+    def _find(self, user_id: int) -> int:
+        """Slot holding user_id, or the empty slot where it would go"""
+        return self._probe(self.keys, self._shift, user_id)
+
+    def _resize(self, capacity: int):
+        """Start moving every user into a new table of the given capacity"""
+        if self._old is not None:
+            self._migrate(None)
+        self._old = (self.keys, self.full_at, self._shift)
+        self._old_cursor = 0
+        self._old_pending = self.used
+        self._allocate(capacity)
+
+    def _place(self, user_id: int, values) -> int:
+        slot = self._find(user_id)
+        self.keys[slot] = user_id
+        for column, value in zip(self.full_at, values):
+            column[slot] = value
+        self.used += 1
+        return slot
+
+    def _migrate(self, now, steps: int = None):
+        """Move up to steps old slots (all when steps is None), dropping refilled users"""
+        old_keys, old_full_at, _ = self._old
+        end = len(old_keys) if steps is None else min(len(old_keys), self._old_cursor + steps)
+        for old_slot in range(self._old_cursor, end):
+            key = old_keys[old_slot]
+            if key <= 0:
+                continue
+            self._old_pending -= 1
+            values = [column[old_slot] for column in old_full_at]
+            # now is None when finishing a move early; keep everyone then
+            if now is None or max(values) > now:
+                self._place(key, values)
+        self._old_cursor = end
+        if end == len(old_keys):
+            self._old = None
+            if now is not None and self.capacity > _MIN_CAPACITY and self.used * 8 < self.capacity:
+                # Most users refilled and were dropped; move into a smaller table
+                self._resize(_capacity_for(self.used))
+
+    def _take_from_old(self, user_id: int, slot: int) -> int:
+        """Move user_id out of the old table on access; returns its slot in the new one"""
+        old_keys, old_full_at, old_shift = self._old
+        old_slot = self._probe(old_keys, old_shift, user_id)
+        if old_keys[old_slot] != user_id:
+            return slot
+        old_keys[old_slot] = -1
+        self._old_pending -= 1
+        return self._place(user_id, [column[old_slot] for column in old_full_at])
+
+    def _insert(self, user_id: int) -> int:
+        if (self.used + 1) * 4 > self.capacity * 3:
+            self._resize(_capacity_for(self.used + self._old_pending))
+        slot = self._find(user_id)
+        self.keys[slot] = user_id
+        self.used += 1
+        return slot
+
+    def acquire(self, user_id: int, capability: str, cost: int = 1) -> QuotaResult:
+        """Take cost tokens from the user's and the global bucket, or neither"""
+        user_rule = self.user_rules.get(capability)
+        if user_rule is None or utils.is_admin(user_id):
+            return QuotaResult(True, 0.0, "user")
+
+        now = self._now()
+        if self._old is not None:
+            self._migrate(now, _MIGRATE_STEPS)
+        burst, interval, limit = user_rule
+        cost = min(cost, burst)
+        slot = self._find(user_id)
+        if self._old is not None and not self.keys[slot]:
+            slot = self._take_from_old(user_id, slot)
+        column = self.full_at[self._column[capability]]
+        user_full_at = max(column[slot] if self.keys[slot] else 0, now) + cost * interval
+        if user_full_at - now > limit:
+            self.denied["user"] += 1
+            return QuotaResult(False, (user_full_at - now - limit) / 10, "user")
+
+        global_rule = self.global_rules.get(capability)
+        if global_rule is not None:
+            global_burst, global_interval, global_limit = global_rule
+            global_full_at = (max(self._global_full_at[capability], now)
+                              + min(cost, global_burst) * global_interval)
+            if global_full_at - now > global_limit:
+                self.denied["global"] += 1
+                return QuotaResult(False, (global_full_at - now - global_limit) / 10, "global")
+            self._global_full_at[capability] = global_full_at
+
+        if not self.keys[slot]:
+            slot = self._insert(user_id)
+            column = self.full_at[self._column[capability]]
+        column[slot] = user_full_at
+        return QuotaResult(True, 0.0, "user")
+
+    def remaining(self, user_id: int, capability: str) -> float:
+        """Tokens currently available to a user"""
+        burst, interval, _ = self.user_rules[capability]
+        column = self._column[capability]
+        slot = self._find(user_id)
+        if self.keys[slot]:
+            full_at = self.full_at[column][slot]
+        elif self._old is not None:
+            old_keys, old_full_at, old_shift = self._old
+            old_slot = self._probe(old_keys, old_shift, user_id)
+            if old_keys[old_slot] != user_id:
+                return float(burst)
+            full_at = old_full_at[column][old_slot]
+        else:
+            return float(burst)
+        debt = max(full_at - self._now(), 0)
+        return burst - debt / interval
+
+    def table_bytes(self) -> int:
+        """Memory held by the bucket arrays"""
+        tables = [(self.keys, self.full_at)] + ([self._old[:2]] if self._old is not None else [])
+        return sum(keys.itemsize * len(keys) + sum(c.itemsize * len(c) for c in full_at) for keys, full_at in tables)
+
+    def snapshot(self) -> dict:
+        """Table size and denial counts for status reports"""
+        return {
+            "tracked_users": self.used + self._old_pending,
+            "capacity": self.capacity,
+            "table_bytes": self.table_bytes(),
+            "denied": dict(self.denied),
+        }
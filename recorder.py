@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+RYSTRIX AI Traffic Recorder
+Opt-in, anonymized JSONL recording of incoming updates for load replay
+"""
+
+import asyncio
+import hashlib
+import hmac
+import json
+import logging
+import os
+import re
+import secrets
+import time
+from typing import Optional
+
+import config
+import shared
+
+logger = logging.getLogger(__name__)
+
+_WORD = re.compile(r"\S+")
+_OPTION_FLAGS = {"-n", "-s"}
+# Salts that were published as defaults; hashes made with them are reversible
+_PUBLIC_SALTS = {"change-me"}
+
+
+def hash_id(value: Optional[int], salt: bytes) -> Optional[int]:
+    """Stable, non-reversible positive 52-bit stand-in for a user or chat ID"""
+    if value is None:
+        return None
+    digest = hmac.new(salt, str(value).encode(), hashlib.sha256).digest()
+    return int.from_bytes(digest[:8], "big") >> 12 or 1
+
+
+def anonymize_text(text: str) -> str:
+    """Keep the command, /image options and word lengths; drop the words themselves"""
+    words = _WORD.findall(text)
+    kept = []
+    keep_next = False
+    for i, word in enumerate(words):
+        if (i == 0 and word.startswith("/")) or keep_next:
+            kept.append(word)
+            keep_next = False
+        elif word in _OPTION_FLAGS and kept and kept[0].startswith("/"):
+            kept.append(word)
+            keep_next = True
+        else:
+            kept.append("x" * len(word))
+    return " ".join(kept)
+
+
+def load_salt(salt: str = None, path: str = None) -> bytes:
+    """The configured salt, or a random one generated once and kept in path.
+
+    Telegram IDs are few enough to enumerate, so the HMAC only hides them
+    while the salt is secret; a known default salt is refused.
+    """
+    salt = config.RECORDER_SALT if salt is None else salt
+    if salt:
+        if salt in _PUBLIC_SALTS:
+            raise ValueError("RECORDER_SALT is a published default; set a secret one or leave it empty")
+        return salt.encode()
+    path = path or config.RECORDER_SALT_PATH
+    try:
+        with open(path, encoding="utf-8") as handle:
+            stored = handle.read().strip()
+        if stored:
+            return stored.encode()
+    except FileNotFoundError:
+        pass
+    stored = secrets.token_hex(32)
+    descriptor = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(descriptor, "w", encoding="utf-8") as handle:
+        handle.write(stored + "\n")
+    logger.info("Generated a traffic recorder salt in %s", path)
+    return stored.encode()
+
+
+class TrafficRecorder:
+    """Buffers records in memory and appends them to a JSONL file off the event loop"""
+
+    def __init__(self, path: str = None, salt: str = None, flush_interval: float = None,
+                 max_buffer: int = None):
+        self.path = path or config.RECORDER_PATH
+        self.salt = load_salt(salt)
+        self.flush_interval = flush_interval or config.RECORDER_FLUSH_INTERVAL
+        self.max_buffer = max_buffer or config.RECORDER_MAX_BUFFER
+        self._buffer = []
+        self._flush_task = None
+        self._writing = None
+        self._lock = asyncio.Lock()
+        self.recorded = 0
+        self.dropped = 0
+
+    def record(self, ctx):
+        """Queue one update; never blocks the caller"""
+        if len(self._buffer) >= self.max_buffer:
+            self.dropped += 1
+            return
+        update = ctx.update
+        entry = {
+            "t": round(time.time(), 3),
+            "type": ctx.kind,
+            "user": hash_id(ctx.user_id, self.salt),
+            "chat": hash_id(ctx.chat_id, self.salt),
+            "chat_mode": shared.is_in_chat_mode(ctx.user_id),
+        }
+        if ctx.kind == "callback":
+            entry["data"] = update.data
+        elif ctx.kind == "inline":
+            entry["query"] = anonymize_text(update.query or "")
+        else:
+            entry["text"] = anonymize_text(update.text or "")
+        self._buffer.append(json.dumps(entry, separators=(",", ":")))
+        self.recorded += 1
+        if self._flush_task is None:
+            self._flush_task = asyncio.get_running_loop().create_task(self._flush_periodically())
+
+    def _append(self, lines: list):
+        with open(self.path, "a", encoding="utf-8") as handle:
+            handle.write("\n".join(lines) + "\n")
+
+    async def flush(self):
+        """Write everything buffered so far"""
+        async with self._lock:
+            # A write whose flush was cancelled keeps running in its thread;
+            # let it finish so batches never interleave in the file
+            if self._writing is not None and not self._writing.done():
+                await asyncio.wait([self._writing])
+            if not self._buffer:
+                return
+            lines, self._buffer = self._buffer, []
+            self._writing = asyncio.ensure_future(asyncio.to_thread(self._append, lines))
+            try:
+                await asyncio.shield(self._writing)
+            except OSError as e:
+                logger.error("Traffic recorder write failed, %s records lost: %s", len(lines), e)
+
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def close(self):
+        """Stop the flush task and write what is left"""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        await self.flush()
+
+    async def middleware(self, ctx, call_next):
+        """Router middleware; runs first so throttled updates are recorded too"""
+        self.record(ctx)
+        await call_next(ctx)
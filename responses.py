@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+RYSTRIX AI Static Responses
+Reply markups serialized once at startup and pre-rendered message texts
+"""
+
+import math
+
+from telebot import types
+import config
+
+def _freeze(markup: types.InlineKeyboardMarkup) -> str:
+    """Serialize a markup once; telebot sends str markups as-is"""
+    return markup.to_json()
+
+def _build_main_keyboard():
+    keyboard = types.InlineKeyboardMarkup(row_width=2)
+    keyboard.add(
+        types.InlineKeyboardButton("💬 Chat Mode", callback_data="chat_mode"),
+        types.InlineKeyboardButton("🖼️ Generate Image", callback_data="image_gen")
+    )
+    keyboard.add(
+        types.InlineKeyboardButton("🔊 Text-to-Speech", callback_data="tts"),
+        types.InlineKeyboardButton("❓ Help", callback_data="help")
+    )
+    return keyboard
+
+def _build_chat_mode_keyboard():
+    keyboard = types.InlineKeyboardMarkup()
+    keyboard.add(types.InlineKeyboardButton("🚪 Exit Chat Mode", callback_data="exit_chat"))
+    return keyboard
+
+def _build_back_keyboard():
+    keyboard = types.InlineKeyboardMarkup()
+    keyboard.add(types.InlineKeyboardButton("🔙 Back to Main Menu", callback_data="back_main"))
+    return keyboard
+
+def _build_admin_keyboard():
+    keyboard = types.InlineKeyboardMarkup()
+    keyboard.add(
+        types.InlineKeyboardButton("📊 Statistics", callback_data="admin_stats"),
+        types.InlineKeyboardButton("🔄 Restart", callback_data="admin_restart")
+    )
+    keyboard.add(
+        types.InlineKeyboardButton("🩺 CPU Profile", callback_data="admin_profile_cpu"),
+        types.InlineKeyboardButton("🧠 Memory Top", callback_data="admin_profile_memory")
+    )
+    keyboard.add(types.InlineKeyboardButton("🔙 Back", callback_data="back_main"))
+    return keyboard
+
+# Frozen reply markups
+MAIN_KEYBOARD = _freeze(_build_main_keyboard())
+CHAT_MODE_KEYBOARD = _freeze(_build_chat_mode_keyboard())
+BACK_KEYBOARD = _freeze(_build_back_keyboard())
+ADMIN_KEYBOARD = _freeze(_build_admin_keyboard())
+
+# /start is the only template with a per-user part; it is stored as the
+# text around the first name so rendering is two concatenations.
+_WELCOME_HEAD = f"🤖 **Welcome to {config.BOT_NAME}**, "
+_WELCOME_TAIL = (
+    "!\n\n"
+    "🚀 **Your AI-Powered Assistant**\n\n"
+    "✨ **Features:**\n"
+    "💬 **Smart Chat** - Intelligent conversations with advanced AI\n"
+    "🖼️ **Image Creation** - Generate stunning artwork and visuals\n"
+    "🔊 **Voice Synthesis** - High-quality text-to-speech conversion\n"
+    "⚡ **Chat Mode** - Seamless conversation experience\n\n"
+    "🎯 **Available Commands:**\n"
+    "• `/chat` - Enter interactive chat mode\n"
+    "• `/image <prompt>` - Create custom images\n"
+    "• `/say <text>` - Convert text to speech\n"
+    "• `/ping` - Check system status & performance\n"
+    "• `/help` - Get detailed help information\n\n"
+    f"🏆 **{config.BOT_VERSION}** | Powered by Advanced AI Technology\n"
+    f"👨‍💻 **Developer:** {config.DEVELOPER_HANDLE}\n"
+    f"🌟 **Community:** {config.COMMUNITY_HANDLE}\n\n"
+    "**Ready to assist you 24/7!**"
+)
+
+def welcome_text(first_name: str) -> str:
+    """Render the /start message for a user"""
+    return _WELCOME_HEAD + first_name + _WELCOME_TAIL
+
+HELP_TEXT = (
+    f"🤖 **{config.BOT_NAME} Help**\n\n"
+    "**🔧 Commands:**\n"
+    "/start - Start the bot\n"
+    "/help - Show this help message\n"
+    "/chat - Enter chat mode for conversations\n"
+    "/image <prompt> - Generate an image\n"
+    "/say <text> - Convert text to speech\n"
+    "/ping - Check bot status and uptime\n\n"
+    "**💡 Tips:**\n"
+    "• Use Chat Mode for cleaner conversations\n"
+    "• Be specific with image prompts for better results\n"
+    "• TTS supports multiple languages\n\n"
+    f"**📞 Support:** {config.COMMUNITY_HANDLE}"
+)
+
+HELP_SHORT_TEXT = (
+    f"🤖 **{config.BOT_NAME} Help**\n\n"
+    "**🔧 Commands:**\n"
+    "/start - Start the bot\n"
+    "/help - Show help message\n"
+    "/chat - Enter chat mode\n"
+    "/image <prompt> - Generate image\n"
+    "/say <text> - Text-to-speech\n"
+    "/ping - Bot status\n\n"
+    f"**📞 Support:** {config.COMMUNITY_HANDLE}"
+)
+
+CHAT_MODE_ON_TEXT = (
+    "💬 **Chat Mode Activated!**\n\n"
+    f"Now you can chat directly with {config.BOT_NAME}. Just send your messages!\n"
+    "Use the 'Exit Chat Mode' button below to return to main menu."
+)
+
+CHAT_MODE_OFF_TEXT = (
+    "👋 **Chat Mode Deactivated**\n\n"
+    f"You've exited chat mode. Use the buttons below to interact with {config.BOT_NAME}."
+)
+
+IMAGE_GEN_INFO_TEXT = (
+    "🖼️ **Image Generation**\n\n"
+    "Use the command: `/image your prompt here`\n\n"
+    "**Tips for better results:**\n"
+    "• Be specific and descriptive\n"
+    "• Mention style (realistic, anime, cartoon)\n"
+    "• Include lighting and mood details"
+)
+
+TTS_INFO_TEXT = (
+    "🔊 **Text-to-Speech**\n\n"
+    "Use the command: `/say your text here`\n\n"
+    "**Features:**\n"
+    "• High-quality voice synthesis\n"
+    "• Multiple language support\n"
+    "• Fast processing"
+)
+
+MAIN_MENU_TEXT = (
+    f"🤖 **{config.BOT_NAME}**\n\n"
+    "Your intelligent assistant for chat, image generation, and text-to-speech!\n\n"
+    "Choose an option below to get started:"
+)
+
+NOT_IN_CHAT_MODE_TEXT = (
+    f"🤖 **{config.BOT_NAME}**\n\n"
+    "Please use the buttons below or commands to interact with me!\n\n"
+    "💡 **Tip:** Use `/chat` to enter chat mode for direct conversations."
+)
+
+THINKING_TEXT = f"🤔 **{config.BOT_NAME} is thinking...**"
+
+IMAGE_USAGE_TEXT = (
+    "🖼️ **Image Generation**\n\n"
+    "Please provide a prompt:\n"
+    "`/image your prompt here`\n\n"
+    "**Examples:**\n"
+    "• `/image a beautiful sunset over mountains`\n"
+    "• `/image anime girl with blue hair`\n"
+    "• `/image realistic portrait of a cat`\n"
+    f"• `/image -n 4 a cozy cabin in the snow` - up to {config.IMAGE_MAX_VARIANTS} variants\n"
+    f"• `/image -s anime a red fox` - styles: {', '.join(config.PROMPT_ENHANCERS)}"
+)
+
+SAY_USAGE_TEXT = (
+    "🔊 **Text-to-Speech**\n\n"
+    "Please provide text to convert:\n"
+    "`/say your text here`\n\n"
+    "**Examples:**\n"
+    f"• `/say Hello, this is {config.BOT_NAME}!`\n"
+    "• `/say Welcome to our community`"
+)
+
+ADMIN_ONLY_TEXT = "⛔ **Admins only**\n\nThis command is restricted to the bot administrator."
+
+ADMIN_PANEL_TEXT = (
+    f"👑 **{config.BOT_NAME} Admin Panel**\n\n"
+    "Choose an action below:"
+)
+
+BROADCAST_STARTING_TEXT = "📣 **Starting broadcast...**"
+
+BROADCAST_BUSY_TEXT = (
+    "⏳ **A broadcast is already running**\n\n"
+    "Wait for it to finish or stop it with `/broadcast stop`."
+)
+
+NO_BROADCAST_TEXT = "📣 **No broadcast is running**"
+
+def broadcast_stopped_text(broadcast_id: int) -> str:
+    """Confirm /broadcast stop"""
+    return f"🛑 **Broadcast #{broadcast_id} stopped**\n\nNo further messages will be sent."
+
+def broadcast_usage_text(users: int) -> str:
+    """Render /broadcast help with the size of the audience"""
+    return (
+        "📣 **Broadcast**\n\n"
+        f"Sends a message to all {users} registered users.\n\n"
+        "• `/broadcast your announcement` - send text\n"
+        "• Reply `/broadcast` to any message - send it, media included\n"
+        "• `/broadcast stop` - cancel the running broadcast"
+    )
+
+PROFILE_BUSY_TEXT = "⏳ **A profile is already running**\n\nWait for its file before starting another."
+
+RESTARTING_TEXT = (
+    "🔄 **Restarting...**\n\n"
+    "A fresh process is taking over. Requests in progress will finish first."
+)
+
+THROTTLED_TEXT = (
+    "⏳ **Slow down a little**\n\n"
+    "Some of your messages arrived too fast and were skipped. Please send them again in a few seconds."
+)
+
+_QUOTA_NAMES = {"chat": "chat", "image": "image generation", "tts": "text-to-speech"}
+
+def quota_text(capability: str, retry_after: float, scope: str) -> str:
+    """Render the reply for a request over quota"""
+    seconds = max(1, math.ceil(retry_after))
+    name = _QUOTA_NAMES.get(capability, capability)
+    if scope == "global":
+        return f"🚦 **{config.BOT_NAME} is busy**\n\nToo many {name} requests right now. Try again in {seconds}s."
+    return f"⏳ **Slow down a little**\n\nYou've reached your {name} limit. Try again in {seconds}s."
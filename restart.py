@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+RYSTRIX AI Graceful Restart
+Hands polling to a fresh process and drains or hands off in-flight updates
+"""
+
+import asyncio
+import json
+import logging
+import os
+import subprocess
+import sys
+import time
+from typing import Optional
+
+from telebot import types
+
+import config
+import shared
+
+logger = logging.getLogger(__name__)
+
+
+def _write_json(path: str, data: dict):
+    """Atomically replace path with data"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as handle:
+        json.dump(data, handle, separators=(",", ":"))
+        handle.flush()
+        os.fsync(handle.fileno())
+    os.replace(tmp_path, path)
+
+
+def _update_to_dict(update) -> dict:
+    """Rebuild the raw update telebot parsed, from the payloads it keeps"""
+    data = {"update_id": update.update_id}
+    if update.message is not None:
+        data["message"] = update.message.json
+    elif update.callback_query is not None:
+        data["callback_query"] = update.callback_query.json
+    elif update.inline_query is not None:
+        data["inline_query"] = update.inline_query.json
+    return data
+
+
+class RestartController:
+    """Zero-downtime restart.
+
+    The old process stops polling and leasing jobs, snapshots chat-mode
+    users, conversations and the IDs of in-flight updates, and spawns its
+    replacement. The new process starts polling at once. Meanwhile the old
+    process drains its in-flight updates and running jobs until the
+    deadline. It then returns unfinished jobs to the queue and writes a
+    handoff file with the unfinished updates plus the conversations that
+    changed, which the new process adopts.
+    """
+
+    def __init__(self, bot, update_state, job_queue=None, snapshot_path: str = None, handoff_path: str = None,
+                 drain_seconds: float = None):
+        self.bot = bot
+        self.update_state = update_state
+        self.job_queue = job_queue
+        self.snapshot_path = snapshot_path or config.RESTART_SNAPSHOT_PATH
+        self.handoff_path = handoff_path or config.RESTART_HANDOFF_PATH
+        self.drain_seconds = drain_seconds if drain_seconds is not None else config.RESTART_DRAIN_SECONDS
+        self.stopping = False
+        self.resumed_at = None
+        self._poll = None
+        self._snapshot_conversations = {}
+        self._handoff_deadline = None
+
+    def install(self):
+        """Make the long poll cancellable so polling stops immediately"""
+        get_updates = self.bot.get_updates
+
+        async def cancellable_get_updates(*args, **kwargs):
+            if self.stopping:
+                return []
+            self._poll = asyncio.ensure_future(get_updates(*args, **kwargs))
+            try:
+                return await self._poll
+            except asyncio.CancelledError:
+                # Only swallow the cancellation restart() issued, not our own
+                if self.stopping and not asyncio.current_task().cancelling():
+                    return []
+                raise
+            finally:
+                self._poll = None
+
+        self.bot.get_updates = cancellable_get_updates
+
+    # Old process
+
+    async def restart(self):
+        """Stop polling, snapshot state and start the replacement process"""
+        if self.stopping:
+            return
+        self.stopping = True
+        self.bot._polling = False
+        if self._poll is not None:
+            self._poll.cancel()
+
+        async def keep_session():
+            # Polling closes telebot's HTTP session on exit; in-flight
+            # handlers still need it until they drain
+            pass
+        self.bot.close_session = keep_session
+        if self.job_queue is not None:
+            self.job_queue.stop()
+
+        await self.update_state.flush()
+        self.update_state.detach()
+        snapshot = {
+            "created": time.time(),
+            "pid": os.getpid(),
+            "in_flight": list(self.update_state.in_flight()),
+            "handoff_deadline": time.time() + self.drain_seconds + 10,
+            **shared.export_state(),
+        }
+        await asyncio.to_thread(_write_json, self.snapshot_path, snapshot)
+
+        command = config.RESTART_COMMAND or [sys.executable] + sys.argv
+        process = subprocess.Popen(command, start_new_session=True)
+        logger.info("Restart: started pid %s, %s updates in flight", process.pid, len(snapshot['in_flight']))
+
+    def _busy(self) -> bool:
+        return bool(self.update_state.in_flight()) or (self.job_queue is not None and self.job_queue.running() > 0)
+
+    async def drain(self):
+        """Wait for in-flight updates and jobs until the deadline, then hand off the rest"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.drain_seconds
+        while self._busy() and loop.time() < deadline:
+            await asyncio.sleep(0.05)
+        if self.job_queue is not None:
+            await self.job_queue.release()
+
+        unfinished = self.update_state.in_flight()
+        handoff = {
+            "updates": [_update_to_dict(update) for update in unfinished.values() if update is not None],
+            **shared.export_state(),
+        }
+        await asyncio.to_thread(_write_json, self.handoff_path, handoff)
+        logger.info("Restart: drained, handed off %s unfinished updates", len(handoff['updates']))
+        await self.bot.__class__.close_session()
+
+    # New process
+
+    def resume(self) -> bool:
+        """Apply a fresh restart snapshot left by the previous process"""
+        try:
+            with open(self.snapshot_path, encoding="utf-8") as handle:
+                snapshot = json.load(handle)
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError) as e:
+            logger.error("Ignoring unreadable restart snapshot: %s", e)
+            return False
+        finally:
+            try:
+                os.remove(self.snapshot_path)
+            except OSError:
+                pass
+
+        if time.time() - snapshot.get("created", 0) > config.RESTART_SNAPSHOT_MAX_AGE:
+            logger.warning("Ignoring stale restart snapshot")
+            return False
+        shared.import_state(snapshot)
+        self._snapshot_conversations = snapshot.get("conversations", {})
+        # The old process is still finishing these; skip them if Telegram redelivers
+        self.update_state.claim(snapshot.get("in_flight", []))
+        self._handoff_deadline = snapshot.get("handoff_deadline")
+        self.resumed_at = time.time()
+        logger.info("Resumed from restart snapshot of pid %s: %s chat-mode users",
+                    snapshot.get('pid'), len(snapshot.get('chat_mode_users', [])))
+        return True
+
+    async def adopt_handoff(self):
+        """Wait for the old process's handoff file and take over its unfinished updates"""
+        if self._handoff_deadline is None:
+            return
+        handoff: Optional[dict] = None
+        while time.time() < self._handoff_deadline:
+            try:
+                with open(self.handoff_path, encoding="utf-8") as handle:
+                    handoff = json.load(handle)
+                os.remove(self.handoff_path)
+                break
+            except (FileNotFoundError, ValueError):
+                await asyncio.sleep(0.1)
+        if handoff is None:
+            logger.warning("Restart handoff did not arrive before the deadline")
+            return
+
+        # Conversations the old process finished while draining, unless this
+        # process has already moved them on
+        for uid, history in handoff.get("conversations", {}).items():
+            if list(shared.get_conversation(int(uid))) == self._snapshot_conversations.get(uid, []):
+                shared.set_conversation(int(uid), history)
+
+        updates = [types.Update.de_json(data) for data in handoff.get("updates", [])]
+        for update in updates:
+            self.update_state.forget(update.update_id)
+        if updates:
+            logger.info("Adopting %s updates from the previous process", len(updates))
+            await self.bot.process_new_updates(updates)
@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+RYSTRIX AI Update Router
+Dict-based command/callback dispatch with an ordered middleware pipeline
+"""
+
+import asyncio
+import contextvars
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import config
+import responses
+import shared
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[Any], Awaitable[None]]
+Middleware = Callable[["UpdateContext", Callable[["UpdateContext"], Awaitable[None]]], Awaitable[None]]
+
+_current = contextvars.ContextVar("current_update", default=None)
+
+def current() -> Optional["UpdateContext"]:
+    """Context of the update being handled by the running task"""
+    return _current.get()
+
+def current_in(context: contextvars.Context) -> Optional["UpdateContext"]:
+    """Context of the update being handled under a task's contextvars; safe from any thread"""
+    return context.get(_current)
+
+
+class UpdateContext:
+    """Per-update state shared by middlewares and the handler"""
+    __slots__ = ("kind", "update", "user_id", "chat_id", "route", "handler", "meta",
+                 "in_chat_mode", "started", "bot", "update_id")
+
+    def __init__(self, kind, update, user_id, chat_id, route, handler, meta, bot):
+        self.kind = kind
+        self.update = update
+        self.user_id = user_id
+        self.chat_id = chat_id
+        self.route = route
+        self.handler = handler
+        self.meta = meta
+        self.bot = bot
+        self.in_chat_mode = False
+        self.started = 0.0
+        self.update_id = None
+
+
+class Router:
+    """Routes messages by command and callback queries by data in O(1)"""
+
+    def __init__(self):
+        self.commands: Dict[str, tuple] = {}
+        self.callbacks: Dict[str, tuple] = {}
+        self.default_message: Optional[tuple] = None
+        self.inline_query: Optional[tuple] = None
+        self.middlewares = []
+        self._pipeline = None
+        self.bot = None
+
+    def command(self, *names, **meta):
+        """Register a handler for one or more /commands"""
+        def decorator(handler: Handler):
+            for name in names:
+                self.commands[name.lower()] = (name.lower(), handler, meta)
+            return handler
+        return decorator
+
+    def callback(self, *data, **meta):
+        """Register a handler for callback data (exact, or the part before ':')"""
+        def decorator(handler: Handler):
+            for value in data:
+                self.callbacks[value] = (value, handler, meta)
+            return handler
+        return decorator
+
+    def default(self, **meta):
+        """Register the handler for messages that match no command"""
+        def decorator(handler: Handler):
+            self.default_message = ("message", handler, meta)
+            return handler
+        return decorator
+
+    def inline(self, **meta):
+        """Register the handler for inline queries"""
+        def decorator(handler: Handler):
+            self.inline_query = ("inline", handler, meta)
+            return handler
+        return decorator
+
+    def use(self, middleware: Middleware):
+        """Append a middleware; the first one added runs outermost"""
+        self.middlewares.append(middleware)
+        self._pipeline = None
+
+    def _build_pipeline(self):
+        async def endpoint(ctx):
+            await ctx.handler(ctx.update)
+
+        pipeline = endpoint
+        for middleware in reversed(self.middlewares):
+            pipeline = (lambda mw, nxt: lambda ctx: mw(ctx, nxt))(middleware, pipeline)
+        return pipeline
+
+    def resolve_message(self, text: Optional[str]) -> Optional[tuple]:
+        """Find the route for a message text"""
+        if text and text[0] == "/":
+            name = text[1:].split(None, 1)[0].split("@", 1)[0].lower() if len(text) > 1 else ""
+            route = self.commands.get(name)
+            if route is not None:
+                return route
+        return self.default_message
+
+    def resolve_callback(self, data: Optional[str]) -> Optional[tuple]:
+        """Find the route for callback data"""
+        if data is None:
+            return None
+        route = self.callbacks.get(data)
+        if route is None and ":" in data:
+            route = self.callbacks.get(data.split(":", 1)[0])
+        return route
+
+    async def _run(self, ctx: UpdateContext):
+        if self._pipeline is None:
+            self._pipeline = self._build_pipeline()
+        token = _current.set(ctx)
+        try:
+            await self._pipeline(ctx)
+        finally:
+            _current.reset(token)
+
+    async def dispatch_message(self, message):
+        """Entry point for message updates"""
+        route = self.resolve_message(message.text)
+        if route is None:
+            return
+        name, handler, meta = route
+        user_id = message.from_user.id if message.from_user else None
+        await self._run(UpdateContext("message", message, user_id, message.chat.id, name, handler, meta, self.bot))
+
+    async def dispatch_callback(self, call):
+        """Entry point for callback query updates"""
+        route = self.resolve_callback(call.data)
+        if route is None:
+            await self.bot.answer_callback_query(call.id)
+            return
+        name, handler, meta = route
+        chat_id = call.message.chat.id if call.message else None
+        await self._run(UpdateContext("callback", call, call.from_user.id, chat_id, f"cb:{name}", handler, meta, self.bot))
+
+    async def dispatch_inline(self, query):
+        """Entry point for inline query updates"""
+        if self.inline_query is None:
+            return
+        name, handler, meta = self.inline_query
+        await self._run(UpdateContext("inline", query, query.from_user.id, None, name, handler, meta, self.bot))
+
+    def install(self, bot):
+        """Register the router as the bot's only message, callback and inline handler"""
+        self.bot = bot
+        bot.register_message_handler(self.dispatch_message, content_types=["text"])
+        bot.register_callback_query_handler(self.dispatch_callback, func=None)
+        bot.register_inline_handler(self.dispatch_inline, func=lambda query: True)
+
+
+class TimingMiddleware:
+    """Records call count, total and worst handler time per route"""
+
+    def __init__(self, slow_threshold: float = 5.0):
+        self.slow_threshold = slow_threshold
+        self.stats: Dict[str, list] = {}
+
+    async def __call__(self, ctx, call_next):
+        ctx.started = time.perf_counter()
+        try:
+            await call_next(ctx)
+        finally:
+            elapsed = time.perf_counter() - ctx.started
+            entry = self.stats.get(ctx.route)
+            if entry is None:
+                entry = self.stats[ctx.route] = [0, 0.0, 0.0]
+            entry[0] += 1
+            entry[1] += elapsed
+            if elapsed > entry[2]:
+                entry[2] = elapsed
+            if elapsed > self.slow_threshold:
+                logger.warning("Slow handler %s: %.2fs", ctx.route, elapsed)
+
+    def snapshot(self) -> dict:
+        """Per-route count, mean and max latency in milliseconds"""
+        return {
+            route: {"count": count, "mean_ms": round(total / count * 1000, 2), "max_ms": round(worst * 1000, 2)}
+            for route, (count, total, worst) in self.stats.items()
+        }
+
+
+class ThrottleMiddleware:
+    """Spaces out updates from one user to at least min_interval apart.
+
+    Messages wait for their turn in arrival order, so a quick follow-up or
+    a pasted burst is handled rather than lost. A message that would wait
+    longer than max_delay is skipped, and the user is told once per burst
+    to resend. Callbacks arriving too fast are answered with a notice.
+    Inline queries, sent on every keystroke, are coalesced: queries waiting
+    for the same slot are dropped in favour of the newest one.
+    """
+
+    def __init__(self, min_interval: float, max_delay: float = None):
+        self.min_interval = min_interval
+        self.max_delay = config.THROTTLE_MAX_DELAY if max_delay is None else max_delay
+        self.next_slot: Dict[int, float] = {}
+        self.notified: Dict[int, float] = {}
+        self.latest_inline: Dict[int, "UpdateContext"] = {}
+
+    async def _wait_turn(self, ctx) -> bool:
+        """Wait for the user's next slot; False when the update is not to be handled"""
+        now = time.monotonic()
+        slot = max(now, self.next_slot.get(ctx.user_id, now))
+        if ctx.kind == "callback":
+            if slot > now:
+                await ctx.bot.answer_callback_query(ctx.update.id, "⏳ Slow down a little")
+                return False
+        elif ctx.kind == "inline":
+            self.latest_inline[ctx.user_id] = ctx
+            if slot > now:
+                await asyncio.sleep(slot - now)
+                if self.latest_inline.get(ctx.user_id) is not ctx:
+                    # A newer query from the same user supersedes this one
+                    return False
+            del self.latest_inline[ctx.user_id]
+            self.next_slot[ctx.user_id] = slot + self.min_interval
+            return True
+        elif slot - now > self.max_delay:
+            if self.notified.get(ctx.user_id, 0.0) <= now:
+                # Quiet until the queued messages have been handled
+                self.notified[ctx.user_id] = slot
+                await ctx.bot.send_message(ctx.chat_id, responses.THROTTLED_TEXT, parse_mode='Markdown',
+                                           reply_to_message_id=ctx.update.message_id)
+            return False
+        self.next_slot[ctx.user_id] = slot + self.min_interval
+        if len(self.next_slot) > 50000:
+            self.next_slot = {uid: due for uid, due in self.next_slot.items() if due > now}
+            self.notified = {uid: due for uid, due in self.notified.items() if due > now}
+        if slot > now:
+            await asyncio.sleep(slot - now)
+        return True
+
+    async def __call__(self, ctx, call_next):
+        if ctx.user_id is not None and self.min_interval > 0 and not await self._wait_turn(ctx):
+            return
+        await call_next(ctx)
+
+
+async def error_middleware(ctx, call_next):
+    """Log handler failures and count them in the bot statistics"""
+    try:
+        await call_next(ctx)
+    except Exception as e:
+        shared.update_stats("errors")
+        logger.exception("Handler %s failed: %s", ctx.route, e)
+
+
+async def stats_middleware(ctx, call_next):
+    """Track active users and incoming messages"""
+    shared.update_stats("active_users", ctx.user_id)
+    if ctx.kind == "message":
+        shared.update_stats("total_messages")
+    await call_next(ctx)
+
+
+async def chat_mode_middleware(ctx, call_next):
+    """Look up chat mode once per update"""
+    ctx.in_chat_mode = shared.is_in_chat_mode(ctx.user_id)
+    await call_next(ctx)
+
+
+async def answer_callback_middleware(ctx, call_next):
+    """Acknowledge callback queries before the handler runs"""
+    if ctx.kind == "callback":
+        await ctx.bot.answer_callback_query(ctx.update.id)
+    await call_next(ctx)
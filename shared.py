@@ -2,94 +2,149 @@
 """
 RYSTRIX AI Shared Data
 Shared variables and state management for the Telegram bot
+
+State is owned by the event loop and mutated only on its thread, so the
+loop reads and writes it without locks. Conversation histories are tuples
+replaced on every write; readers get the current tuple, an immutable
+snapshot, without copying. Code running in executor threads goes through
+call_in_loop(), which hands the write to the loop. Statistics are per-thread
+counter shards that only their own thread writes; get_stats() adds them up.
 """
 
+import asyncio
 import threading
-from typing import Dict, Set, Any
+from typing import Dict, Set, Tuple
 
-# Thread-safe storage for user data
-_lock = threading.Lock()
+import config
 
-# User conversation histories
-user_conversations: Dict[int, list] = {}
+# User conversation histories: user_id -> tuple of {"role", "content"} dicts
+user_conversations: Dict[int, Tuple[dict, ...]] = {}
 
 # Users currently in chat mode
 chat_mode_users: Set[int] = set()
 
-# Bot statistics
-bot_stats = {
-    "total_messages": 0,
-    "total_images": 0,
-    "total_tts": 0,
-    "active_users": set(),
-    "errors": 0
-}
+_loop = None
+_loop_thread = None
+
+_COUNTERS = ("total_messages", "total_images", "total_tts", "errors")
+
+
+class _StatsShard:
+    """Counters written by a single thread"""
+
+    __slots__ = ("counters", "active_users")
+
+    def __init__(self):
+        # Every key exists up front, so readers never see the dict resize
+        self.counters = dict.fromkeys(_COUNTERS, 0)
+        self.active_users = set()
+
+
+_shards = []
+_local = threading.local()
+_baseline = dict.fromkeys(_COUNTERS, 0)
+
+
+def bind_loop(loop: asyncio.AbstractEventLoop = None):
+    """Make the given (or running) loop the owner of the shared state"""
+    global _loop, _loop_thread
+    _loop = loop or asyncio.get_running_loop()
+    _loop_thread = threading.get_ident()
+
+def call_in_loop(func, *args):
+    """Run func on the owning loop: now if already there, else hand it over"""
+    if _loop is None or threading.get_ident() == _loop_thread:
+        func(*args)
+    else:
+        _loop.call_soon_threadsafe(func, *args)
+
+def _set_history(user_id: int, history: tuple):
+    user_conversations[user_id] = history
 
 def add_conversation(user_id: int, role: str, content: str):
-    """Thread-safe way to add conversation"""
-    with _lock:
-        if user_id not in user_conversations:
-            user_conversations[user_id] = []
-        
-        user_conversations[user_id].append({
-            "role": role,
-            "content": content
-        })
-        
-        # Keep only last 20 messages (10 exchanges)
-        if len(user_conversations[user_id]) > 20:
-            user_conversations[user_id] = user_conversations[user_id][-20:]
-
-def get_conversation(user_id: int) -> list:
-    """Thread-safe way to get conversation history"""
-    with _lock:
-        return user_conversations.get(user_id, []).copy()
+    """Append a turn to a user's conversation"""
+    def append():
+        history = user_conversations.get(user_id, ()) + ({"role": role, "content": content},)
+        user_conversations[user_id] = history[-config.MAX_CONVERSATION_HISTORY:]
+    call_in_loop(append)
+
+def add_exchange(user_id: int, user_text: str, reply: str):
+    """Append a user message and the assistant's reply in one write"""
+    def append():
+        history = user_conversations.get(user_id, ()) + (
+            {"role": "user", "content": user_text},
+            {"role": "assistant", "content": reply},
+        )
+        user_conversations[user_id] = history[-config.MAX_CONVERSATION_HISTORY:]
+    call_in_loop(append)
+
+def set_conversation(user_id: int, history: list):
+    """Replace a user's conversation"""
+    call_in_loop(_set_history, user_id, tuple(history))
+
+def get_conversation(user_id: int) -> tuple:
+    """Snapshot of a user's conversation; never modified after it is returned"""
+    return user_conversations.get(user_id, ())
 
 def clear_conversation(user_id: int):
-    """Thread-safe way to clear conversation"""
-    with _lock:
-        if user_id in user_conversations:
-            del user_conversations[user_id]
+    """Forget a user's conversation"""
+    call_in_loop(user_conversations.pop, user_id, None)
 
 def add_chat_mode_user(user_id: int):
     """Add user to chat mode"""
-    with _lock:
-        chat_mode_users.add(user_id)
+    call_in_loop(chat_mode_users.add, user_id)
 
 def remove_chat_mode_user(user_id: int):
     """Remove user from chat mode"""
-    with _lock:
-        chat_mode_users.discard(user_id)
+    call_in_loop(chat_mode_users.discard, user_id)
 
 def is_in_chat_mode(user_id: int) -> bool:
     """Check if user is in chat mode"""
-    with _lock:
-        return user_id in chat_mode_users
+    return user_id in chat_mode_users
+
+def _shard() -> _StatsShard:
+    try:
+        return _local.shard
+    except AttributeError:
+        shard = _local.shard = _StatsShard()
+        _shards.append(shard)
+        return shard
 
 def update_stats(stat_type: str, user_id: int = None):
-    """Update bot statistics"""
-    with _lock:
-        if stat_type in bot_stats:
-            if isinstance(bot_stats[stat_type], int):
-                bot_stats[stat_type] += 1
-            elif isinstance(bot_stats[stat_type], set) and user_id:
-                bot_stats[stat_type].add(user_id)
+    """Update bot statistics; safe from any thread"""
+    shard = _shard()
+    if stat_type == "active_users":
+        if user_id:
+            shard.active_users.add(user_id)
+    elif stat_type in shard.counters:
+        shard.counters[stat_type] += 1
 
 def get_stats() -> dict:
-    """Get current bot statistics"""
-    with _lock:
-        stats_copy = bot_stats.copy()
-        # Convert sets to counts for JSON serialization
-        for key, value in stats_copy.items():
-            if isinstance(value, set):
-                stats_copy[key] = len(value)
-        return stats_copy
+    """Current bot statistics, summed over all threads' counters"""
+    shards = list(_shards)
+    stats = {key: sum(shard.counters[key] for shard in shards) - _baseline[key] for key in _COUNTERS}
+    # Count the largest set as is and only union the (small) others against it
+    users = sorted((shard.active_users for shard in shards), key=len)
+    stats["active_users"] = len(users[-1]) + len(set().union(*users[:-1]) - users[-1]) if users else 0
+    return stats
 
 def reset_stats():
     """Reset all statistics"""
-    with _lock:
-        bot_stats["total_messages"] = 0
-        bot_stats["total_images"] = 0
-        bot_stats["total_tts"] = 0
-        bot_stats["active_users"] = set()
-        bot_stats["errors"] = 0
\ No newline at end of file
+    for key in _COUNTERS:
+        _baseline[key] = sum(shard.counters[key] for shard in list(_shards))
+    for shard in list(_shards):
+        shard.active_users.clear()
+
+def export_state() -> dict:
+    """Chat-mode users and conversations for a restart snapshot"""
+    return {
+        "chat_mode_users": sorted(chat_mode_users),
+        # Histories are immutable tuples, serialized as JSON arrays
+        "conversations": {str(uid): history for uid, history in user_conversations.items()},
+    }
+
+def import_state(state: dict):
+    """Restore chat-mode users and conversations from a restart snapshot"""
+    chat_mode_users.update(state.get("chat_mode_users", []))
+    for uid, history in state.get("conversations", {}).items():
+        user_conversations[int(uid)] = tuple(history)
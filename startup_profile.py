@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+"""
+RYSTRIX AI Startup Profile
+Per-phase startup timing, printed when main.py runs with --profile-startup
+"""
+
+import json
+import sys
+import time
+
+# Imported first by main.py, so this is as close to process start as Python code gets
+_started = time.perf_counter()
+_last = _started
+_phases = []
+
+def enabled() -> bool:
+    """Check whether the process was started with --profile-startup"""
+    return "--profile-startup" in sys.argv
+
+def mark(phase: str):
+    """Close the current phase under the given name"""
+    global _last
+    now = time.perf_counter()
+    _phases.append((phase, now - _last))
+    _last = now
+
+def report() -> dict:
+    """Phase durations and the total in milliseconds"""
+    return {
+        "phases_ms": {phase: round(seconds * 1000, 1) for phase, seconds in _phases},
+        "total_ms": round((_last - _started) * 1000, 1),
+    }
+
+def print_report():
+    print(json.dumps({"startup_profile": report()}, indent=2), flush=True)
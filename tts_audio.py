@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+RYSTRIX AI TTS Audio
+Speech as Ogg/Opus voice notes: negotiated from the upstream, or transcoded from MP3 in worker processes
+"""
+
+import asyncio
+import logging
+import shutil
+import subprocess
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Optional
+
+import aiohttp
+import adaptive_limit
+import config
+import workers
+from media_relay import MediaRelay, MediaRelayError
+
+logger = logging.getLogger(__name__)
+
+# ffmpeg is optional; without it, MP3 from an upstream without Opus is sent as is
+FFMPEG = shutil.which(config.TTS_FFMPEG_PATH)
+
+OPUS = {"filename": "voice.ogg", "content_type": "audio/ogg"}
+MP3 = {"filename": "voice.mp3", "content_type": "audio/mpeg"}
+# Enough of a body to recognize an Ogg/Opus stream by its first page
+_HEAD_BYTES = 64
+
+
+class TtsError(MediaRelayError):
+    """Raised when the speech upstream fails"""
+
+
+def is_ogg_opus(data: bytes) -> bool:
+    """Check for an Ogg stream whose first packet is an Opus header"""
+    return data[:4] == b"OggS" and b"OpusHead" in data[:64]
+
+
+async def _read_head(response: aiohttp.ClientResponse) -> bytes:
+    """The first _HEAD_BYTES of a body, fewer only when it is that short"""
+    head = b""
+    while len(head) < _HEAD_BYTES:
+        chunk = await response.content.read(_HEAD_BYTES - len(head))
+        if not chunk:
+            break
+        head += chunk
+    return head
+
+
+def transcode_to_opus(data: bytes, ffmpeg: str, bitrate: str) -> bytes:
+    """Encode audio as mono Ogg/Opus tuned for speech (runs in a worker process)"""
+    result = subprocess.run(
+        [ffmpeg, "-hide_banner", "-loglevel", "error", "-i", "pipe:0", "-vn", "-ac", "1",
+         "-c:a", "libopus", "-b:a", bitrate, "-application", "voip", "-f", "ogg", "pipe:1"],
+        input=data, capture_output=True, timeout=config.API_TIMEOUT
+    )
+    if result.returncode != 0 or not result.stdout:
+        raise RuntimeError(f"ffmpeg exited with {result.returncode}: {result.stderr.decode(errors='replace')[-200:]}")
+    return result.stdout
+
+
+class TtsAudio:
+    """Renders text to a voice note and remembers the result per text.
+
+    Opus is requested first. When the upstream answers with anything other
+    than Ogg/Opus, or rejects the request while MP3 works, that text falls
+    back to MP3 transcoded in the worker pool. Only after several such
+    answers in a row is MP3 asked for directly, and Opus is tried again
+    every TTS_OPUS_RETRY_SECONDS in case the upstream gained it. Native
+    Opus is streamed into the upload as it arrives; only MP3, which must be
+    transcoded whole, is read into memory first. Rendered audio is kept in
+    an LRU bounded by total bytes (a streamed body is copied only while it
+    fits), so a retried job or a file_id Telegram stops accepting does not
+    synthesize the text again.
+    """
+
+    def __init__(self, voice: str = None, cache_bytes: int = None):
+        self.voice = voice or config.TTS_VOICE
+        self.cache_bytes = cache_bytes if cache_bytes is not None else config.TTS_AUDIO_CACHE_BYTES
+        # None until the upstream has answered an Opus request
+        self.native_opus = None if config.TTS_NEGOTIATE_OPUS else False
+        self._declines = 0  # Opus requests answered without Opus in a row
+        self._opus_retry_at = 0.0 if config.TTS_NEGOTIATE_OPUS else float("inf")
+        self._cache = OrderedDict()  # text -> rendered voice
+        self._cached_bytes = 0
+        self._session = None
+        self.stats = {"native": 0, "transcoded": 0, "mp3": 0, "cache_hits": 0,
+                      "upstream_bytes": 0, "voice_bytes": 0}
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=config.API_TIMEOUT))
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+    @asynccontextmanager
+    async def _speech(self, text: str, response_format: str):
+        """One speech request, its body not read yet"""
+        limit = adaptive_limit.limiter("tts")
+        try:
+            async with limit.slot() as slot, self._get_session().post(config.TTS_API_URL, json={
+                "model": config.TTS_MODEL,
+                "input": text,
+                "voice": self.voice,
+                "response_format": response_format,
+            }) as response:
+                if response.status == 429 or response.status >= 500:
+                    slot.overloaded()
+                yield response
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise TtsError(f"Speech request failed: {e}") from e
+
+    async def _fetch(self, text: str, response_format: str) -> tuple:
+        """(status, body) of one speech request"""
+        async with self._speech(text, response_format) as response:
+            return response.status, await response.read()
+
+    async def _stream(self, head: bytes, response: aiohttp.ClientResponse, upload) -> dict:
+        """Hand the rest of an Opus body to upload as it arrives, copying it while it fits the cache"""
+        kept = [head]
+        size = len(head)
+
+        async def chunks():
+            nonlocal kept, size
+            yield head
+            async for chunk in response.content.iter_any():
+                size += len(chunk)
+                if kept is not None and size <= self.cache_bytes:
+                    kept.append(chunk)
+                else:
+                    kept = None
+                yield chunk
+
+        sent = await upload(chunks())
+        self.stats["upstream_bytes"] += size
+        return {"data": b"".join(kept) if kept is not None else None, "size": size, "sent": sent,
+                "path": "native", **OPUS}
+
+    def _ask_opus(self) -> bool:
+        return self.native_opus is not False or time.monotonic() >= self._opus_retry_at
+
+    def _opus_declined(self, reason: str):
+        """One text fell back to MP3; several in a row stop asking for Opus for a while"""
+        self._declines += 1
+        if self._declines >= config.TTS_OPUS_DECLINES:
+            if self.native_opus is not False:
+                logger.info("Speech upstream %s response_format opus, transcoding MP3 locally", reason)
+            self.native_opus = False
+            self._opus_retry_at = time.monotonic() + config.TTS_OPUS_RETRY_SECONDS
+
+    async def _synthesize(self, text: str, upload=None) -> dict:
+        """Render text; with upload, native Opus is streamed through it and its result is under "sent" """
+        mp3 = None
+        asked_opus = self._ask_opus()
+        if asked_opus:
+            async with self._speech(text, "opus") as response:
+                head = await _read_head(response) if response.status == 200 else b""
+                if is_ogg_opus(head):
+                    self.native_opus = True
+                    self._declines = 0
+                    self.stats["native"] += 1
+                    if upload is not None:
+                        return await self._stream(head, response, upload)
+                    data = head + await response.read()
+                    self.stats["upstream_bytes"] += len(data)
+                    return {"data": data, "path": "native", **OPUS}
+                if response.status == 200:
+                    # The format was ignored; what came back is the default MP3
+                    self._opus_declined("ignores")
+                    mp3 = head + await response.read()
+                elif response.status >= 500 or response.status == 429:
+                    raise TtsError(f"Speech upstream returned {response.status}")
+        if mp3 is None:
+            status, mp3 = await self._fetch(text, "mp3")
+            if status != 200:
+                raise TtsError(f"Speech upstream returned {status}")
+            if asked_opus:
+                # Opus was refused for this text only, or for good; only more refusals tell
+                self._opus_declined("rejects")
+        self.stats["upstream_bytes"] += len(mp3)
+
+        if FFMPEG:
+            try:
+                opus = await workers.run_in_process(transcode_to_opus, mp3, FFMPEG, config.TTS_OPUS_BITRATE)
+            except Exception as e:
+                logger.warning("Opus transcoding failed, sending MP3: %s", e)
+            else:
+                self.stats["transcoded"] += 1
+                return {"data": opus, "path": "transcoded", **OPUS}
+        self.stats["mp3"] += 1
+        return {"data": mp3, "path": "mp3", **MP3}
+
+    def _cached(self, text: str) -> Optional[dict]:
+        voice = self._cache.get(text)
+        if voice is not None:
+            self._cache.move_to_end(text)
+            self.stats["cache_hits"] += 1
+        return voice
+
+    def _store(self, text: str, voice: dict):
+        data = voice["data"]
+        self.stats["voice_bytes"] += voice["size"] if data is None else len(data)
+        if data is not None and len(data) <= self.cache_bytes:
+            self._cache[text] = {key: voice[key] for key in ("data", "path", "filename", "content_type")}
+            self._cached_bytes += len(data)
+            while self._cached_bytes > self.cache_bytes:
+                _, evicted = self._cache.popitem(last=False)
+                self._cached_bytes -= len(evicted["data"])
+
+    async def render(self, text: str) -> dict:
+        """Voice note bytes for text, with filename, content type and the path that produced them"""
+        voice = self._cached(text)
+        if voice is None:
+            voice = await self._synthesize(text)
+            self._store(text, voice)
+        return voice
+
+    async def send(self, media_relay: MediaRelay, chat_id: int, text: str, caption: str = None,
+                   parse_mode: str = None, reply_to_message_id: int = None) -> dict:
+        """Send text as a voice message, by cached file_id when it was sent before"""
+        cache_key = f"tts:{self.voice}:{text}"
+        result = await media_relay.send_cached(
+            "sendVoice", "voice", cache_key, chat_id, caption, parse_mode, reply_to_message_id
+        )
+        if result is not None:
+            return result
+
+        async def upload(chunks):
+            return await media_relay.send_voice_file(
+                chat_id, chunks, OPUS["filename"], OPUS["content_type"],
+                caption=caption, parse_mode=parse_mode, reply_to_message_id=reply_to_message_id,
+                cache_key=cache_key
+            )
+
+        voice = self._cached(text)
+        if voice is None:
+            voice = await self._synthesize(text, upload)
+            self._store(text, voice)
+            if "sent" in voice:
+                return voice["sent"]
+        return await media_relay.send_voice_file(
+            chat_id, voice["data"], voice["filename"], voice["content_type"],
+            caption=caption, parse_mode=parse_mode, reply_to_message_id=reply_to_message_id,
+            cache_key=cache_key
+        )
+
+    def snapshot(self) -> dict:
+        """Render counts by path, cache hits and bytes"""
+        return {**self.stats, "native_opus": self.native_opus, "ffmpeg": FFMPEG is not None,
+                "cached_texts": len(self._cache)}
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+RYSTRIX AI Update State
+Durable polling offset and a recent-update dedup window across restarts
+"""
+
+import asyncio
+import contextvars
+import json
+import logging
+import os
+from collections import deque
+from typing import Optional
+
+import config
+
+logger = logging.getLogger(__name__)
+
+_current_update_id = contextvars.ContextVar("current_update_id", default=None)
+
+def current_update_id() -> Optional[int]:
+    """update_id of the update being handled by the running task"""
+    return _current_update_id.get()
+
+
+class UpdateState:
+    """Tracks in-flight and recently completed updates and persists them as JSON.
+
+    The persisted offset is the first update of the newest polled batch:
+    the offset polling confirmed last, and so where Telegram redelivers from
+    after a crash. Updates it redelivers that already finished are skipped
+    by the dedup window (a ring buffer plus a set). This only prevents
+    duplicates. Each getUpdates call confirms the previous batch, so an
+    update from an earlier batch still running when the process dies is
+    not redelivered; work that must survive a crash goes through the job
+    queue.
+    """
+
+    def __init__(self, path: str = None, window: int = None, flush_interval: float = None):
+        self.path = path or config.UPDATE_STATE_PATH
+        self.window = window or config.UPDATE_DEDUP_WINDOW
+        self.flush_interval = flush_interval or config.UPDATE_STATE_FLUSH_INTERVAL
+        self._ring = deque()
+        self._done = set()
+        self._in_flight = {}  # update_id -> Update, for restart handoff
+        self._batch_start = None
+        self._dirty = False
+        self._detached = False
+        self._flush_task = None
+        self._lock = asyncio.Lock()
+        self.skipped = 0
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, encoding="utf-8") as handle:
+                data = json.load(handle)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.error("Ignoring unreadable update state %s: %s", self.path, e)
+            return
+        for update_id in data.get("done", [])[-self.window:]:
+            self._remember(update_id)
+        offset = data.get("offset")
+        if offset:
+            self._batch_start = offset
+        logger.info("Loaded update state: offset %s, %s recent updates", offset, len(self._done))
+
+    @property
+    def next_offset(self) -> Optional[int]:
+        """Offset to resume polling from: the first update of the newest batch"""
+        return self._batch_start
+
+    def _remember(self, update_id: int):
+        if update_id in self._done:
+            return
+        self._ring.append(update_id)
+        self._done.add(update_id)
+        if len(self._ring) > self.window:
+            self._done.discard(self._ring.popleft())
+
+    def begin(self, update_id: int, update=None) -> bool:
+        """Claim an update; False if it was already handled or is in flight"""
+        if update_id in self._done or update_id in self._in_flight:
+            self.skipped += 1
+            return False
+        self._in_flight[update_id] = update
+        return True
+
+    def complete(self, update_id: int):
+        """Mark an update handled"""
+        self._in_flight.pop(update_id, None)
+        if update_id in self._done:
+            return
+        self._remember(update_id)
+        self._dirty = True
+
+    def in_flight(self) -> dict:
+        """Updates claimed but not yet completed, by update_id"""
+        return dict(self._in_flight)
+
+    def claim(self, update_ids):
+        """Treat updates another process is handling as done"""
+        for update_id in update_ids:
+            self._remember(update_id)
+
+    def forget(self, update_id: int):
+        """Drop an update from the dedup window so it can be handled again"""
+        if update_id in self._done:
+            self._done.discard(update_id)
+            self._ring.remove(update_id)
+
+    def detach(self):
+        """Stop writing the state file; a restarted process owns it now"""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        self._detached = True
+
+    def _write(self, data: dict):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as handle:
+            json.dump(data, handle, separators=(",", ":"))
+            handle.flush()
+            os.fsync(handle.fileno())
+        os.replace(tmp_path, self.path)
+
+    async def flush(self):
+        """Atomically persist the offset and dedup window if they changed"""
+        async with self._lock:
+            if not self._dirty or self._detached:
+                return
+            self._dirty = False
+            data = {"offset": self.next_offset, "done": list(self._ring)}
+            try:
+                await asyncio.to_thread(self._write, data)
+            except OSError as e:
+                self._dirty = True
+                logger.error("Failed to save update state: %s", e)
+
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def close(self):
+        """Stop the periodic flush and persist the final state"""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        await self.flush()
+
+    def install(self, bot):
+        """Filter duplicate updates before telebot dispatches them"""
+        process_new_updates = bot.process_new_updates
+
+        async def process_one(update):
+            token = _current_update_id.set(update.update_id)
+            try:
+                await process_new_updates([update])
+            finally:
+                _current_update_id.reset(token)
+                self.complete(update.update_id)
+
+        async def process_deduplicated(updates):
+            if self._flush_task is None and not self._detached:
+                self._flush_task = asyncio.get_running_loop().create_task(self._flush_periodically())
+            if updates and (self._batch_start is None or updates[0].update_id > self._batch_start):
+                self._batch_start = updates[0].update_id
+                self._dirty = True
+            fresh = [update for update in updates if self.begin(update.update_id, update)]
+            if len(fresh) == 1:
+                await process_one(fresh[0])
+            elif fresh:
+                await asyncio.gather(*(process_one(update) for update in fresh))
+
+        bot.process_new_updates = process_deduplicated
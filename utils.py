@@ -6,45 +6,28 @@ Common utilities and helper functions for the Telegram bot
 
 import asyncio
 import logging
-from telebot import types
+from telebot.asyncio_helper import ApiTelegramException
 import config
+import markdown_renderer
+import responses
 
 logger = logging.getLogger(__name__)
 
 def main_keyboard():
-    """Create main menu inline keyboard"""
-    keyboard = types.InlineKeyboardMarkup(row_width=2)
-    keyboard.add(
-        types.InlineKeyboardButton("💬 Chat Mode", callback_data="chat_mode"),
-        types.InlineKeyboardButton("🖼️ Generate Image", callback_data="image_gen")
-    )
-    keyboard.add(
-        types.InlineKeyboardButton("🔊 Text-to-Speech", callback_data="tts"),
-        types.InlineKeyboardButton("❓ Help", callback_data="help")
-    )
-    return keyboard
+    """Main menu inline keyboard, serialized once at startup"""
+    return responses.MAIN_KEYBOARD
 
 def chat_mode_keyboard():
-    """Create chat mode keyboard"""
-    keyboard = types.InlineKeyboardMarkup()
-    keyboard.add(types.InlineKeyboardButton("🚪 Exit Chat Mode", callback_data="exit_chat"))
-    return keyboard
+    """Chat mode keyboard, serialized once at startup"""
+    return responses.CHAT_MODE_KEYBOARD
 
 def back_keyboard():
-    """Create back to main menu keyboard"""
-    keyboard = types.InlineKeyboardMarkup()
-    keyboard.add(types.InlineKeyboardButton("🔙 Back to Main Menu", callback_data="back_main"))
-    return keyboard
+    """Back to main menu keyboard, serialized once at startup"""
+    return responses.BACK_KEYBOARD
 
 def admin_keyboard():
-    """Create admin-only keyboard"""
-    keyboard = types.InlineKeyboardMarkup()
-    keyboard.add(
-        types.InlineKeyboardButton("📊 Statistics", callback_data="admin_stats"),
-        types.InlineKeyboardButton("🔄 Restart", callback_data="admin_restart")
-    )
-    keyboard.add(types.InlineKeyboardButton("🔙 Back", callback_data="back_main"))
-    return keyboard
+    """Admin-only keyboard, serialized once at startup"""
+    return responses.ADMIN_KEYBOARD
 
 async def animated_thinking(bot, message):
     """Animate thinking dots"""
@@ -182,12 +165,29 @@ def get_user_info(user):
         "full_name": f"{getattr(user, 'first_name', 'Unknown')} {getattr(user, 'last_name', '')}".strip()
     }
 
+_MARKDOWN_ESCAPES = str.maketrans({char: f'\\{char}' for char in '_*[]()~`>#+-=|{}.!'})
+
 def escape_markdown(text):
     """Escape special markdown characters"""
-    escape_chars = ['_', '*', '[', ']', '(', ')', '~', '`', '>', '#', '+', '-', '=', '|', '{', '}', '.', '!']
-    for char in escape_chars:
-        text = text.replace(char, f'\\{char}')
-    return text
+    return text.translate(_MARKDOWN_ESCAPES)
+
+async def send_rendered(bot, chat_id, text, edit_message_id=None, reply_markup=None, parse_mode=markdown_renderer.MARKDOWN):
+    """Send model output as Telegram-safe chunks, editing edit_message_id with the first"""
+    chunks = markdown_renderer.render(text, parse_mode)
+    for index, chunk in enumerate(chunks):
+        # Keyboard goes on the last chunk so it stays under the whole reply
+        markup = reply_markup if index == len(chunks) - 1 else None
+        for body, mode in ((chunk.text, chunk.parse_mode), (chunk.plain, None)):
+            try:
+                if index == 0 and edit_message_id:
+                    await bot.edit_message_text(body, chat_id, edit_message_id, parse_mode=mode, reply_markup=markup)
+                else:
+                    await bot.send_message(chat_id, body, parse_mode=mode, reply_markup=markup)
+                break
+            except ApiTelegramException as e:
+                if mode is None or "can't parse entities" not in str(e.description):
+                    raise
+                logger.warning("Markdown rejected, sending chunk %s as plain text: %s", index + 1, e.description)
 
 def truncate_text(text, max_length=100, suffix="..."):
     """Truncate text to specified length"""
@@ -201,7 +201,7 @@ async def send_typing_action(bot, chat_id, duration=2):
         await bot.send_chat_action(chat_id, 'typing')
         await asyncio.sleep(duration)
     except Exception as e:
-        logger.error(f"Error sending typing action: {e}")
+        logger.error("Error sending typing action: %s", e)
 
 def create_progress_bar(current, total, length=10):
     """Create a simple progress bar"""
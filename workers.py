@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+RYSTRIX AI Workers
+Shared process pool for CPU-bound work that must not run on the event loop
+"""
+
+import asyncio
+import logging
+from functools import partial
+
+import config
+
+logger = logging.getLogger(__name__)
+
+_process_pool = None
+
+def get_process_pool():
+    """Lazily create the shared worker process pool"""
+    global _process_pool
+    if _process_pool is None:
+        # Imported here: concurrent.futures.process is only needed once work arrives
+        from concurrent.futures import ProcessPoolExecutor
+        _process_pool = ProcessPoolExecutor(max_workers=config.WORKER_PROCESSES)
+        logger.info("Started worker pool with %s processes", config.WORKER_PROCESSES)
+    return _process_pool
+
+def _replace_broken_pool(broken):
+    """Drop a pool whose worker died, unless another caller already replaced it"""
+    global _process_pool
+    if _process_pool is broken:
+        broken.shutdown(wait=False, cancel_futures=True)
+        _process_pool = None
+        logger.warning("Worker pool broken by a crashed process, starting a new one")
+
+async def run_in_process(func, *args, **kwargs):
+    """Run a picklable function in the worker pool and await its result.
+
+    A worker that dies (OOM, a crash in native code) breaks the whole pool;
+    the pool is then recreated and the call retried once.
+    """
+    from concurrent.futures.process import BrokenProcessPool
+
+    loop = asyncio.get_running_loop()
+    call = partial(func, *args, **kwargs)
+    pool = get_process_pool()
+    try:
+        return await loop.run_in_executor(pool, call)
+    except BrokenProcessPool:
+        _replace_broken_pool(pool)
+    return await loop.run_in_executor(get_process_pool(), call)
+
+def shutdown_pool():
+    """Stop the worker pool if it was started"""
+    global _process_pool
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=False, cancel_futures=True)
+        _process_pool = None